@@ -0,0 +1,123 @@
+"""사용자별 월/카테고리 집계 테이블 (user_month_category)
+
+transactions 의 INSERT/UPDATE/DELETE 트리거로 증분 유지되므로 업로드, 수정,
+소프트 삭제/복원, 하드 삭제, 배치 저장 어느 경로든 따로 갱신할 필요가 없다.
+
+    python aggregates.py check     # 원본 테이블과 비교 (불일치 시 종료 코드 1)
+    python aggregates.py rebuild   # 원본 테이블에서 다시 계산
+"""
+import sys
+import sqlite3
+import argparse
+from contextlib import closing
+
+import db  # db 도 이 모듈을 import (설치) → 모듈 수준에서 db 속성을 쓰지 말 것
+
+# ym/category 가 NULL 인 행은 '' 키로 모음 (PRIMARY KEY 에 NULL 을 쓰지 않기 위해)
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS user_month_category (
+        user_id TEXT NOT NULL,
+        ym TEXT NOT NULL,
+        category TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        cnt INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (user_id, ym, category)
+    ) WITHOUT ROWID
+'''
+
+_ADD_NEW = '''
+        INSERT INTO user_month_category (user_id, ym, category, total, cnt)
+        SELECT COALESCE(NEW.user_id, ''), COALESCE(NEW.ym, ''), COALESCE(NEW.category, ''),
+               COALESCE(NEW.amount, 0), 1
+        WHERE NEW.deleted_at IS NULL
+        ON CONFLICT(user_id, ym, category) DO UPDATE
+        SET total = total + excluded.total, cnt = cnt + 1;
+'''
+
+_SUB_OLD = '''
+        UPDATE user_month_category
+        SET total = total - COALESCE(OLD.amount, 0), cnt = cnt - 1
+        WHERE OLD.deleted_at IS NULL
+          AND user_id = COALESCE(OLD.user_id, '') AND ym = COALESCE(OLD.ym, '')
+          AND category = COALESCE(OLD.category, '');
+        DELETE FROM user_month_category
+        WHERE user_id = COALESCE(OLD.user_id, '') AND ym = COALESCE(OLD.ym, '')
+          AND category = COALESCE(OLD.category, '') AND cnt <= 0;
+'''
+
+TRIGGERS_SQL = [
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_agg_insert
+    AFTER INSERT ON transactions
+    BEGIN {_ADD_NEW}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_agg_update
+    AFTER UPDATE OF user_id, amount, ym, category, deleted_at ON transactions
+    BEGIN {_SUB_OLD} {_ADD_NEW}
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_agg_delete
+    AFTER DELETE ON transactions
+    BEGIN {_SUB_OLD}
+    END
+    ''',
+]
+
+_RAW_SQL = '''
+    SELECT COALESCE(user_id, ''), COALESCE(ym, ''), COALESCE(category, ''),
+           COALESCE(SUM(amount), 0), COUNT(*)
+    FROM transactions
+    WHERE deleted_at IS NULL
+    GROUP BY 1, 2, 3
+'''
+
+
+def install(conn):
+    conn.execute(CREATE_TABLE_SQL)
+    for sql in TRIGGERS_SQL:
+        conn.execute(sql)
+
+
+def rebuild(conn):
+    """원본 테이블에서 집계를 다시 계산 (호출자가 트랜잭션 관리)"""
+    conn.execute('DELETE FROM user_month_category')
+    conn.execute(f'INSERT INTO user_month_category (user_id, ym, category, total, cnt) {_RAW_SQL}')
+
+
+def check(conn):
+    """집계 테이블과 원본 집계의 차이 목록 [(key, expected, actual)]"""
+    expected = {row[:3]: (row[3], row[4]) for row in conn.execute(_RAW_SQL)}
+    actual = {row[:3]: (row[3], row[4]) for row in conn.execute(
+        'SELECT user_id, ym, category, total, cnt FROM user_month_category')}
+    return [(key, expected.get(key), actual.get(key))
+            for key in sorted(set(expected) | set(actual))
+            if expected.get(key) != actual.get(key)]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="user_month_category 집계 점검/재생성")
+    ap.add_argument("command", choices=["check", "rebuild"])
+    ap.add_argument("--db", default=None)
+    args = ap.parse_args(argv)
+
+    with closing(sqlite3.connect(args.db or db.DB_PATH, timeout=30)) as conn, conn:
+        install(conn)
+        if args.command == "rebuild":
+            rebuild(conn)
+            print("✔ 집계 재생성 완료")
+            return 0
+        diffs = check(conn)
+    for key, expected, actual in diffs[:50]:
+        print(f"❌ {key}: expected(total, cnt)={expected} actual={actual}")
+    if diffs:
+        print(f"불일치 {len(diffs)}건 — 'python aggregates.py rebuild' 로 재생성하세요")
+        return 1
+    print("✔ 집계 일치")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,95 +1,52 @@
-from flask import Flask, redirect, url_for, request, jsonify, send_from_directory
+from flask import Flask, Response, g, redirect, url_for, request, jsonify, send_file, send_from_directory, stream_with_context
 from authlib.integrations.flask_client import OAuth
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_cors import CORS
 from dotenv import load_dotenv
-import pytesseract
 import os
-import cv2
-import numpy as np
-from PIL import Image
 import json
-import datetime
+import time
+import hmac
+import zlib
 import sqlite3
-from contextlib import closing
-from parser import parse_receipt_text
+import zipfile
+from concurrent.futures import wait, FIRST_COMPLETED
+import db
+import pipeline
+import uploads
+import store_learning
+import user_store
+import image_store
+import metrics
+from ocr_cache import get_cache
+from preprocess import ImageRejected, StageReport
+from jobs import JobQueue, QueueFull
 from werkzeug.middleware.proxy_fix import ProxyFix
 
 # ==========================
 # 기본 설정/경로
 # ==========================
-DB_PATH = 'user_data.db'
+DB_PATH = db.DB_PATH
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-STORE_LEARNING_PATH = os.path.join(BASE_DIR, "store_learning.json")
 UI_PATH = os.path.join(BASE_DIR, 'webapp-ui')
+# 1: /ocr 는 작업 id 를 즉시 반환하고 워커 풀에서 처리, 0: 요청 스레드에서 동기 처리
+OCR_ASYNC = os.getenv("OCR_ASYNC", "1") == "1"
+# /ocr/jobs/<id>?wait= 최대 대기(초): gthread 요청 스레드를 오래 잡으면 다른 요청이 밀리므로 짧게,
+# 클라이언트는 짧은 폴링 + 백오프로 기다림
+JOB_WAIT_MAX = float(os.getenv("OCR_JOB_WAIT_MAX", "2"))
+OCR_BATCH_MAX = int(os.getenv("OCR_BATCH_MAX", "50"))  # /ocr/batch 한 번에 받을 최대 이미지 수
+OCR_BATCH_SAVE_CHUNK = int(os.getenv("OCR_BATCH_SAVE_CHUNK", "8"))  # /ocr/batch 결과를 이 건수마다 커밋
+OCR_BATCH_WINDOW = int(os.getenv("OCR_BATCH_WINDOW", "8"))  # /ocr/batch 에서 동시에 메모리에 올려 워커로 넘길 이미지 수
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff')
+IMAGE_MAX_AGE = 86400 * 30  # 내용 주소 기반이라 바뀌지 않음 → 브라우저 캐시 길게
+# 부하 테스트 전용 로그인 (loadtest.py): 둘 다 설정돼야 라우트가 생김, 운영에서는 켜지 말 것
+LOADTEST_LOGIN = os.getenv("LOADTEST_LOGIN") == "1"
+LOADTEST_TOKEN = os.getenv("LOADTEST_TOKEN")
 
 # ==========================
 # DB 초기화
 # ==========================
-def init_db():
-    """기본 테이블 생성 + deleted_at 컬럼 자동 보강"""
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
-        c = conn.cursor()
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT,
-                store TEXT,
-                amount INTEGER,
-                date TEXT,
-                category TEXT,
-                ocr_store TEXT
-                -- deleted_at 은 아래 보강 루틴에서 필요 시 추가
-            )
-        ''')
-        c.execute('''
-            CREATE TABLE IF NOT EXISTS user_budget (
-                user_id TEXT PRIMARY KEY,
-                budget INTEGER
-            )
-        ''')
-        # deleted_at 없으면 추가
-        c.execute("PRAGMA table_info(transactions)")
-        cols = [row[1] for row in c.fetchall()]
-        if 'deleted_at' not in cols:
-            c.execute("ALTER TABLE transactions ADD COLUMN deleted_at TEXT")
-
-init_db()
-
-# ==========================
-# OCR 전처리/ROI
-# ==========================
-def preprocess_for_ocr(image_bytes):
-    file_bytes = np.asarray(bytearray(image_bytes), dtype=np.uint8)
-    img = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    resized = cv2.resize(gray, None, fx=2, fy=2, interpolation=cv2.INTER_LINEAR)
-    thresh = cv2.adaptiveThreshold(resized, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                                   cv2.THRESH_BINARY, 31, 15)
-    return Image.fromarray(thresh)
-
-def extract_top_brand(img):
-    h, w = img.shape[:2]
-    roi = img[0:int(h * 0.2), 0:w]
-    roi_gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-    roi_gray = cv2.threshold(roi_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-    roi_text = pytesseract.image_to_string(
-        roi_gray, lang='kor+eng',
-        config='--oem 3 --psm 7 -c tessedit_char_whitelist="가-힣A-Za-z0-9"'
-    ).strip()
-    return roi_text
-
-def extract_bottom_amount(img):
-    h, w = img.shape[:2]
-    roi = img[int(h * 0.7):h, 0:w]
-    roi_gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
-    roi_gray = cv2.threshold(roi_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-    text = pytesseract.image_to_string(
-        roi_gray, lang='kor+eng',
-        config='--oem 3 --psm 6 -c tessedit_char_whitelist="0123456789,"'
-    )
-    nums = [int(n.replace(",", "")) for n in text.split() if n.replace(",", "").isdigit()]
-    return max(nums) if nums else None
+db.init_db(DB_PATH)
 
 # ==========================
 # 앱/보안/로그인
@@ -97,14 +54,13 @@ def extract_bottom_amount(img):
 load_dotenv()
 
 app = Flask(__name__, static_folder=UI_PATH, static_url_path='')
+app.request_class = uploads.SpooledRequest  # 큰 업로드는 임시 파일로 스풀
+app.config['MAX_CONTENT_LENGTH'] = uploads.MAX_REQUEST_BYTES
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)  # ✅ ← 여기에 추가
-CORS(app, supports_credentials=True)
+CORS(app, supports_credentials=True, expose_headers=['ETag', 'X-Next-After-Id'])
 app.secret_key = os.getenv("SECRET_KEY") or "change-me"
 
-# Windows에서만 경로 지정 (Render 리눅스에서는 미적용)
-if os.name == 'nt':
-    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-    os.environ['TESSDATA_PREFIX'] = r'C:\Program Files\Tesseract-OCR\tessdata'
+job_queue = JobQueue(DB_PATH)
 
 oauth = OAuth(app)
 google = oauth.register(
@@ -125,15 +81,54 @@ class User(UserMixin):
         self.name = name
         self.email = email
 
-users = {}
-
 @login_manager.user_loader
 def load_user(user_id):
-    return users.get(user_id)
+    # 요청마다 호출: 프로세스 내 LRU 적중이면 DB 를 읽지 않음
+    user = user_store.get_store().get(user_id)
+    return User(user["id"], user["name"], user["email"]) if user else None
 
 # app = Flask(...) 아래 아무 곳에 추가
+@app.before_request
+def start_job_queue():
+    # 워커 프로세스(spawn)가 app 모듈을 다시 import 해도 풀이 중복 생성되지 않도록 요청 시점에 기동
+    if OCR_ASYNC:
+        job_queue.ensure_started()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # X-Debug-Timing: 1 요청이면 단계별 시간을 응답 헤더로 돌려줌
+    g.debug_timings = [] if request.headers.get('X-Debug-Timing') else None
+
+@app.after_request
+def record_request_metrics(resp):
+    started = g.get('request_started')
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.HTTP_SECONDS.observe(elapsed, route=route, method=request.method, status=resp.status_code)
+        if g.get('debug_timings') is not None:
+            resp.headers['X-Debug-Timing'] = metrics.format_debug_header(g.debug_timings + [('total', elapsed)])
+    return resp
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f'Request too large (max {uploads.MAX_REQUEST_BYTES} bytes)'}), 413
+
+@app.errorhandler(sqlite3.OperationalError)
+def database_locked(e):
+    # busy_timeout 을 넘겨도 잠겨 있던 경우만 재시도 가능한 503 으로, 나머지는 기본 500 처리
+    if 'locked' not in str(e) and 'busy' not in str(e):
+        raise e
+    metrics.DB_LOCKED.inc(route=request.url_rule.rule if request.url_rule else 'unmatched')
+    return jsonify({'error': 'Database is busy, retry later', 'code': 'db_locked'}), 503, {
+        'Retry-After': '1', 'X-Error-Code': 'db_locked'}
+
 @app.after_request
 def add_no_cache_headers(resp):
+    # ETag 로 재검증하는 엔드포인트는 자체 Cache-Control 유지
+    if request.endpoint in REVALIDATE_ENDPOINTS:
+        return resp
     resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     resp.headers["Pragma"] = "no-cache"
     resp.headers["Expires"] = "0"
@@ -158,10 +153,27 @@ def callback():
     token = google.authorize_access_token()
     user_info = google.get('https://openidconnect.googleapis.com/v1/userinfo').json()
     user = User(user_info['sub'], user_info.get('name', ''), user_info.get('email', ''))
-    users[user.id] = user
+    user_store.get_store().save(user.id, user.name, user.email)
     login_user(user)
     return redirect('/')
 
+if LOADTEST_LOGIN:
+    if not LOADTEST_TOKEN:
+        raise RuntimeError("LOADTEST_LOGIN=1 requires LOADTEST_TOKEN")
+
+    @app.route('/__loadtest/login', methods=['POST'])
+    def loadtest_login():
+        """Google OAuth 대신 user_id 로 바로 로그인 (Authorization: Bearer <LOADTEST_TOKEN>)"""
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {LOADTEST_TOKEN}'):
+            return jsonify({"error": "Unauthorized"}), 401
+        user_id = str((request.get_json(silent=True) or {}).get('user_id') or '')
+        if not user_id:
+            return jsonify({"error": "missing user_id"}), 400
+        user = User(user_id, f"loadtest {user_id}", f"{user_id}@loadtest.invalid")
+        user_store.get_store().save(user.id, user.name, user.email)
+        login_user(user)
+        return jsonify({"logged_in": True, "id": user.id})
+
 @app.route('/logout')
 @login_required
 def logout():
@@ -182,126 +194,253 @@ def user_info():
 def ocr_endpoint():
     if 'image' not in request.files:
         return jsonify({'error': 'No image uploaded'}), 400
-    image_file = request.files['image']
-    image_bytes = image_file.read()
-    img = cv2.imdecode(np.asarray(bytearray(image_bytes), dtype=np.uint8), cv2.IMREAD_COLOR)
-
-    roi_brand = extract_top_brand(img)
-    roi_amount = extract_bottom_amount(img)
-
-    processed_image = preprocess_for_ocr(image_bytes)
-    ocr_text = pytesseract.image_to_string(processed_image, lang='kor+eng', config='--psm 6')
-    ocr_lines = ocr_text.splitlines()
-    parsed_result, _, _ = parse_receipt_text(ocr_lines, roi_brand)
-
-    if not parsed_result.get("총금액") and roi_amount:
-        parsed_result["총금액"] = roi_amount
-
-    date_value = parsed_result.get("날짜") or datetime.datetime.now().strftime('%Y-%m-%d')
-
-    # DB 저장 (ocr_store에 fallback 적용)
-    ocr_original_value = roi_brand if roi_brand else parsed_result.get("가맹점")
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO transactions (user_id, store, amount, date, category, ocr_store, deleted_at)
-            VALUES (?, ?, ?, ?, ?, ?, NULL)
-        ''', (current_user.id,
-              parsed_result.get("가맹점"),
-              parsed_result.get("총금액"),
-              date_value,
-              parsed_result.get("카테고리"),
-              ocr_original_value))
-    return jsonify({"status": "success", "receipt": parsed_result, "raw_text": ocr_text, "roi_brand": roi_brand})
+    # 크기/형식/해상도는 헤더로 먼저 검사, 스풀된 본문은 mmap 으로 (bytes 사본 없음)
+    try:
+        with uploads.open_upload(request.files['image']) as (image_bytes, upload):
+            if not OCR_ASYNC:
+                return _ocr_sync(image_bytes, upload)
+            return _ocr_enqueue(image_bytes, upload)
+    except uploads.UploadRejected as e:
+        return jsonify({'error': str(e)}), e.status
+
+def _ocr_sync(image_bytes, upload):
+    report = StageReport()
+    report.upload = upload
+    try:
+        result = pipeline.process_receipt(DB_PATH, current_user.id, image_bytes, report)
+    except ImageRejected as e:
+        metrics.OCR_RESULTS.inc(outcome="rejected")
+        return jsonify(e.to_dict()), 422
+    metrics.observe_stages(result.get("timings"))
+    return jsonify(result)
+
+def _ocr_enqueue(image_bytes, upload):
+    try:
+        with metrics.timed(metrics.DB_SECONDS, op='enqueue'):
+            job_id = job_queue.submit(current_user.id, image_bytes)
+    except QueueFull:
+        return jsonify({'error': 'OCR queue is full, retry later'}), 429, {'Retry-After': '5'}
+    return jsonify({"status": "queued", "job_id": job_id, "upload": upload}), 202, {
+        'Location': url_for('ocr_job_status', job_id=job_id)}
+
+@app.route('/ocr/jobs/<job_id>', methods=['GET'])
+@login_required
+def ocr_job_status(job_id):
+    timeout = min(request.args.get('wait', 0, type=float), JOB_WAIT_MAX)
+    if timeout > 0:
+        job = job_queue.wait(job_id, current_user.id, timeout)
+    else:
+        job = job_queue.get(job_id, current_user.id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    metrics.debug_stages(job.get("timings"))
+    return jsonify(job)
+
+@app.route('/ocr/batch', methods=['POST'])
+@login_required
+def ocr_batch():
+    # multipart 의 images 필드(여러 개) + zip 파일 안의 이미지들 (개수/크기 합계는 헤더로 먼저 검사,
+    # 본문은 OCR_BATCH_WINDOW 장씩만 읽어 워커로 넘김)
+    files = uploads.detach_files(request.files.getlist('images') + request.files.getlist('archive'))
+    try:
+        items, rejected = uploads.collect_images(files, IMAGE_EXTS, OCR_BATCH_MAX)
+    except (zipfile.BadZipFile, uploads.UploadRejected) as e:
+        for f in files:
+            f.close()
+        if isinstance(e, zipfile.BadZipFile):
+            return jsonify({'error': 'Invalid zip archive'}), 400
+        return jsonify({'error': str(e)}), e.status
+    if not items and not rejected:
+        return jsonify({'error': 'No image uploaded'}), 400
+
+    user_id = current_user.id
+    pool = job_queue.executor()
+
+    def generate():
+        pending = iter(items)
+        futures = {}
+        rows, failed, inserted = [], 0, 0
+
+        def fill():
+            """창이 빈 만큼 다음 이미지를 읽어 제출 → 읽다가 거절된 [(이름, 오류)]"""
+            errors = []
+            while len(futures) < OCR_BATCH_WINDOW:
+                item = next(pending, None)
+                if item is None:
+                    break
+                name, _, read = item
+                try:
+                    data = read()
+                except uploads.UploadRejected as e:
+                    errors.append((name, e))
+                    continue
+                futures[pool.submit(pipeline.recognize_receipt, data, user_id)] = name
+            return errors
+
+        def flush():
+            nonlocal inserted
+            if rows:
+                with metrics.timed(metrics.DB_SECONDS, op='batch_insert'):
+                    inserted += pipeline.save_transactions(DB_PATH, rows)
+                rows.clear()
+
+        try:
+            errors = rejected + fill()
+            while errors or futures:
+                for name, e in errors:
+                    failed += 1
+                    yield json.dumps({"file": name, "status": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+                done = wait(futures, return_when=FIRST_COMPLETED).done if futures else ()
+                for future in done:
+                    name = futures.pop(future)
+                    try:
+                        result = future.result()
+                    except ImageRejected as e:
+                        failed += 1
+                        metrics.OCR_RESULTS.inc(outcome="rejected")
+                        yield json.dumps({"file": name, "status": "rejected", "reason": e.reason, "quality": e.scores},
+                                         ensure_ascii=False) + "\n"
+                        continue
+                    except Exception as e:
+                        failed += 1
+                        yield json.dumps({"file": name, "status": "error", "error": str(e)}, ensure_ascii=False) + "\n"
+                        continue
+                    metrics.observe_stages(result.get("timings"))
+                    rows.append(pipeline.build_row(user_id, result["receipt"], result["roi_brand"],
+                                                   result.pop("ocr_key"), result.pop("image_hash")))
+                    # OCR_BATCH_SAVE_CHUNK 건씩 한 트랜잭션으로 저장 (성공 줄을 보낸 영수증이 오래 메모리에만 있지 않게)
+                    if len(rows) >= OCR_BATCH_SAVE_CHUNK:
+                        flush()
+                    yield json.dumps({"file": name, "status": "success", **result}, ensure_ascii=False) + "\n"
+                errors = fill()  # 끝난 만큼 다음 이미지를 읽어 창을 채움
+        finally:
+            # 클라이언트가 중간에 끊어도(GeneratorExit) 이미 인식된 영수증은 저장, 남은 작업은 취소
+            for future in futures:
+                future.cancel()
+            flush()
+            for f in files:
+                f.close()
+        yield json.dumps({"status": "done", "inserted": inserted, "failed": failed}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/ocr-cache/stats', methods=['GET'])
+@login_required
+def ocr_cache_stats():
+    cache = get_cache()
+    if cache is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **cache.stats()})
+
+# ==========================
+# 메트릭 (Prometheus text)
+# ==========================
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+METRICS_LOCAL_ADDRS = {'127.0.0.1', '::1'}
+
+def _cache_stat(name):
+    # 게이지 셋이 한 스크랩(요청) 안에서 stats() 결과를 같이 씀 (g 는 요청마다 새로)
+    cache = get_cache()
+    if cache is None:
+        return None
+    if 'ocr_cache_stats' not in g:
+        g.ocr_cache_stats = cache.stats()
+    return g.ocr_cache_stats[name]
+
+metrics.registry.register(metrics.Gauge(
+    "ocr_queue_depth", "Queued + running OCR jobs", lambda: job_queue.depth() if OCR_ASYNC else 0))
+metrics.registry.register(metrics.Gauge(
+    "ocr_inflight", "OCR jobs currently running in this worker's pool", lambda: job_queue.inflight))
+metrics.registry.register(metrics.Gauge(
+    "ocr_cache_hits", "OCR cache hits (all processes)", lambda: _cache_stat("hits")))
+metrics.registry.register(metrics.Gauge(
+    "ocr_cache_misses", "OCR cache misses (all processes)", lambda: _cache_stat("misses")))
+metrics.registry.register(metrics.Gauge(
+    "ocr_cache_hit_ratio", "OCR cache hit ratio", lambda: _cache_stat("hit_rate")))
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    # 토큰이 있으면 상수 시간 비교, 없으면 같은 호스트(사이드카 스크레이퍼)에서만 허용
+    if METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+            return jsonify({"error": "Unauthorized"}), 401
+    elif request.remote_addr not in METRICS_LOCAL_ADDRS:
+        return jsonify({"error": "Set METRICS_TOKEN to scrape /metrics remotely"}), 403
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 # ==========================
 # 데이터 조회/통계/예산
 # ==========================
+USER_DATA_FIELDS = db.TRANSACTION_FIELDS
+USER_DATA_MAX_LIMIT = 500
+REVALIDATE_ENDPOINTS = {'get_user_data', 'transaction_image'}
+
 @app.route('/api/user-data', methods=['GET'])
 @login_required
 def get_user_data():
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        c = conn.cursor()
-        c.execute('''
-            SELECT id, store, amount, date, category, ocr_store
-            FROM transactions
-            WHERE user_id=? AND deleted_at IS NULL
-            ORDER BY id DESC
-        ''', (current_user.id,))
-        rows = c.fetchall()
-    return jsonify([{
-        "id": r[0], "store": r[1], "amount": r[2],
-        "date": r[3], "category": r[4], "ocr_store": r[5]
-    } for r in rows])
+    """?after_id=&limit= (id 내림차순 keyset), ?from=YYYY-MM&to=YYYY-MM, ?category=, ?fields=id,store,..."""
+    after_id = request.args.get('after_id', type=int)
+    limit = request.args.get('limit', type=int)
+    if limit is not None:
+        limit = max(1, min(limit, USER_DATA_MAX_LIMIT))
+    month_from, month_to = request.args.get('from'), request.args.get('to')
+    category = request.args.get('category')
+    fields = [f for f in request.args.get('fields', '').split(',') if f in USER_DATA_FIELDS] or list(USER_DATA_FIELDS)
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+
+    with metrics.timed(metrics.DB_SECONDS, op='user_data'):
+        # 변경 카운터 + 쿼리 조건으로 ETag → 변경 없으면 테이블을 읽지 않고 304
+        version = db.user_data_version(current_user.id, DB_PATH)
+        # 같은 브라우저에서 계정이 바뀌어도 다른 사용자의 캐시를 재사용하지 않도록 user_id 포함
+        query_sig = zlib.crc32(current_user.id.encode('utf-8') + b'?' + request.query_string) & 0xffffffff
+        etag = f'W/"{version}-{query_sig:x}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+
+        rows = db.list_transactions(current_user.id, fields, after_id=after_id, limit=limit,
+                                    month_from=month_from, month_to=month_to, category=category,
+                                    db_path=DB_PATH)
+
+    if limit is not None and len(rows) == limit:
+        headers['X-Next-After-Id'] = str(rows[-1][0])
+    return jsonify([dict(zip(fields, r)) for r in rows]), 200, headers
 
 @app.route('/api/budget', methods=['GET', 'POST'])
 @login_required
 def user_budget():
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
-        c = conn.cursor()
+    with metrics.timed(metrics.DB_SECONDS, op='budget'):
         if request.method == 'POST':
             data = request.get_json(silent=True) or {}
             new_budget = data.get("budget")
             if not isinstance(new_budget, int) or new_budget <= 0:
                 return jsonify({"error": "Invalid"}), 400
-            c.execute('INSERT OR REPLACE INTO user_budget (user_id, budget) VALUES (?, ?)',
-                      (current_user.id, new_budget))
+            db.set_budget(current_user.id, new_budget, DB_PATH)
             return jsonify({"status": "success", "budget": new_budget})
-        c.execute('SELECT budget FROM user_budget WHERE user_id=?', (current_user.id,))
-        row = c.fetchone()
-    return jsonify({"budget": int(row[0]) if row else None})
+        budget = db.get_budget(current_user.id, DB_PATH)
+    return jsonify({"budget": budget})
 
 @app.route('/api/stats', methods=['GET'])
 @login_required
 def get_stats():
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        c = conn.cursor()
-        month = request.args.get("month")  # YYYY-MM
-
-        if month:
-            c.execute("""
-                SELECT COALESCE(SUM(amount),0), COUNT(*)
-                FROM transactions
-                WHERE user_id=? AND deleted_at IS NULL AND strftime('%Y-%m', date) = ?
-            """, (current_user.id, month))
-            total_spent, count = c.fetchone()
-
-            c.execute("""
-                SELECT category, COALESCE(SUM(amount),0)
-                FROM transactions
-                WHERE user_id=? AND deleted_at IS NULL AND strftime('%Y-%m', date) = ?
-                GROUP BY category
-            """, (current_user.id, month))
-            category_data = {str(k) if k else "기타": int(v) for k, v in c.fetchall()}
-        else:
-            c.execute("""
-                SELECT COALESCE(SUM(amount),0), COUNT(*)
-                FROM transactions
-                WHERE user_id=? AND deleted_at IS NULL
-            """, (current_user.id,))
-            total_spent, count = c.fetchone()
-
-            c.execute("""
-                SELECT category, COALESCE(SUM(amount),0)
-                FROM transactions
-                WHERE user_id=? AND deleted_at IS NULL
-                GROUP BY category
-            """, (current_user.id,))
-            category_data = {str(k) if k else "기타": int(v) for k, v in c.fetchall()}
-
-        # 월별 집계 (항상 전체)
-        c.execute("""
-            SELECT SUBSTR(date, 1, 7), COALESCE(SUM(amount),0)
-            FROM transactions
-            WHERE user_id=? AND deleted_at IS NULL
-            GROUP BY 1
-        """, (current_user.id,))
-        monthly_data = {str(k) if k else "unknown": int(v) for k, v in c.fetchall()}
-
-        # 예산
-        c.execute('SELECT budget FROM user_budget WHERE user_id=?', (current_user.id,))
-        row = c.fetchone()
-        budget = int(row[0]) if row else 0
+    month = request.args.get("month")  # YYYY-MM
+    with metrics.timed(metrics.DB_SECONDS, op='stats'):
+        # 트리거로 유지되는 월×카테고리 집계만 읽음 (원본 행 수와 무관)
+        rows = db.month_category_totals(current_user.id, DB_PATH)
+        budget = db.get_budget(current_user.id, DB_PATH) or 0
+
+    total_spent, count = 0, 0
+    category_data, monthly_data = {}, {}
+    for ym, category, amount, n in rows:
+        month_label = str(ym) if ym else "unknown"
+        monthly_data[month_label] = monthly_data.get(month_label, 0) + int(amount)
+        if month and ym != month:
+            continue
+        total_spent += int(amount)
+        count += n
+        category_label = str(category) if category else "기타"
+        category_data[category_label] = category_data.get(category_label, 0) + int(amount)
 
     return jsonify({
         "total_spent": int(total_spent),
@@ -325,39 +464,19 @@ def correct_transaction(transaction_id):
 
     if not field or value is None:
         return jsonify({"error": "Invalid input"}), 400
+    if field not in db.CORRECTABLE_FIELDS:
+        return jsonify({"error": "Unsupported field"}), 400
+    if field == "amount":
+        value = int(value)
 
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
-        c = conn.cursor()
-        c.execute('SELECT id FROM transactions WHERE user_id=? AND id=? AND deleted_at IS NULL',
-                  (current_user.id, transaction_id))
-        if not c.fetchone():
+    with metrics.timed(metrics.DB_SECONDS, op='correct'):
+        if not db.find_transaction(current_user.id, transaction_id, deleted=False, db_path=DB_PATH):
             return jsonify({"error": "Transaction not found or deleted"}), 404
+        db.update_transaction_field(current_user.id, transaction_id, field, value, DB_PATH)
 
-        if field == "store":
-            c.execute('UPDATE transactions SET store=? WHERE id=?', (value, transaction_id))
-            # OCR 학습 매핑 저장
-            if ocr_original and ocr_original != value and len(ocr_original) < 100:
-                if not os.path.exists(STORE_LEARNING_PATH):
-                    with open(STORE_LEARNING_PATH, "w", encoding="utf-8") as f:
-                        json.dump({}, f, ensure_ascii=False, indent=2)
-                try:
-                    with open(STORE_LEARNING_PATH, "r", encoding="utf-8") as f:
-                        mapping = json.load(f)
-                except json.JSONDecodeError:
-                    mapping = {}
-                mapping[ocr_original] = value
-                with open(STORE_LEARNING_PATH, "w", encoding="utf-8") as f:
-                    json.dump(mapping, f, ensure_ascii=False, indent=2)
-                print(f"✔ OCR 학습 데이터 저장: {ocr_original} → {value}")
-
-        elif field == "amount":
-            c.execute('UPDATE transactions SET amount=? WHERE id=?', (int(value), transaction_id))
-        elif field == "date":
-            c.execute('UPDATE transactions SET date=? WHERE id=?', (value, transaction_id))
-        elif field == "category":
-            c.execute('UPDATE transactions SET category=? WHERE id=?', (value, transaction_id))
-        else:
-            return jsonify({"error": "Unsupported field"}), 400
+    # OCR 학습 매핑 저장 (store_aliases 한 행 upsert)
+    if field == "store" and store_learning.learn(current_user.id, ocr_original, value, DB_PATH):
+        print(f"✔ OCR 학습 데이터 저장: {ocr_original} → {value}")
 
     return jsonify({"status": "success", "updated": {field: value}}), 200
 
@@ -368,36 +487,48 @@ def correct_transaction(transaction_id):
 @login_required
 def delete_transaction(transaction_id):
     hard = request.args.get('hard') == '1'
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
-        c = conn.cursor()
-        c.execute('SELECT id FROM transactions WHERE user_id=? AND id=?', (current_user.id, transaction_id))
-        if not c.fetchone():
+    with metrics.timed(metrics.DB_SECONDS, op='delete'):
+        if not db.find_transaction(current_user.id, transaction_id, db_path=DB_PATH):
             return jsonify({"error": "Transaction not found"}), 404
 
         if hard:
-            c.execute('DELETE FROM transactions WHERE user_id=? AND id=?', (current_user.id, transaction_id))
+            db.hard_delete_transaction(current_user.id, transaction_id, DB_PATH)
             return jsonify({"status": "deleted_hard", "id": transaction_id})
 
-        c.execute("""
-            UPDATE transactions
-            SET deleted_at = datetime('now')
-            WHERE user_id=? AND id=? AND deleted_at IS NULL
-        """, (current_user.id, transaction_id))
+        db.soft_delete_transaction(current_user.id, transaction_id, DB_PATH)
         return jsonify({"status": "deleted_soft", "id": transaction_id})
 
 @app.route('/api/transactions/<int:transaction_id>/restore', methods=['POST'])
 @login_required
 def restore_transaction(transaction_id):
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
-        c = conn.cursor()
-        c.execute('SELECT id FROM transactions WHERE user_id=? AND id=? AND deleted_at IS NOT NULL',
-                  (current_user.id, transaction_id))
-        if not c.fetchone():
+    with metrics.timed(metrics.DB_SECONDS, op='restore'):
+        if not db.find_transaction(current_user.id, transaction_id, deleted=True, db_path=DB_PATH):
             return jsonify({"error": "Nothing to restore"}), 404
-        c.execute('UPDATE transactions SET deleted_at=NULL WHERE user_id=? AND id=?',
-                  (current_user.id, transaction_id))
+        db.restore_transaction(current_user.id, transaction_id, DB_PATH)
     return jsonify({"status": "restored", "id": transaction_id})
 
+# ==========================
+# 영수증 이미지
+# ==========================
+@app.route('/api/transactions/<int:transaction_id>/image', methods=['GET'])
+@login_required
+def transaction_image(transaction_id):
+    size = request.args.get('size', 'original')
+    if size not in ('original', 'thumb'):
+        return jsonify({"error": "size must be original or thumb"}), 400
+    with metrics.timed(metrics.DB_SECONDS, op='image'):
+        image_hash = db.transaction_image_hash(current_user.id, transaction_id, DB_PATH)
+        found = image_store.locate(image_hash, size, DB_PATH) if image_hash else None
+    if not found:
+        # 원본이 용량 정리로 지워졌어도 축소본은 남아 있음
+        return jsonify({"error": "Image not found", "thumb_available": bool(
+            image_hash and size == 'original' and image_store.locate(image_hash, 'thumb', DB_PATH))}), 404
+    path, mimetype = found
+    # 파일 경로로 넘기면 Range/If-None-Match 처리 + wsgi.file_wrapper(sendfile) 로 전송
+    resp = send_file(path, mimetype=mimetype, conditional=True, etag=f"{image_hash}-{size}", max_age=IMAGE_MAX_AGE)
+    resp.headers['Cache-Control'] = f'private, max-age={IMAGE_MAX_AGE}, immutable'
+    return resp
+
 # ✅ 폴백용 삭제 엔드포인트 (프론트에서 POST /api/delete 지원)
 @app.route('/api/delete', methods=['POST'])
 @login_required
@@ -406,16 +537,10 @@ def delete_transaction_legacy():
     txn_id = data.get("id")
     if not txn_id:
         return jsonify({"status": "error", "error": "missing id"}), 400
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
-        c = conn.cursor()
-        c.execute('SELECT id FROM transactions WHERE user_id=? AND id=?', (current_user.id, txn_id))
-        if not c.fetchone():
+    with metrics.timed(metrics.DB_SECONDS, op='delete'):
+        if not db.find_transaction(current_user.id, txn_id, db_path=DB_PATH):
             return jsonify({"status": "error", "error": "not found"}), 404
-        c.execute("""
-            UPDATE transactions
-            SET deleted_at = datetime('now')
-            WHERE user_id=? AND id=? AND deleted_at IS NULL
-        """, (current_user.id, txn_id))
+        db.soft_delete_transaction(current_user.id, txn_id, DB_PATH)
     return jsonify({"status": "success", "deleted_id": txn_id})
 
 
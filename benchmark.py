@@ -0,0 +1,249 @@
+"""OCR 파이프라인 벤치마크 / 정확도 회귀 측정
+
+    python benchmark.py --count 40 --workers 2 --out bench.json
+    python benchmark.py --count 40 --out new.json --compare bench.json
+
+합성 영수증(가맹점/날짜/총금액을 알고 있는 템플릿 + 노이즈/회전/블러)을 만들어
+전처리 → OCR → 파싱 전 과정을 돌리고 단계별 지연 백분위, 코어당 처리량,
+최대 RSS, 필드별 정확도(가맹점/총금액/날짜)를 JSON 으로 기록한다.
+--compare 로 이전 결과와 비교해 회귀가 있으면 종료 코드 1.
+"""
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import datetime
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/nanum/NanumGothic.ttf",
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/System/Library/Fonts/AppleSDGothicNeo.ttc",
+    "C:/Windows/Fonts/malgun.ttf",
+]
+
+# (가맹점 표기, 기대 정규화 결과, 품목 후보)
+TEMPLATES = [
+    ("스타벅스 강남점", "스타벅스", [("아메리카노", 4500), ("카페라떼", 5000), ("케이크", 6500)]),
+    ("이디야커피", "이디야", [("아메리카노", 3200), ("바닐라라떼", 4200)]),
+    ("GS25 역삼점", "GS25", [("삼각김밥", 1200), ("생수", 900), ("컵라면", 1500)]),
+    ("CU 선릉점", "CU", [("도시락", 4900), ("음료", 1800)]),
+    ("파리바게뜨", "파리바게뜨", [("식빵", 3800), ("크로와상", 2900), ("우유", 2500)]),
+    ("이마트24", "이마트24", [("과자", 2000), ("맥주", 3500), ("아이스크림", 1500)]),
+    ("다이소", "다이소", [("수납함", 3000), ("건전지", 2000), ("볼펜", 1000)]),
+    ("올리브영", "올리브영", [("립밤", 8900), ("마스크팩", 3000)]),
+]
+
+FIELDS = ("가맹점", "총금액", "날짜")
+
+
+# ==========================
+# 합성 영수증
+# ==========================
+def find_font(path=None):
+    for candidate in ([path] if path else []) + FONT_CANDIDATES:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def render_receipt(rng, font_path, noise=8.0, max_rotation=3.0, blur=0.8):
+    store_label, store_expected, menu = rng.choice(TEMPLATES)
+    items = [(name, price, rng.randint(1, 3)) for name, price in rng.sample(menu, rng.randint(1, len(menu)))]
+    total = sum(price * qty for _, price, qty in items)
+    date = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randint(0, 600))
+    when = f"{date:%Y-%m-%d} {rng.randint(8, 22):02d}:{rng.randint(0, 59):02d}"
+
+    size = rng.randint(26, 34)
+    font = ImageFont.truetype(font_path, size) if font_path else ImageFont.load_default()
+    lines = [store_label, "", f"가맹점 {store_label}", f"사업자 {rng.randint(100, 999)}-{rng.randint(10, 99)}-{rng.randint(10000, 99999)}",
+             f"일시 {when}", "-" * 24]
+    lines += [f"{name} x{qty}  {price * qty:,}" for name, price, qty in items]
+    lines += ["-" * 24, f"합계 {total:,}", f"결제금액 {total:,}", "감사합니다"]
+
+    width, line_h = 640, int(size * 1.5)
+    img = Image.new("L", (width, line_h * (len(lines) + 4)), 255)
+    draw = ImageDraw.Draw(img)
+    for i, line in enumerate(lines):
+        draw.text((40, line_h * (i + 2)), line, fill=0, font=font)
+
+    # 배경 위에 올리고 회전/블러/노이즈
+    canvas = Image.new("L", (int(img.width * 1.3), int(img.height * 1.15)), rng.randint(60, 120))
+    canvas.paste(img, ((canvas.width - img.width) // 2, (canvas.height - img.height) // 2))
+    canvas = canvas.rotate(rng.uniform(-max_rotation, max_rotation), expand=True, fillcolor=90)
+    if blur:
+        canvas = canvas.filter(ImageFilter.GaussianBlur(rng.uniform(0, blur)))
+    arr = np.asarray(canvas, dtype=np.float32)
+    arr += np.random.default_rng(rng.randint(0, 2 ** 31)).normal(0, noise, arr.shape)
+    canvas = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8)).convert("RGB")
+
+    buf = io.BytesIO()
+    canvas.save(buf, format="JPEG", quality=rng.randint(70, 92))
+    expected = {"가맹점": store_expected, "총금액": total, "날짜": f"{date:%Y-%m-%d}"}
+    return buf.getvalue(), expected
+
+
+def make_corpus(count, seed, font_path, **kwargs):
+    rng = random.Random(seed)
+    return [render_receipt(rng, font_path, **kwargs) for _ in range(count)]
+
+
+# ==========================
+# 실행 (워커 프로세스)
+# ==========================
+def _normalize_date(value):
+    m = re.match(r'(\d{4})-(\d{1,2})-(\d{1,2})', value or "")
+    return f"{int(m.group(1)):04d}-{int(m.group(2)):02d}-{int(m.group(3)):02d}" if m else None
+
+
+def run_one(sample):
+    import pipeline  # 워커마다 엔진 핸들 초기화
+
+    image_bytes, expected = sample
+    t0 = time.perf_counter()
+    report = pipeline.StageReport()
+    try:
+        ocr = pipeline.ocr_pass(image_bytes, report)
+    except pipeline.ImageRejected as e:
+        # 품질 게이트 거절: 세 필드 모두 오답으로 세고 사유를 남김 (벤치 전체를 멈추지 않음)
+        stages = {s["stage"]: s["ms"] for s in report.stages}
+        stages["total"] = (time.perf_counter() - t0) * 1000
+        return {"stages": stages, "correct": dict.fromkeys(FIELDS, False), "peak_array_bytes": report.peak_bytes,
+                "tier": "rejected", "rejected": e.reason}
+    t1 = time.perf_counter()
+    parsed = pipeline.parse_ocr(ocr)
+    t2 = time.perf_counter()
+
+    stages = {s["stage"]: s["ms"] for s in report.stages}
+    stages["parse"] = (t2 - t1) * 1000
+    stages["total"] = (t2 - t0) * 1000
+    correct = {
+        "가맹점": parsed.get("가맹점") == expected["가맹점"],
+        "총금액": parsed.get("총금액") == expected["총금액"],
+        "날짜": _normalize_date(parsed.get("날짜")) == expected["날짜"],
+    }
+    return {"stages": stages, "correct": correct, "peak_array_bytes": report.peak_bytes, "tier": report.tier}
+
+
+# ==========================
+# 집계/비교
+# ==========================
+def percentiles(values):
+    arr = np.asarray(values, dtype=np.float64)
+    return {f"p{p}": round(float(np.percentile(arr, p)), 2) for p in (50, 90, 95, 99)} | {
+        "mean": round(float(arr.mean()), 2)}
+
+
+def peak_rss_mb():
+    # Linux: KB, macOS: bytes
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+    return round(self_rss, 1), round(child_rss, 1)
+
+
+def summarize(results, wall, workers):
+    stage_names = sorted({name for r in results for name in r["stages"]})
+    self_rss, child_rss = peak_rss_mb()
+    return {
+        "images": len(results),
+        "workers": workers,
+        "wall_sec": round(wall, 3),
+        "throughput_per_sec": round(len(results) / wall, 3),
+        "throughput_per_core": round(len(results) / wall / workers, 3),
+        "latency_ms": {name: percentiles([r["stages"][name] for r in results if name in r["stages"]])
+                       for name in stage_names},
+        "accuracy": {f: round(sum(r["correct"][f] for r in results) / len(results), 4) for f in FIELDS},
+        "tiers": dict(Counter(r["tier"] for r in results)),
+        "rejected": dict(Counter(r["rejected"] for r in results if r.get("rejected"))),
+        "peak_array_mb": round(max(r["peak_array_bytes"] for r in results) / 1024 / 1024, 2),
+        "peak_rss_mb": {"main": self_rss, "workers_max": child_rss},
+    }
+
+
+def compare(current, baseline, tolerance):
+    """지연 p95 가 tolerance 비율 이상 늘거나 정확도가 떨어지면 회귀로 보고"""
+    regressions = []
+    for stage, stats in current["latency_ms"].items():
+        base = baseline.get("latency_ms", {}).get(stage)
+        if base and base["p95"] > 0 and stats["p95"] > base["p95"] * (1 + tolerance):
+            regressions.append(f"latency {stage} p95 {base['p95']} → {stats['p95']} ms")
+    rejected, base_rejected = sum(current["rejected"].values()), sum(baseline.get("rejected", {}).values())
+    if rejected > base_rejected:
+        regressions.append(f"rejected images {base_rejected} → {rejected}")
+    for field, acc in current["accuracy"].items():
+        base = baseline.get("accuracy", {}).get(field)
+        if base is not None and acc < base - 0.02:
+            regressions.append(f"accuracy {field} {base} → {acc}")
+    base_tp = baseline.get("throughput_per_core")
+    if base_tp and current["throughput_per_core"] < base_tp * (1 - tolerance):
+        regressions.append(f"throughput/core {base_tp} → {current['throughput_per_core']}")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="OCR pipeline benchmark")
+    ap.add_argument("--count", type=int, default=30)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--font", help="한글 TTF/TTC 경로 (없으면 시스템에서 탐색)")
+    ap.add_argument("--noise", type=float, default=8.0)
+    ap.add_argument("--rotation", type=float, default=3.0)
+    ap.add_argument("--blur", type=float, default=0.8)
+    ap.add_argument("--out", default="bench.json")
+    ap.add_argument("--compare", help="이전 결과 JSON (회귀 검사)")
+    ap.add_argument("--tolerance", type=float, default=0.15)
+    args = ap.parse_args(argv)
+
+    font_path = find_font(args.font)
+    if not font_path:
+        print("⚠ 한글 폰트를 찾지 못했습니다 (--font 지정 권장). 기본 폰트로 렌더링합니다.")
+    corpus = make_corpus(args.count, args.seed, font_path,
+                         noise=args.noise, max_rotation=args.rotation, blur=args.blur)
+
+    # 측정 전 엔진/핸들 워밍업 (첫 호출의 초기화 비용 제외)
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(run_one, corpus[:args.workers]))
+        start = time.perf_counter()
+        results = list(pool.map(run_one, corpus))
+        wall = time.perf_counter() - start
+
+    import pipeline
+    from ocr_engine import get_engine
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {"count": args.count, "seed": args.seed, "noise": args.noise, "rotation": args.rotation,
+                   "blur": args.blur, "font": font_path, "ocr_mode": pipeline.OCR_MODE,
+                   "backend": get_engine().name, "preprocess_version": pipeline.PREPROCESS_VERSION},
+        "host": {"python": platform.python_version(), "cpus": os.cpu_count(), "machine": platform.machine()},
+        **summarize(results, wall, args.workers),
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(json.dumps({k: report[k] for k in ("throughput_per_core", "accuracy", "tiers", "rejected", "peak_rss_mb")}, ensure_ascii=False))
+    print(f"total p95: {report['latency_ms']['total']['p95']} ms → {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"❌ 회귀: {r}")
+        if regressions:
+            return 1
+        print("✅ 회귀 없음")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+import parser
+import aggregates
+import store_learning
+import user_store
+import image_store
+
+# ==========================
+# 설정
+# ==========================
+DB_PATH = os.getenv("DB_PATH", "user_data.db")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# WAL 에서는 NORMAL 이어도 커밋 단위 일관성 보장 (전원 장애 시 마지막 커밋만 유실 가능)
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+DB_STATEMENT_CACHE = 256
+# 여러 OCR 작업의 INSERT 를 한 트랜잭션으로 묶는 그룹 커밋 writer
+DB_GROUP_COMMIT = os.getenv("DB_GROUP_COMMIT", "1") == "1"
+DB_GROUP_COMMIT_MAX = int(os.getenv("DB_GROUP_COMMIT_MAX", "64"))
+DB_GROUP_COMMIT_WAIT_MS = int(os.getenv("DB_GROUP_COMMIT_WAIT_MS", "5"))
+
+TRANSACTION_FIELDS = ("id", "store", "amount", "date", "category", "ocr_store")
+SCHEMA_VERSION = 8
+
+
+# ==========================
+# 연결 (스레드별 재사용)
+# ==========================
+_local = threading.local()
+
+
+def _open(db_path):
+    conn = sqlite3.connect(db_path, timeout=DB_BUSY_TIMEOUT_MS / 1000,
+                           cached_statements=DB_STATEMENT_CACHE)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(f'PRAGMA synchronous={DB_SYNCHRONOUS}')
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+    return conn
+
+
+def connect(db_path=DB_PATH):
+    """현재 스레드의 연결 (프로세스/스레드마다 1개, 닫지 않고 재사용 → prepared statement 캐시 유지)"""
+    conns = getattr(_local, 'conns', None)
+    if conns is None or getattr(_local, 'pid', None) != os.getpid():
+        conns = _local.conns = {}
+        _local.pid = os.getpid()
+    conn = conns.get(db_path)
+    if conn is None:
+        conn = conns[db_path] = _open(db_path)
+    return conn
+
+
+# ==========================
+# 스키마/마이그레이션
+# ==========================
+def init_db(db_path=DB_PATH):
+    """기본 테이블 생성 + deleted_at 컬럼 자동 보강"""
+    conn = connect(db_path)
+    with conn:
+        c = conn.cursor()
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS transactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                store TEXT,
+                amount INTEGER,
+                date TEXT,
+                category TEXT,
+                ocr_store TEXT
+                -- deleted_at 은 아래 보강 루틴에서 필요 시 추가
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS user_budget (
+                user_id TEXT PRIMARY KEY,
+                budget INTEGER
+            )
+        ''')
+        # deleted_at 없으면 추가
+        c.execute("PRAGMA table_info(transactions)")
+        cols = [row[1] for row in c.fetchall()]
+        if 'deleted_at' not in cols:
+            c.execute("ALTER TABLE transactions ADD COLUMN deleted_at TEXT")
+        migrate_db(conn)
+
+
+def migrate_db(conn):
+    """PRAGMA user_version 기준 단계별 마이그레이션"""
+    c = conn.cursor()
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+
+    if version < 1:
+        # v1: 정규화된 연-월(ym) 컬럼 + (user_id, ym) 부분 커버링 인덱스
+        #     (deleted_at 은 항상 NULL 이지만 포함해야 SQLite 가 테이블을 안 읽음)
+        cols = [row[1] for row in c.execute("PRAGMA table_info(transactions)")]
+        if 'ym' not in cols:
+            c.execute("ALTER TABLE transactions ADD COLUMN ym TEXT")
+        last_id = 0
+        while True:
+            rows = c.execute("SELECT id, date FROM transactions WHERE id > ? ORDER BY id LIMIT 5000",
+                             (last_id,)).fetchall()
+            if not rows:
+                break
+            c.executemany("UPDATE transactions SET ym=? WHERE id=?",
+                          [(parser.month_key(date), id_) for id_, date in rows])
+            last_id = rows[-1][0]
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_ym
+            ON transactions(user_id, ym, category, amount, deleted_at)
+            WHERE deleted_at IS NULL
+        ''')
+
+    if version < 2:
+        # v2: 트리거로 증분 유지되는 사용자별 월/카테고리 집계 테이블
+        aggregates.install(conn)
+        aggregates.rebuild(conn)
+
+    if version < 3:
+        # v3: 사용자별 변경 카운터 (ETag) + 목록 조회용 부분 인덱스
+        c.execute('CREATE TABLE IF NOT EXISTS user_data_version (user_id TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+        for event, ref in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            c.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_transactions_version_{event.lower()}
+                AFTER {event} ON transactions
+                BEGIN
+                    INSERT INTO user_data_version (user_id, version)
+                    VALUES (COALESCE({ref}.user_id, ''), 1)
+                    ON CONFLICT(user_id) DO UPDATE SET version = version + 1;
+                END
+            ''')
+        c.execute('''
+            CREATE INDEX IF NOT EXISTS idx_transactions_user_active
+            ON transactions(user_id, id)
+            WHERE deleted_at IS NULL
+        ''')
+
+    if version < 4:
+        # v4: 가맹점 교정 학습 store_learning.json → store_aliases (공용 별칭)
+        store_learning.install(conn)
+        store_learning.import_json(conn)
+
+    if version < 5:
+        # v5: OCR 캐시 키 (재파싱 시 원문 조회) + 사용자가 직접 고친 필드 목록 (',store,amount,' 형태,
+        #     새 행은 '' / 이전 행은 NULL = 수정 이력 모름)
+        cols = [row[1] for row in c.execute("PRAGMA table_info(transactions)")]
+        if 'ocr_key' not in cols:
+            c.execute("ALTER TABLE transactions ADD COLUMN ocr_key TEXT")
+        if 'corrected_fields' not in cols:
+            c.execute("ALTER TABLE transactions ADD COLUMN corrected_fields TEXT")
+
+    if version < 6:
+        # v6: 로그인 사용자 (여러 gunicorn 워커/레플리카가 공유, 이전에는 app.py 의 프로세스 메모리)
+        user_store.install(conn)
+
+    if version < 7:
+        # v7: 영수증 이미지 보관소 인덱스 + 거래별 이미지 해시
+        image_store.install(conn)
+        cols = [row[1] for row in c.execute("PRAGMA table_info(transactions)")]
+        if 'image_hash' not in cols:
+            c.execute("ALTER TABLE transactions ADD COLUMN image_hash TEXT")
+
+    if version < 8:
+        # v8: 이미지 참조 수 (거래 영구 삭제 시 마지막 참조였으면 원본/축소본 삭제)
+        image_store.install_refs(conn)
+
+    if version < SCHEMA_VERSION:
+        c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+
+# ==========================
+# transactions
+# ==========================
+INSERT_TRANSACTION_SQL = '''
+    INSERT INTO transactions (user_id, store, amount, date, category, ocr_store, ym, ocr_key, image_hash,
+                              corrected_fields, deleted_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, '', NULL)
+'''
+
+
+def insert_transaction(row, db_path=DB_PATH):
+    """row: pipeline.build_row 튜플 → 새 id (그룹 커밋 활성 시 다른 INSERT 와 한 트랜잭션)"""
+    if DB_GROUP_COMMIT:
+        return get_writer(db_path).submit(lambda conn: conn.execute(INSERT_TRANSACTION_SQL, row).lastrowid).result()
+    conn = connect(db_path)
+    with conn:
+        return conn.execute(INSERT_TRANSACTION_SQL, row).lastrowid
+
+
+def insert_transactions(rows, db_path=DB_PATH):
+    """여러 건을 한 트랜잭션으로 저장 (배치 업로드)"""
+    if not rows:
+        return 0
+    conn = connect(db_path)
+    with conn:
+        conn.executemany(INSERT_TRANSACTION_SQL, rows)
+    return len(rows)
+
+
+def user_data_version(user_id, db_path=DB_PATH):
+    row = connect(db_path).execute('SELECT version FROM user_data_version WHERE user_id=?', (user_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def list_transactions(user_id, fields=TRANSACTION_FIELDS, after_id=None, limit=None,
+                      month_from=None, month_to=None, category=None, db_path=DB_PATH):
+    """id 내림차순 keyset 페이지 (fields 는 TRANSACTION_FIELDS 안에서만)"""
+    fields = [f for f in fields if f in TRANSACTION_FIELDS]
+    where, params = ['user_id=?', 'deleted_at IS NULL'], [user_id]
+    if after_id is not None:
+        where.append('id < ?')
+        params.append(after_id)
+    if month_from:
+        where.append('ym >= ?')
+        params.append(month_from)
+    if month_to:
+        where.append('ym <= ?')
+        params.append(month_to)
+    if category:
+        where.append('category = ?')
+        params.append(category)
+    sql = f"SELECT {', '.join(fields)} FROM transactions WHERE {' AND '.join(where)} ORDER BY id DESC"
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return connect(db_path).execute(sql, params).fetchall()
+
+
+def month_category_totals(user_id, db_path=DB_PATH):
+    """[(ym, category, total, cnt)] — 트리거로 유지되는 집계 테이블"""
+    return connect(db_path).execute('''
+        SELECT ym, category, total, cnt
+        FROM user_month_category
+        WHERE user_id=?
+        ORDER BY ym, category
+    ''', (user_id,)).fetchall()
+
+
+def transaction_image_hash(user_id, transaction_id, db_path=DB_PATH):
+    """활성 거래의 이미지 해시 (이미지 없이 저장됐거나 없는 거래면 None)"""
+    row = connect(db_path).execute(
+        'SELECT image_hash FROM transactions WHERE user_id=? AND id=? AND deleted_at IS NULL',
+        (user_id, transaction_id)).fetchone()
+    return row[0] if row else None
+
+
+def find_transaction(user_id, transaction_id, deleted=None, db_path=DB_PATH):
+    """deleted: None=상관없음, False=활성만, True=삭제된 것만"""
+    sql = 'SELECT id FROM transactions WHERE user_id=? AND id=?'
+    if deleted is True:
+        sql += ' AND deleted_at IS NOT NULL'
+    elif deleted is False:
+        sql += ' AND deleted_at IS NULL'
+    return connect(db_path).execute(sql, (user_id, transaction_id)).fetchone() is not None
+
+
+CORRECTABLE_FIELDS = ("store", "amount", "date", "category")
+
+# 사용자 수정 시 corrected_fields 에 필드명을 남김 → reparse.py 가 덮어쓰지 않음
+_MARK_CORRECTED = """
+    corrected_fields = CASE
+        WHEN instr(COALESCE(corrected_fields, ''), ',{field},') THEN corrected_fields
+        ELSE COALESCE(NULLIF(corrected_fields, ''), ',') || '{field},'
+    END
+"""
+_UPDATE_SQL = {
+    field: f"UPDATE transactions SET {field}=?, {_MARK_CORRECTED.format(field=field)} WHERE user_id=? AND id=?"
+    for field in ("store", "amount", "category")
+}
+_UPDATE_SQL["date"] = f"UPDATE transactions SET date=?, ym=?, {_MARK_CORRECTED.format(field='date')} WHERE user_id=? AND id=?"
+
+
+def update_transaction_field(user_id, transaction_id, field, value, db_path=DB_PATH):
+    conn = connect(db_path)
+    with conn:
+        if field == "date":
+            conn.execute(_UPDATE_SQL[field], (value, parser.month_key(value), user_id, transaction_id))
+        else:
+            conn.execute(_UPDATE_SQL[field], (value, user_id, transaction_id))
+
+
+def soft_delete_transaction(user_id, transaction_id, db_path=DB_PATH):
+    conn = connect(db_path)
+    with conn:
+        conn.execute('''
+            UPDATE transactions
+            SET deleted_at = datetime('now')
+            WHERE user_id=? AND id=? AND deleted_at IS NULL
+        ''', (user_id, transaction_id))
+
+
+def hard_delete_transaction(user_id, transaction_id, db_path=DB_PATH):
+    """영구 삭제 — 이미지의 마지막 참조였으면 원본/축소본도 같은 쓰기 트랜잭션에서 삭제"""
+    conn = connect(db_path)
+    conn.execute('BEGIN IMMEDIATE')
+    with conn:
+        row = conn.execute('SELECT image_hash FROM transactions WHERE user_id=? AND id=?',
+                           (user_id, transaction_id)).fetchone()
+        conn.execute('DELETE FROM transactions WHERE user_id=? AND id=?', (user_id, transaction_id))
+        if row and row[0]:
+            image_store.release_unreferenced(conn, [row[0]])
+
+
+def restore_transaction(user_id, transaction_id, db_path=DB_PATH):
+    conn = connect(db_path)
+    with conn:
+        conn.execute('UPDATE transactions SET deleted_at=NULL WHERE user_id=? AND id=?',
+                     (user_id, transaction_id))
+
+
+# ==========================
+# 예산
+# ==========================
+def get_budget(user_id, db_path=DB_PATH):
+    row = connect(db_path).execute('SELECT budget FROM user_budget WHERE user_id=?', (user_id,)).fetchone()
+    return int(row[0]) if row else None
+
+
+def set_budget(user_id, budget, db_path=DB_PATH):
+    conn = connect(db_path)
+    with conn:
+        conn.execute('INSERT OR REPLACE INTO user_budget (user_id, budget) VALUES (?, ?)', (user_id, budget))
+
+
+# ==========================
+# 그룹 커밋 writer
+# ==========================
+class GroupCommitWriter:
+    """submit(fn) 으로 받은 쓰기 작업들을 짧게 모아 한 트랜잭션(한 번의 fsync)으로 커밋
+
+    fn(conn) 의 반환값이 Future 결과가 된다. 한 작업이 실패하면 savepoint 로 그 작업만 되돌린다.
+    """
+
+    def __init__(self, db_path=DB_PATH, max_batch=DB_GROUP_COMMIT_MAX, wait_ms=DB_GROUP_COMMIT_WAIT_MS):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name='db-group-commit', daemon=True).start()
+
+    def submit(self, fn):
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+
+    def _drain(self):
+        batch = [self._queue.get()]
+        try:
+            while len(batch) < self.max_batch:
+                batch.append(self._queue.get(timeout=self.wait))
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        conn = connect(self.db_path)
+        while True:
+            batch = self._drain()
+            results = []
+            try:
+                # 명시적으로 트랜잭션을 먼저 열어야 함: 열린 트랜잭션 없이 SAVEPOINT 를 쓰면
+                # RELEASE 가 곧 커밋이라 작업마다 fsync 가 일어난다
+                conn.execute('BEGIN IMMEDIATE')
+                with conn:
+                    for fn, future in batch:
+                        conn.execute('SAVEPOINT item')
+                        try:
+                            results.append((future, fn(conn), None))
+                            conn.execute('RELEASE item')
+                        except Exception as e:
+                            conn.execute('ROLLBACK TO item')
+                            conn.execute('RELEASE item')
+                            results.append((future, None, e))
+            except Exception as e:
+                # 커밋 자체 실패 → 묶음 전체 실패
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for future, value, error in results:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(value)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(db_path=DB_PATH):
+    """프로세스당 DB 파일별 writer 1개"""
+    key = (os.getpid(), db_path)
+    writer = _writers.get(key)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                writer = _writers[key] = GroupCommitWriter(db_path)
+    return writer
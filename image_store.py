@@ -0,0 +1,358 @@
+"""영수증 이미지 보관소 (내용 주소 기반, 해시로 샤딩한 디렉터리)
+
+    <IMAGE_STORE_DIR>/originals/ab/cd/<sha256>.<ext>   업로드 원본 (용량 상한 초과 시 오래 안 본 것부터 삭제)
+    <IMAGE_STORE_DIR>/thumbs/ab/cd/<sha256>.webp       축소본 (삭제하지 않음)
+
+images 테이블이 해시별 형식/크기/마지막 조회 시각/참조 수를 갖고, 원본 총 용량은 트리거가
+image_usage 에 증분 유지한다. 같은 이미지를 다시 올리면 파일은 그대로 두고 조회 시각만 갱신.
+
+참조 수(refs)는 put 할 때 1 예약하고 (그 해시로 저장될 거래 1건 몫), 거래가 영구 삭제되면
+트리거가 줄인다. 0 이 되면 같은 쓰기 트랜잭션에서 행과 원본/축소본 파일을 지운다.
+파일은 잠금 밖에서 임시 파일로 써 두고, 쓰기 잠금(BEGIN IMMEDIATE) 안에서는 존재 확인, 행 갱신,
+이름 바꾸기(os.replace)와 삭제만 해서 같은 해시의 put 과 엇갈리지 않으면서 잠금을 짧게 쥔다.
+
+    python image_store.py stats
+    python image_store.py evict            # 상한까지 원본 정리 (업로드 때도 자동)
+    python image_store.py gc               # 참조 수 재계산 + 거래 저장에 실패해 남은 이미지 삭제
+"""
+import os
+import io
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import mimetypes
+
+from PIL import Image
+
+import db  # db 도 이 모듈을 import (마이그레이션) → 모듈 수준에서 db 속성을 쓰지 말 것
+
+# ==========================
+# 설정
+# ==========================
+IMAGE_STORE_ENABLED = os.getenv("IMAGE_STORE_ENABLED", "1") == "1"
+IMAGE_STORE_DIR = os.getenv("IMAGE_STORE_DIR", "image_store")
+IMAGE_STORE_MAX_BYTES = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))  # 원본 합계
+THUMB_MAX_SIDE = int(os.getenv("THUMB_MAX_SIDE", "480"))
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "70"))
+TOUCH_INTERVAL_SEC = 3600  # 조회 시각은 이 간격 이상 지났을 때만 기록 (읽기마다 쓰기 방지)
+ORPHAN_GRACE_SEC = 3600  # gc: 참조 없는 이미지도 이 시간 안에 올라온 것은 (거래 저장 중일 수 있어) 남김
+
+_EXTS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "BMP": "bmp", "TIFF": "tif"}
+
+CREATE_SQL = [
+    '''
+    CREATE TABLE IF NOT EXISTS images (
+        hash TEXT PRIMARY KEY,
+        ext TEXT NOT NULL,
+        original_bytes INTEGER NOT NULL,   -- 0: 원본 삭제됨 (축소본만 남음)
+        thumb_ext TEXT,
+        thumb_bytes INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT DEFAULT (datetime('now')),
+        last_access REAL NOT NULL
+    ) WITHOUT ROWID
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_images_original_access
+    ON images(last_access) WHERE original_bytes > 0
+    ''',
+    'CREATE TABLE IF NOT EXISTS image_usage (id INTEGER PRIMARY KEY CHECK (id = 0), original_bytes INTEGER NOT NULL)',
+    'INSERT OR IGNORE INTO image_usage (id, original_bytes) VALUES (0, 0)',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_images_usage_insert AFTER INSERT ON images
+    BEGIN
+        UPDATE image_usage SET original_bytes = original_bytes + NEW.original_bytes WHERE id = 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_images_usage_update AFTER UPDATE OF original_bytes ON images
+    BEGIN
+        UPDATE image_usage SET original_bytes = original_bytes + NEW.original_bytes - OLD.original_bytes WHERE id = 0;
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_images_usage_delete AFTER DELETE ON images
+    BEGIN
+        UPDATE image_usage SET original_bytes = original_bytes - OLD.original_bytes WHERE id = 0;
+    END
+    ''',
+]
+
+UPSERT_SQL = '''
+    INSERT INTO images (hash, ext, original_bytes, thumb_ext, thumb_bytes, last_access, refs)
+    VALUES (?, ?, ?, ?, ?, ?, 1)
+    ON CONFLICT(hash) DO UPDATE
+    SET ext = excluded.ext, original_bytes = excluded.original_bytes,
+        thumb_ext = COALESCE(images.thumb_ext, excluded.thumb_ext),
+        thumb_bytes = MAX(images.thumb_bytes, excluded.thumb_bytes),
+        last_access = excluded.last_access,
+        refs = images.refs + 1
+'''
+
+# 거래 기준 참조 수 재계산 (v8 마이그레이션, gc)
+RECOUNT_REFS_SQL = '''
+    UPDATE images SET refs = COALESCE((
+        SELECT n FROM (
+            SELECT image_hash, COUNT(*) AS n FROM transactions WHERE image_hash IS NOT NULL GROUP BY image_hash
+        ) AS t WHERE t.image_hash = images.hash), 0)
+'''
+
+
+def install(conn):
+    for sql in CREATE_SQL:
+        conn.execute(sql)
+
+
+def install_refs(conn):
+    """images.refs + 거래 영구 삭제 시 참조를 줄이는 트리거 (transactions.image_hash 필요)"""
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(images)")]
+    if 'refs' not in cols:
+        conn.execute("ALTER TABLE images ADD COLUMN refs INTEGER NOT NULL DEFAULT 0")
+    conn.execute(RECOUNT_REFS_SQL)
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_image_release AFTER DELETE ON transactions
+        WHEN OLD.image_hash IS NOT NULL
+        BEGIN
+            UPDATE images SET refs = refs - 1 WHERE hash = OLD.image_hash;
+        END
+    ''')
+
+
+# ==========================
+# 경로
+# ==========================
+def content_hash(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def _path(kind, digest, ext, root=None):
+    return os.path.join(root or IMAGE_STORE_DIR, kind, digest[:2], digest[2:4], f"{digest}.{ext}")
+
+
+def _write_temp(path, data):
+    """path 와 같은 디렉터리의 임시 파일에 씀 → (임시 경로, path). os.replace 로 옮기거나 지울 것"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return tmp, path
+
+
+def _format_ext(image_bytes):
+    fp = image_bytes if hasattr(image_bytes, "seek") else io.BytesIO(image_bytes)
+    try:
+        fp.seek(0)
+        with Image.open(fp) as im:
+            return _EXTS.get(im.format, "bin")
+    except Exception:
+        return "bin"
+
+
+def make_thumbnail(image_bytes, max_side=THUMB_MAX_SIDE, quality=THUMB_QUALITY):
+    """(bytes, ext) — WebP, 인코더가 없으면 JPEG. 디코드도 축소 해상도로 (preprocess.decode_image)"""
+    import cv2  # 마이그레이션만 하는 db 사용처가 OpenCV 를 끌어오지 않도록 여기서
+    from preprocess import decode_image
+    img = decode_image(image_bytes, color=True, max_pixels=max_side * max_side * 4)
+    h, w = img.shape[:2]
+    scale = max_side / float(max(h, w))
+    if scale < 1:
+        img = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    for ext, params in (("webp", [cv2.IMWRITE_WEBP_QUALITY, quality]), ("jpg", [cv2.IMWRITE_JPEG_QUALITY, quality])):
+        try:
+            ok, buf = cv2.imencode("." + ext, img, params)
+        except cv2.error:
+            ok = False
+        if ok:
+            return buf.tobytes(), ext
+    raise ValueError("Thumbnail encoding failed")
+
+
+# ==========================
+# 저장/조회
+# ==========================
+def put(image_bytes, db_path=None, root=None):
+    """원본 + 축소본 저장 → sha256 (비활성화 시 None), 참조 1 예약. 이미 있으면 조회 시각만 갱신"""
+    if not IMAGE_STORE_ENABLED:
+        return None
+    digest = content_hash(image_bytes)
+    conn = db.connect(db_path or db.DB_PATH)
+    row = conn.execute('SELECT ext, original_bytes, thumb_ext FROM images WHERE hash=?', (digest,)).fetchone()
+    if row and row[1] > 0 and row[2]:
+        with conn:
+            touched = conn.execute('''
+                UPDATE images SET last_access=?, refs = refs + 1 WHERE hash=? AND original_bytes > 0
+            ''', (time.time(), digest)).rowcount
+        if touched:
+            return digest
+        row = None  # 그 사이 정리됨 → 다시 저장
+
+    ext = _format_ext(image_bytes)
+    encode_thumb = not (row and row[2])
+    while True:
+        # 인코딩과 파일 쓰기는 잠금 밖에서 (임시 파일)
+        thumb = _thumbnail_or_none(image_bytes) if encode_thumb else None
+        staged = [_write_temp(_path("originals", digest, ext, root), image_bytes)]
+        if thumb:
+            staged.append(_write_temp(_path("thumbs", digest, thumb[1], root), thumb[0]))
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            with conn:
+                current = conn.execute('SELECT thumb_ext FROM images WHERE hash=?', (digest,)).fetchone()
+                has_thumb = bool(current and current[0])
+                if not has_thumb and not encode_thumb:
+                    encode_thumb = True  # 드묾: 확인과 잠금 사이에 축소본까지 정리됨 → 잠금 밖에서 만들고 다시
+                    continue
+                thumb_ext, thumb_bytes = None, 0
+                if thumb and not has_thumb:
+                    os.replace(*staged[1])
+                    thumb_ext, thumb_bytes = thumb[1], len(thumb[0])
+                os.replace(*staged[0])
+                conn.execute(UPSERT_SQL, (digest, ext, len(image_bytes), thumb_ext, thumb_bytes, time.time()))
+                # 잠금을 쥔 채로 파일 삭제 → 다른 프로세스의 같은 해시 put 이 끼어들 수 없음
+                _unlink(_evict(conn, IMAGE_STORE_MAX_BYTES, root))
+            return digest
+        finally:
+            _unlink([tmp for tmp, _ in staged])  # 옮기지 않은 임시 파일 (이미 있는 축소본, 실패)
+
+
+def _thumbnail_or_none(image_bytes):
+    """(bytes, ext) 또는 None (디코드 불가 이미지: 원본만)"""
+    try:
+        return make_thumbnail(image_bytes)
+    except ValueError:
+        return None
+
+
+def _evict(conn, max_bytes, root=None):
+    """원본 합계가 상한을 넘으면 가장 오래 안 본 원본부터 0 으로 표시 → 지울 파일 경로 목록
+
+    BEGIN IMMEDIATE 트랜잭션 안에서 불러 커밋 전에(잠금을 쥔 채) 파일을 지울 것.
+    """
+    used = conn.execute('SELECT original_bytes FROM image_usage WHERE id = 0').fetchone()[0]
+    paths = []
+    while used > max_bytes:
+        rows = conn.execute('''
+            SELECT hash, ext, original_bytes FROM images
+            WHERE original_bytes > 0 ORDER BY last_access LIMIT 256
+        ''').fetchall()
+        if not rows:
+            break
+        for digest, ext, size in rows:
+            if used <= max_bytes:
+                break
+            conn.execute('UPDATE images SET original_bytes = 0 WHERE hash=?', (digest,))
+            paths.append(_path("originals", digest, ext, root))
+            used -= size
+    return paths
+
+
+def _unlink(paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def release_unreferenced(conn, digests, root=None):
+    """참조가 0 이 된 이미지의 행과 원본/축소본 파일 삭제 → 삭제한 이미지 수
+
+    거래를 지운 쓰기 트랜잭션(BEGIN IMMEDIATE) 안에서 불러야 같은 해시의 put 과 엇갈리지 않는다.
+    """
+    released = 0
+    for digest in {d for d in digests if d}:
+        row = conn.execute('SELECT ext, original_bytes, thumb_ext FROM images WHERE hash=? AND refs <= 0',
+                           (digest,)).fetchone()
+        if not row:
+            continue
+        ext, original_bytes, thumb_ext = row
+        conn.execute('DELETE FROM images WHERE hash=?', (digest,))
+        paths = [_path("originals", digest, ext, root)] if original_bytes > 0 else []
+        if thumb_ext:
+            paths.append(_path("thumbs", digest, thumb_ext, root))
+        _unlink(paths)
+        released += 1
+    return released
+
+
+def gc(db_path=None, grace_sec=ORPHAN_GRACE_SEC, root=None):
+    """참조 수를 거래 기준으로 다시 세고, 참조 없는 오래된 이미지 (put 후 거래 저장 실패) 삭제"""
+    conn = db.connect(db_path or db.DB_PATH)
+    conn.execute('BEGIN IMMEDIATE')
+    with conn:
+        conn.execute(RECOUNT_REFS_SQL)
+        orphans = [r[0] for r in conn.execute('SELECT hash FROM images WHERE refs <= 0 AND last_access < ?',
+                                              (time.time() - grace_sec,))]
+        return release_unreferenced(conn, orphans, root)
+
+
+def locate(digest, size="original", db_path=None, root=None):
+    """(파일 경로, mimetype) — 없거나 원본이 정리됐으면 None"""
+    conn = db.connect(db_path or db.DB_PATH)
+    row = conn.execute('SELECT ext, original_bytes, thumb_ext, last_access FROM images WHERE hash=?',
+                       (digest,)).fetchone()
+    if not row:
+        return None
+    ext, original_bytes, thumb_ext, last_access = row
+    if size == "thumb":
+        path, ext = (_path("thumbs", digest, thumb_ext, root), thumb_ext) if thumb_ext else (None, None)
+    else:
+        path = _path("originals", digest, ext, root) if original_bytes > 0 else None
+        now = time.time()
+        if path and now - last_access > TOUCH_INTERVAL_SEC:
+            with conn:
+                conn.execute('UPDATE images SET last_access=? WHERE hash=?', (now, digest))
+    if not path or not os.path.exists(path):
+        return None
+    return path, mimetypes.guess_type("x." + ext)[0] or "application/octet-stream"
+
+
+def read_original(digest, db_path=None, root=None):
+    """원본 bytes (reparse.py --reocr 용), 없으면 None"""
+    found = locate(digest, "original", db_path, root)
+    if not found:
+        return None
+    with open(found[0], "rb") as f:
+        return f.read()
+
+
+def stats(db_path=None):
+    conn = db.connect(db_path or db.DB_PATH)
+    used = conn.execute('SELECT original_bytes FROM image_usage WHERE id = 0').fetchone()[0]
+    images, originals, thumbs = conn.execute('''
+        SELECT COUNT(*), SUM(original_bytes > 0), COALESCE(SUM(thumb_bytes), 0) FROM images
+    ''').fetchone()
+    return {"images": images, "originals": originals or 0, "original_bytes": used,
+            "thumb_bytes": thumbs, "max_bytes": IMAGE_STORE_MAX_BYTES}
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="영수증 이미지 보관소")
+    ap.add_argument("command", choices=["stats", "evict", "gc"])
+    ap.add_argument("--db", default=None)
+    ap.add_argument("--max-bytes", type=int, default=IMAGE_STORE_MAX_BYTES)
+    args = ap.parse_args(argv)
+
+    db_path = args.db or db.DB_PATH
+    db.init_db(db_path)
+    if args.command == "evict":
+        conn = db.connect(db_path)
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            paths = _evict(conn, args.max_bytes)
+            _unlink(paths)
+        print(f"원본 {len(paths)}개 삭제")
+    elif args.command == "gc":
+        print(f"참조 없는 이미지 {gc(db_path)}개 삭제")
+    print(json.dumps(stats(db_path), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import db
+import pipeline
+import metrics
+
+# ==========================
+# 설정
+# ==========================
+def _default_workers():
+    # Tesseract 내부 스레드(OMP_THREAD_LIMIT) × 워커 수 × gunicorn 워커 수가 코어 수를 넘지 않게
+    omp = max(1, int(os.getenv("OMP_THREAD_LIMIT", "1")))
+    web = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    return max(1, (os.cpu_count() or 1) // omp // web)
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or _default_workers()
+OCR_MAX_QUEUE = int(os.getenv("OCR_MAX_QUEUE", "20"))          # queued + running 상한 (초과 시 429)
+OCR_JOB_STALE_SEC = int(os.getenv("OCR_JOB_STALE_SEC", "300"))  # running 상태로 방치된 작업 재큐잉 기준
+OCR_JOB_TTL_SEC = int(os.getenv("OCR_JOB_TTL_SEC", "86400"))    # done/failed 작업 행 보관 기간
+POLL_INTERVAL = 0.2
+
+
+class QueueFull(Exception):
+    pass
+
+
+def init_jobs_table(db_path):
+    conn = db.connect(db_path)
+    with conn:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS ocr_jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT,
+                status TEXT,            -- queued / running / done / failed
+                image BLOB,
+                result TEXT,
+                error TEXT,
+                created_at TEXT DEFAULT (datetime('now')),
+                updated_at TEXT DEFAULT (datetime('now'))
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_jobs_status ON ocr_jobs(status, created_at)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_jobs_status_updated ON ocr_jobs(status, updated_at)')
+
+
+# ==========================
+# SQLite 기반 작업 큐 + 프로세스 풀
+# ==========================
+class JobQueue:
+    def __init__(self, db_path, workers=OCR_WORKERS, max_queue=OCR_MAX_QUEUE):
+        self.db_path = db_path
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool = None
+        self._slots = threading.Semaphore(workers)
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._started = False
+        self.inflight = 0
+
+    def _connect(self):
+        return db.connect(self.db_path)
+
+    def ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if self._started:
+                return
+            init_jobs_table(self.db_path)
+            self._pool = self._new_pool()
+            threading.Thread(target=self._dispatch_loop, name='ocr-dispatcher', daemon=True).start()
+            self._started = True
+
+    def executor(self):
+        """배치 업로드처럼 큐를 거치지 않고 직접 팬아웃할 때 쓰는 워커 풀"""
+        self.ensure_started()
+        return self._pool
+
+    # ---------- 요청 스레드용 API ----------
+    def depth(self):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM ocr_jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+    def submit(self, user_id, image_bytes):
+        self.ensure_started()
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        # 깊이 검사와 INSERT 를 한 IMMEDIATE 트랜잭션으로 (동시 제출이 상한을 넘지 않게)
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            depth = conn.execute(
+                "SELECT COUNT(*) FROM ocr_jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+            if depth >= self.max_queue:
+                raise QueueFull()
+            conn.execute("INSERT INTO ocr_jobs (id, user_id, status, image) VALUES (?, ?, 'queued', ?)",
+                         (job_id, user_id, sqlite3.Binary(image_bytes)))
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id, user_id):
+        row = self._connect().execute('''
+            SELECT status, result, error, created_at, updated_at
+            FROM ocr_jobs WHERE id=? AND user_id=?
+        ''', (job_id, user_id)).fetchone()
+        if not row:
+            return None
+        status, result, error, created_at, updated_at = row
+        job = {"job_id": job_id, "state": status, "created_at": created_at, "updated_at": updated_at}
+        if result:
+            job.update(json.loads(result))
+        if error:
+            job["error"] = error
+        return job
+
+    def wait(self, job_id, user_id, timeout):
+        """완료/실패 또는 timeout 까지 대기 (app 은 OCR_JOB_WAIT_MAX 초로 제한 — 요청 스레드를 오래 잡지 않게)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id, user_id)
+            if job is None or job["state"] in ('done', 'failed') or time.monotonic() >= deadline:
+                return job
+            time.sleep(POLL_INTERVAL)
+
+    # ---------- 디스패처 ----------
+    def _requeue_stale(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('''
+                UPDATE ocr_jobs SET status='queued', updated_at=datetime('now')
+                WHERE status='running' AND updated_at < datetime('now', ?)
+            ''', (f'-{OCR_JOB_STALE_SEC} seconds',))
+
+    def _purge_finished(self):
+        """완료/실패 후 OCR_JOB_TTL_SEC 지난 작업 행 삭제 → 삭제 건수"""
+        conn = self._connect()
+        with conn:
+            return conn.execute('''
+                DELETE FROM ocr_jobs
+                WHERE status IN ('done', 'failed') AND updated_at < datetime('now', ?)
+            ''', (f'-{OCR_JOB_TTL_SEC} seconds',)).rowcount
+
+    def _claim(self):
+        """queued 작업 하나를 running 으로 (여러 gunicorn 워커가 동시에 가져가지 않게 IMMEDIATE 트랜잭션)"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        with conn:
+            row = conn.execute('''
+                SELECT id FROM ocr_jobs WHERE status='queued' ORDER BY created_at, rowid LIMIT 1
+            ''').fetchone()
+            if row:
+                conn.execute("UPDATE ocr_jobs SET status='running', updated_at=datetime('now') WHERE id=?",
+                             (row[0],))
+        return row[0] if row else None
+
+    def _on_done(self, job_id, future):
+        with self._lock:
+            self.inflight -= 1
+        self._slots.release()
+        self._wakeup.set()
+        if future.exception() is None:
+            outcome = future.result() or {}
+            metrics.observe_stages(outcome.get("timings"))
+            metrics.OCR_RESULTS.inc(outcome="rejected" if outcome.get("rejected") else outcome.get("status", "missing"))
+            if outcome:
+                self._save(job_id, outcome)
+        else:
+            metrics.OCR_RESULTS.inc(outcome="crashed")
+            # 워커 프로세스 자체가 죽은 경우 (process_job 내부 예외는 결과로 돌아옴)
+            conn = self._connect()
+            with conn:
+                conn.execute('''
+                    UPDATE ocr_jobs SET status='failed', error=?, image=NULL, updated_at=datetime('now')
+                    WHERE id=?
+                ''', (str(future.exception()), job_id))
+
+    def _save(self, job_id, outcome):
+        """결과 저장: 그룹 커밋이 켜져 있으면 다른 작업들과 한 트랜잭션으로 묶어 커밋 (기다리지 않음)"""
+        if db.DB_GROUP_COMMIT:
+            future = db.get_writer(self.db_path).submit(lambda conn: pipeline.finish_job(conn, job_id, outcome))
+            future.add_done_callback(lambda f: self._on_saved(job_id, f))
+            return
+        conn = self._connect()
+        with conn:
+            pipeline.finish_job(conn, job_id, outcome)
+
+    def _on_saved(self, job_id, future):
+        if future.exception() is not None:
+            # running 으로 남은 작업은 _requeue_stale 이 다시 큐에 넣는다
+            print(f"⚠ OCR 결과 저장 실패 {job_id}: {future.exception()}")
+
+    def _new_pool(self):
+        # spawn: 스레드가 떠 있는 gunicorn 워커에서 fork 하지 않도록
+        return ProcessPoolExecutor(max_workers=self.workers,
+                                   mp_context=multiprocessing.get_context('spawn'))
+
+    def _dispatch_loop(self):
+        last_stale_check = 0
+        while True:
+            if time.monotonic() - last_stale_check > 60:
+                try:
+                    self._requeue_stale()
+                    self._purge_finished()
+                except sqlite3.Error as e:
+                    print(f"⚠ OCR 작업 재큐잉/정리 실패: {e}")
+                last_stale_check = time.monotonic()
+
+            self._slots.acquire()
+            job_id = None
+            try:
+                job_id = self._claim()
+                if job_id is not None:
+                    future = self._pool.submit(pipeline.process_job, self.db_path, job_id)
+                    with self._lock:
+                        self.inflight += 1  # 콜백은 add_done_callback 이후에만 불리므로 여기서 증가해도 안전
+                    future.add_done_callback(lambda f, j=job_id: self._on_done(j, f))
+                    continue
+            except BrokenProcessPool:
+                print("⚠ OCR 워커 풀 재생성")
+                self._pool = self._new_pool()
+                conn = self._connect()
+                with conn:
+                    conn.execute("UPDATE ocr_jobs SET status='queued' WHERE id=?", (job_id,))
+            except Exception as e:
+                print(f"⚠ OCR 디스패처 오류: {e}")
+                time.sleep(1.0)
+            self._slots.release()
+            self._wakeup.wait(1.0)
+            self._wakeup.clear()
@@ -0,0 +1,97 @@
+import re
+
+# ==========================
+# Tesseract TSV → 단어/라인 구조
+# ==========================
+# TSV 컬럼: level page_num block_num par_num line_num word_num left top width height conf text
+WORD_LEVEL = 5
+MIN_LINE_CONF = 40        # 이 값 미만 라인은 신뢰도 낮음으로 취급
+TOP_REGION = 0.2          # 상단 20% → 브랜드 후보 (구 extract_top_brand)
+BOTTOM_REGION = 0.7       # 하단 30% → 금액 후보 (구 extract_bottom_amount)
+
+_BRAND_CHARS = re.compile(r'[^가-힣A-Za-z0-9]')
+_AMOUNT_TOKEN = re.compile(r'^\d[\d,]*$')
+
+
+def parse_tsv(tsv):
+    """TSV 문자열 → 단어 dict 리스트 (헤더 유무 모두 처리)"""
+    words = []
+    for row in tsv.splitlines():
+        cols = row.split('\t')
+        if len(cols) < 12 or cols[0] == 'level':
+            continue
+        if int(cols[0]) != WORD_LEVEL:
+            continue
+        text = cols[11].strip()
+        if not text:
+            continue
+        words.append({
+            "text": text,
+            "conf": float(cols[10]),
+            "block": int(cols[2]), "par": int(cols[3]), "line": int(cols[4]),
+            "left": int(cols[6]), "top": int(cols[7]),
+            "width": int(cols[8]), "height": int(cols[9]),
+        })
+    return words
+
+
+def group_lines(words):
+    """(block, par, line) 단위로 묶어 위→아래 순서의 라인 리스트 생성"""
+    grouped = {}
+    for w in words:
+        grouped.setdefault((w["block"], w["par"], w["line"]), []).append(w)
+
+    lines = []
+    for ws in grouped.values():
+        ws.sort(key=lambda w: w["left"])
+        left = min(w["left"] for w in ws)
+        top = min(w["top"] for w in ws)
+        right = max(w["left"] + w["width"] for w in ws)
+        bottom = max(w["top"] + w["height"] for w in ws)
+        lines.append({
+            "text": " ".join(w["text"] for w in ws),
+            "conf": sum(w["conf"] for w in ws) / len(ws),
+            "box": (left, top, right, bottom),
+            "words": ws,
+        })
+    lines.sort(key=lambda l: (l["box"][1], l["box"][0]))
+    return lines
+
+
+# ==========================
+# 위치 기반 필드 후보
+# ==========================
+def _center_y(line):
+    return (line["box"][1] + line["box"][3]) / 2
+
+
+def top_brand_text(lines, page_height, region=TOP_REGION):
+    """상단 영역에서 가장 위의 신뢰 가능한 라인 (브랜드 whitelist 문자만 남김)"""
+    limit = page_height * region
+    candidates = []
+    for line in lines:
+        if _center_y(line) > limit:
+            break
+        text = _BRAND_CHARS.sub('', line["text"])
+        if len(text) >= 2:
+            candidates.append((line, text))
+    for line, text in candidates:
+        if line["conf"] >= MIN_LINE_CONF:
+            return text
+    if candidates:
+        return max(candidates, key=lambda c: c[0]["conf"])[1]
+    return ""
+
+
+def bottom_amount(lines, page_height, region=BOTTOM_REGION):
+    """하단 영역 숫자 토큰 중 최댓값 (없으면 None)"""
+    limit = page_height * region
+    nums = []
+    for line in lines:
+        if _center_y(line) < limit:
+            continue
+        for w in line["words"]:
+            token = w["text"].strip(".,")
+            if _AMOUNT_TOKEN.match(token):
+                nums.append(int(token.replace(",", "")))
+    return max(nums) if nums else None
@@ -0,0 +1,431 @@
+"""부하 테스트: 합성 거래 시드 + gunicorn 에 혼합 트래픽 → 라우트별 RPS/지연/오류, 서버 CPU/RSS
+
+    python loadtest.py seed --db loadtest.db --users 2000 --rows 2000000
+    python loadtest.py run --serve --db loadtest.db --workers 2 --threads 4 --concurrency 32 --duration 60
+    python loadtest.py run --url http://127.0.0.1:8080 --token "$LOADTEST_TOKEN" --pid <gunicorn master pid>
+
+Google OAuth 대신 테스트 전용 로그인(/__loadtest/login)을 쓰므로 서버는 LOADTEST_LOGIN=1,
+LOADTEST_TOKEN=<임의 값> 으로 떠 있어야 한다 (--serve 는 알아서 설정해 띄우고 끝나면 내린다).
+--mix 로 요청 비율을, --compare 로 이전 결과 대비 회귀(p95 증가, RPS/오류율 악화)를 본다.
+"""
+import os
+import sys
+import json
+import time
+import random
+import secrets
+import argparse
+import datetime
+import threading
+import subprocess
+from collections import Counter
+
+import requests
+
+import db
+import parser
+from benchmark import render_receipt, find_font, percentiles
+
+DEFAULT_MIX = "user_data=50,stats=25,ocr=10,correct=10,delete=5"
+USER_PREFIX = "lt-"
+JOB_POLL_DELAY_SEC = (0.5, 3.0)  # /ocr/jobs/<id> 짧은 폴링 간격 (최소, 최대) — 웹 UI 와 같은 백오프
+OCR_JOB_TIMEOUT_SEC = 120
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+# ==========================
+# 시드
+# ==========================
+def _synthetic_row(rng, users, stores):
+    # 사용자별 거래 수가 한쪽으로 쏠리게 (소수의 헤비 유저)
+    user_id = f"{USER_PREFIX}{int(users * rng.random() ** 2):06d}"
+    store, category = rng.choice(stores)
+    date = datetime.date(2023, 1, 1) + datetime.timedelta(days=rng.randint(0, 900))
+    date_value = f"{date:%Y-%m-%d} {rng.randint(8, 22):02d}:{rng.randint(0, 59):02d}"
+    amount = rng.randint(10, 2000) * 100
+    return (user_id, store, amount, date_value, category, store, parser.month_key(date_value), None, None)
+
+
+def seed(db_path, users, rows, batch=20000, seed_value=1):
+    """transactions 에 rows 건 추가 (집계/버전 트리거도 그대로 동작) → 초당 건수"""
+    db.init_db(db_path)
+    conn = db.connect(db_path)
+    rng = random.Random(seed_value)
+    stores = [(s, parser.category_map.get(s, "기타")) for s in parser.brand_candidates]
+    conn.execute('PRAGMA synchronous=OFF')  # 시드 중에만 (중간에 죽으면 다시 만들면 됨)
+    start = time.perf_counter()
+    inserted = 0
+    try:
+        while inserted < rows:
+            n = min(batch, rows - inserted)
+            with conn:
+                conn.executemany(db.INSERT_TRANSACTION_SQL, [_synthetic_row(rng, users, stores) for _ in range(n)])
+            inserted += n
+            elapsed = time.perf_counter() - start
+            print(f"… {inserted:,}/{rows:,} ({inserted / elapsed:,.0f} rows/s)", file=sys.stderr)
+    finally:
+        conn.execute(f'PRAGMA synchronous={db.DB_SYNCHRONOUS}')
+    elapsed = time.perf_counter() - start
+    return round(inserted / elapsed, 1) if elapsed else None
+
+
+# ==========================
+# 서버 프로세스 (선택) + 자원 샘플링
+# ==========================
+def start_server(db_path, port, workers, threads, token, extra_env=None):
+    env = dict(os.environ, DB_PATH=os.path.abspath(db_path), LOADTEST_LOGIN="1", LOADTEST_TOKEN=token,
+               WEB_CONCURRENCY=str(workers), **(extra_env or {}))
+    cmd = [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{port}",
+           "--workers", str(workers), "--threads", str(threads), "--timeout", "120", "--graceful-timeout", "10"]
+    proc = subprocess.Popen(cmd, cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            requests.get(base + "/user-info", timeout=1)
+            return proc, base
+        except requests.RequestException:
+            time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not start within 60s")
+
+
+def stop_server(proc, timeout=30):
+    proc.terminate()
+    try:
+        proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def _proc_stat(pid):
+    """(ppid, cpu ticks, rss bytes) — /proc 기준 (리눅스 전용)"""
+    with open(f"/proc/{pid}/stat", "rb") as f:
+        fields = f.read().rsplit(b")", 1)[1].split()
+    return int(fields[1]), int(fields[11]) + int(fields[12]), int(fields[21]) * PAGE_SIZE
+
+
+def process_tree_usage(root_pid):
+    """root_pid 와 모든 자손 (gunicorn 워커 + OCR 프로세스 풀) → (cpu ticks 합, rss 합, 프로세스 수)"""
+    stats = {}
+    for name in os.listdir("/proc"):
+        if name.isdigit():
+            try:
+                stats[int(name)] = _proc_stat(int(name))
+            except (OSError, IndexError, ValueError):
+                pass
+    children = {}
+    for pid, (ppid, _, _) in stats.items():
+        children.setdefault(ppid, []).append(pid)
+    ticks = rss = count = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in stats:
+            ticks += stats[pid][1]
+            rss += stats[pid][2]
+            count += 1
+        stack.extend(children.get(pid, []))
+    return ticks, rss, count
+
+
+class ResourceSampler(threading.Thread):
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples = []  # (cpu %, rss bytes, 프로세스 수)
+        self._done = threading.Event()
+
+    def run(self):
+        last_ticks, _, _ = process_tree_usage(self.pid)
+        last_t = time.monotonic()
+        while not self._done.wait(self.interval):
+            ticks, rss, count = process_tree_usage(self.pid)
+            now = time.monotonic()
+            cpu = (ticks - last_ticks) / CLK_TCK / (now - last_t) * 100
+            self.samples.append((cpu, rss, count))
+            last_ticks, last_t = ticks, now
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def summary(self):
+        if not self.samples:
+            return None
+        cpus = [s[0] for s in self.samples]
+        return {"cpu_percent_avg": round(sum(cpus) / len(cpus), 1), "cpu_percent_max": round(max(cpus), 1),
+                "cpu_cores": os.cpu_count(), "rss_mb_max": round(max(s[1] for s in self.samples) / 1024 / 1024, 1),
+                "processes_max": max(s[2] for s in self.samples)}
+
+
+# ==========================
+# 가상 사용자
+# ==========================
+class VirtualUser:
+    """동작마다 보낸 요청을 records 에 (route, status, 초, locked) 로 남긴다"""
+
+    def __init__(self, base, token, user_id, images, rng):
+        self.base = base
+        self.rng = rng
+        self.images = images
+        self.ids = []
+        self.etag = None
+        self.records = []
+        self.session = requests.Session()
+        resp = self.session.post(base + "/__loadtest/login", json={"user_id": user_id},
+                                 headers={"Authorization": f"Bearer {token}"}, timeout=30)
+        resp.raise_for_status()
+
+    def _call(self, route, method, path, timeout=60, **kwargs):
+        url = path if path.startswith("http") else self.base + path
+        start = time.perf_counter()
+        resp = self.session.request(method, url, timeout=timeout, **kwargs)
+        self.records.append((route, resp.status_code, time.perf_counter() - start, _is_locked(resp)))
+        return resp
+
+    def user_data(self):
+        headers = {"If-None-Match": self.etag} if self.etag and self.rng.random() < 0.5 else {}
+        resp = self._call("GET /api/user-data", "GET", "/api/user-data", params={"limit": 50}, headers=headers)
+        if resp.status_code == 200:
+            self.etag = resp.headers.get("ETag")
+            self.ids = [row["id"] for row in resp.json()]
+
+    def stats(self):
+        self._call("GET /api/stats", "GET", "/api/stats")
+
+    def ocr(self):
+        """동기 모드면 POST 가 전체 OCR 시간, 비동기(202)면 POST 는 큐 등록 시간뿐이라
+        작업이 끝날 때까지 짧은 폴링(백오프) 해서 'OCR job end-to-end' 로 따로 기록"""
+        image = self.rng.choice(self.images)
+        start = time.perf_counter()
+        resp = self.session.post(self.base + "/ocr", files={"image": ("receipt.jpg", image, "image/jpeg")},
+                                 timeout=120)
+        route = "POST /ocr (enqueue)" if resp.status_code == 202 else "POST /ocr"
+        self.records.append((route, resp.status_code, time.perf_counter() - start, _is_locked(resp)))
+        if resp.status_code != 202:
+            return
+        location = resp.headers.get("Location") or f"/ocr/jobs/{resp.json()['job_id']}"
+        delay = JOB_POLL_DELAY_SEC[0]
+        while True:
+            job = self._call("GET /ocr/jobs (poll)", "GET", location)
+            state = job.json().get("state") if job.status_code == 200 else None
+            if state == "done":
+                status = 200
+                break
+            if state != "queued" and state != "running":
+                status = state or job.status_code  # failed / 404 등 → 오류로 집계
+                break
+            if time.perf_counter() - start > OCR_JOB_TIMEOUT_SEC:
+                status = "timeout"
+                break
+            time.sleep(delay)
+            delay = min(delay * 1.5, JOB_POLL_DELAY_SEC[1])
+        self.records.append(("OCR job end-to-end", status, time.perf_counter() - start, False))
+
+    def correct(self):
+        if not self.ids:
+            return self.user_data()
+        tid = self.rng.choice(self.ids)
+        self._call("PATCH /api/correct-transaction", "PATCH", f"/api/correct-transaction/{tid}",
+                   json={"field": "amount", "value": self.rng.randint(10, 2000) * 100})
+
+    def delete(self):
+        """소프트 삭제 후 바로 복원 (시드 데이터가 줄지 않게)"""
+        if not self.ids:
+            return self.user_data()
+        tid = self.rng.choice(self.ids)
+        self._call("DELETE /api/transactions", "DELETE", f"/api/transactions/{tid}")
+        self._call("POST /api/transactions/restore", "POST", f"/api/transactions/{tid}/restore")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("user_data", "stats", "ocr", "correct", "delete"):
+            raise SystemExit(f"unknown operation in --mix: {name}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+def _is_locked(resp):
+    """app.py 가 busy_timeout 을 넘긴 SQLite 잠금을 503 + X-Error-Code: db_locked 로 돌려줌"""
+    return resp.status_code == 503 and resp.headers.get("X-Error-Code") == "db_locked"
+
+
+def _is_error(status):
+    return not isinstance(status, int) or status >= 500
+
+
+def drive(vusers, mix, duration, think_ms, seed_value):
+    """스레드마다 가상 사용자 하나씩, duration 초 동안 닫힌 루프 → [(route, status, 초, locked)]"""
+    ops, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + duration
+
+    def loop(i, vu):
+        rng = random.Random(seed_value + i)
+        while time.monotonic() < deadline:
+            op = rng.choices(ops, weights)[0]
+            start = time.perf_counter()
+            try:
+                getattr(vu, op)()
+            except requests.RequestException as e:
+                vu.records.append((op, f"conn:{type(e).__name__}", time.perf_counter() - start, False))
+            if think_ms:
+                time.sleep(think_ms / 1000)
+
+    threads = [threading.Thread(target=loop, args=(i, vu)) for i, vu in enumerate(vusers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return [r for vu in vusers for r in vu.records]
+
+
+def summarize(results, wall):
+    routes = {}
+    for route in sorted({r[0] for r in results}):
+        rows = [r for r in results if r[0] == route]
+        errors = sum(1 for r in rows if _is_error(r[1]))
+        stats = percentiles([r[2] * 1000 for r in rows])
+        routes[route] = {
+            "count": len(rows), "rps": round(len(rows) / wall, 2),
+            "p50_ms": stats["p50"], "p95_ms": stats["p95"], "p99_ms": stats["p99"],
+            "errors": errors, "error_rate": round(errors / len(rows), 4),
+            "locked": sum(1 for r in rows if r[3]),
+            "status": dict(Counter(str(r[1]) for r in rows)),
+        }
+    total = len(results)
+    errors = sum(r["errors"] for r in routes.values())
+    locked = sum(r["locked"] for r in routes.values())
+    return {"requests": total, "rps": round(total / wall, 2) if wall else None,
+            "error_rate": round(errors / total, 4) if total else None,
+            "lock_rate": round(locked / total, 4) if total else None,
+            "throttled_429": sum(1 for r in results if r[1] == 429), "routes": routes}
+
+
+def compare(current, baseline, tolerance):
+    """라우트별 p95 가 tolerance 비율 이상 늘거나 전체 RPS 가 줄거나 오류율이 늘면 회귀"""
+    regressions = []
+    for route, stats in current["routes"].items():
+        base = baseline.get("routes", {}).get(route)
+        if base and base["p95_ms"] > 0 and stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"p95 {route} {base['p95_ms']} → {stats['p95_ms']} ms")
+    if baseline.get("rps") and current["rps"] < baseline["rps"] * (1 - tolerance):
+        regressions.append(f"rps {baseline['rps']} → {current['rps']}")
+    if (current["error_rate"] or 0) > (baseline.get("error_rate") or 0) + 0.01:
+        regressions.append(f"error rate {baseline.get('error_rate')} → {current['error_rate']}")
+    return regressions
+
+
+def run(args):
+    mix = parse_mix(args.mix)
+    token = args.token or os.getenv("LOADTEST_TOKEN")
+    proc = None
+    if args.serve:
+        token = token or secrets.token_hex(16)
+        proc, base = start_server(args.db, args.port, args.workers, args.threads, token)
+        pid = proc.pid
+    else:
+        base, pid = args.url.rstrip("/"), args.pid
+    if not token:
+        raise SystemExit("--token (or LOADTEST_TOKEN) is required without --serve")
+
+    try:
+        rng = random.Random(args.seed)
+        images = []
+        if mix.get("ocr"):
+            font = find_font(args.font)
+            images = [render_receipt(rng, font)[0] for _ in range(args.images)]
+        vusers = [VirtualUser(base, token, f"{USER_PREFIX}{rng.randrange(args.users):06d}", images,
+                              random.Random(args.seed + i)) for i in range(args.concurrency)]
+        print(f"▶ {base}: {args.concurrency} 동시 사용자, {args.duration}s, mix {mix}", file=sys.stderr)
+
+        sampler = ResourceSampler(pid) if pid and os.path.exists(f"/proc/{pid}") else None
+        if sampler:
+            sampler.start()
+        start = time.perf_counter()
+        results = drive(vusers, mix, args.duration, args.think_ms, args.seed)
+        wall = time.perf_counter() - start
+        if sampler:
+            sampler.stop()
+    finally:
+        if proc:
+            stop_server(proc)
+
+    report = {
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {"url": base, "concurrency": args.concurrency, "duration": args.duration, "mix": mix,
+                   "users": args.users, "think_ms": args.think_ms,
+                   "server": {"workers": args.workers, "threads": args.threads} if args.serve else None},
+        "wall_sec": round(wall, 2),
+        **summarize(results, wall),
+        "server_resources": sampler.summary() if sampler else None,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for route, stats in report["routes"].items():
+        print(f"  {route:<34} {stats['rps']:>8.1f} rps  p50 {stats['p50_ms']:>8.1f}  p95 {stats['p95_ms']:>8.1f}  "
+              f"p99 {stats['p99_ms']:>8.1f} ms  err {stats['error_rate']:.2%}  locked {stats['locked']}")
+    print(json.dumps({k: report[k] for k in ("rps", "error_rate", "lock_rate", "server_resources")},
+                     ensure_ascii=False), f"→ {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"❌ 회귀: {r}")
+        if regressions:
+            return 1
+        print("✅ 회귀 없음")
+    return 0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="부하 테스트")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    sp = sub.add_parser("seed", help="합성 거래 생성")
+    sp.add_argument("--db", default="loadtest.db")
+    sp.add_argument("--users", type=int, default=2000)
+    sp.add_argument("--rows", type=int, default=1_000_000)
+    sp.add_argument("--batch", type=int, default=20000)
+    sp.add_argument("--seed", type=int, default=1)
+
+    rp = sub.add_parser("run", help="혼합 트래픽 실행")
+    rp.add_argument("--serve", action="store_true", help="gunicorn 을 직접 띄워서 측정")
+    rp.add_argument("--db", default="loadtest.db", help="--serve 시 서버 DB_PATH")
+    rp.add_argument("--port", type=int, default=8099)
+    rp.add_argument("--workers", type=int, default=2, help="--serve 시 gunicorn 워커 수")
+    rp.add_argument("--threads", type=int, default=4, help="--serve 시 워커당 스레드 수")
+    rp.add_argument("--url", default="http://127.0.0.1:8080")
+    rp.add_argument("--pid", type=int, help="CPU/RSS 를 잴 서버 프로세스 (gunicorn master, 자손 포함)")
+    rp.add_argument("--token", help="서버의 LOADTEST_TOKEN")
+    rp.add_argument("--users", type=int, default=2000, help="시드한 사용자 수 (가상 사용자 id 범위)")
+    rp.add_argument("--concurrency", type=int, default=16)
+    rp.add_argument("--duration", type=float, default=30)
+    rp.add_argument("--think-ms", type=float, default=0)
+    rp.add_argument("--mix", default=DEFAULT_MIX)
+    rp.add_argument("--images", type=int, default=8, help="업로드용 합성 영수증 수")
+    rp.add_argument("--font", help="한글 TTF/TTC 경로")
+    rp.add_argument("--seed", type=int, default=1)
+    rp.add_argument("--out", default="loadtest.json")
+    rp.add_argument("--compare", help="이전 결과 JSON (회귀 검사)")
+    rp.add_argument("--tolerance", type=float, default=0.2)
+    args = ap.parse_args(argv)
+
+    if args.command == "seed":
+        rate = seed(args.db, args.users, args.rows, args.batch, args.seed)
+        print(json.dumps({"db": args.db, "rows": args.rows, "users": args.users, "rows_per_sec": rate}))
+        return 0
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
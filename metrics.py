@@ -0,0 +1,185 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+from flask import g, has_request_context
+
+# ==========================
+# 설정
+# ==========================
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _fmt_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (list(extra.items()) if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return "{" + body + "}"
+
+
+def _fmt_value(v):
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+# ==========================
+# 메트릭 타입 (프로세스 내, 스레드 안전)
+# ==========================
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames, self.buckets = name, help_, tuple(labelnames), tuple(buckets)
+        self._series = {}  # labels → [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, {'le': bound})} {count}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labelnames, key, {'le': '+Inf'})} {series[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labelnames, key)} {_fmt_value(series[-2])}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_, labelnames=()):
+        self.name, self.help, self.labelnames = name, help_, tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        if not METRICS_ENABLED:
+            return
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in items]
+
+
+class Gauge:
+    """스크랩 시점에 callback 으로 값을 읽는 게이지 (callback 은 {labels tuple: value} 또는 숫자 반환)"""
+    kind = "gauge"
+
+    def __init__(self, name, help_, callback, labelnames=()):
+        self.name, self.help, self.callback, self.labelnames = name, help_, callback, tuple(labelnames)
+
+    def render(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        if value is None:
+            return []
+        if not isinstance(value, dict):
+            value = {(): value}
+        return [f"{self.name}{_fmt_labels(self.labelnames, k)} {_fmt_value(v)}" for k, v in value.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        out = []
+        for m in self._metrics:
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            out.extend(m.render())
+        return "\n".join(out) + "\n"
+
+
+registry = Registry()
+
+OCR_STAGE_SECONDS = registry.register(Histogram(
+    "ocr_stage_seconds", "Time spent in each OCR pipeline stage", ("stage",)))
+DB_SECONDS = registry.register(Histogram(
+    "db_operation_seconds", "Time spent in SQLite operations on the request path", ("op",)))
+HTTP_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "Request latency per route", ("route", "method", "status")))
+OCR_RESULTS = registry.register(Counter(
+    "ocr_results_total", "Finished OCR jobs by outcome", ("outcome",)))
+OCR_TIERS = registry.register(Counter(
+    "ocr_tier_total", "Recognized receipts by the OCR tier they finished on", ("tier",)))
+DB_LOCKED = registry.register(Counter(
+    "db_locked_total", "Requests answered 503 because SQLite stayed locked past the busy timeout", ("route",)))
+
+
+# ==========================
+# 계측 헬퍼
+# ==========================
+def _debug_enabled():
+    return has_request_context() and getattr(g, "debug_timings", None) is not None
+
+
+def add_debug(name, seconds):
+    """X-Debug-Timing 요청이면 현재 요청의 단계별 시간에 추가"""
+    if _debug_enabled():
+        g.debug_timings.append((name, seconds))
+
+
+@contextmanager
+def timed(histogram, **labels):
+    if not METRICS_ENABLED and not _debug_enabled():
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        add_debug("_".join(str(v) for v in labels.values()) or histogram.name, elapsed)
+
+
+def observe_stages(timings):
+    """워커 프로세스가 돌려준 StageReport.to_dict() 를 부모 프로세스 히스토그램에 반영"""
+    if not timings:
+        return
+    if timings.get("tier"):
+        OCR_TIERS.inc(tier=timings["tier"])
+    for stage in timings.get("stages", []):
+        seconds = stage["ms"] / 1000.0
+        OCR_STAGE_SECONDS.observe(seconds, stage=stage["stage"])
+        add_debug(stage["stage"], seconds)
+
+
+def debug_stages(timings):
+    """이미 집계된 단계 시간을 X-Debug-Timing 에만 싣기 (작업 결과 조회 등)"""
+    if timings and _debug_enabled():
+        for stage in timings.get("stages", []):
+            add_debug(stage["stage"], stage["ms"] / 1000.0)
+
+
+def format_debug_header(timings):
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
@@ -0,0 +1,242 @@
+import os
+import json
+import atexit
+import time
+import hashlib
+import sqlite3
+import threading
+
+# ==========================
+# 설정
+# ==========================
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "1") == "1"
+OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "ocr_cache.db")
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# 적중/미스 통계와 조회 시각은 프로세스 안에 모았다가 한 트랜잭션으로 기록 (조회마다 쓰기 잠금 방지)
+STATS_FLUSH_EVERY = 64
+STATS_FLUSH_SEC = 5.0
+TOUCH_INTERVAL_SEC = 60  # 마지막 조회 후 이 시간이 지난 항목만 last_access 갱신 (LRU 순서엔 충분)
+
+# 총 크기/항목 수는 트리거가 cache_stats 에 증분 유지 → 삽입/통계 조회 때 전체 SUM/COUNT 없음
+CREATE_TRIGGERS_SQL = [
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_ocr_cache_insert AFTER INSERT ON ocr_cache
+    BEGIN
+        UPDATE cache_stats SET value = value + NEW.size WHERE name = 'bytes';
+        UPDATE cache_stats SET value = value + 1 WHERE name = 'entries';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_ocr_cache_update AFTER UPDATE OF size ON ocr_cache
+    BEGIN
+        UPDATE cache_stats SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_ocr_cache_delete AFTER DELETE ON ocr_cache
+    BEGIN
+        UPDATE cache_stats SET value = value - OLD.size WHERE name = 'bytes';
+        UPDATE cache_stats SET value = value - 1 WHERE name = 'entries';
+    END
+    ''',
+]
+
+
+def make_key(image_bytes, signature):
+    """이미지 바이트 + OCR 설정(언어/PSM/전처리 버전 등) → 캐시 키"""
+    h = hashlib.sha256(image_bytes)
+    h.update(b'\0' + signature.encode('utf-8'))
+    return h.hexdigest()
+
+
+# ==========================
+# 내용 주소 기반 OCR 결과 캐시 (SQLite, 크기 제한 LRU)
+# ==========================
+class OcrCache:
+    def __init__(self, path=OCR_CACHE_PATH, max_bytes=OCR_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        # 프로세스 내 카운터 (전체 합계는 cache_stats 테이블)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = {'hits': 0, 'misses': 0}
+        self._touched = {}  # key → 조회 시각 (다음 flush 때 기록)
+        self._last_flush = time.monotonic()
+        self._local = threading.local()
+        self._init()
+        atexit.register(self.flush)
+
+    def _connect(self):
+        """현재 스레드의 연결 (db.connect 처럼 프로세스/스레드마다 1개, 닫지 않고 재사용)"""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.conn = sqlite3.connect(self.path, timeout=30)
+            local.pid = os.getpid()
+        return local.conn
+
+    def _init(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS ocr_cache (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT,
+                    size INTEGER,
+                    created_at REAL,
+                    last_access REAL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_ocr_cache_access ON ocr_cache(last_access)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER)')
+            conn.executemany('INSERT OR IGNORE INTO cache_stats (name, value) VALUES (?, 0)',
+                             [('hits',), ('misses',), ('evictions',)])
+            # 트리거 이전에 만든 캐시 파일: 현재 합계로 한 번만 시작값을 채움 (같은 트랜잭션)
+            conn.execute('''
+                INSERT OR IGNORE INTO cache_stats (name, value)
+                SELECT 'bytes', COALESCE(SUM(size), 0) FROM ocr_cache
+            ''')
+            conn.execute('''
+                INSERT OR IGNORE INTO cache_stats (name, value)
+                SELECT 'entries', COUNT(*) FROM ocr_cache
+            ''')
+            for sql in CREATE_TRIGGERS_SQL:
+                conn.execute(sql)
+
+    def _count(self, conn, name, n=1):
+        conn.execute('UPDATE cache_stats SET value = value + ? WHERE name=?', (n, name))
+
+    def get(self, key):
+        """읽기만 함 — 통계/조회 시각은 모아 두었다가 flush 에서 기록"""
+        row = self._connect().execute('SELECT payload, last_access FROM ocr_cache WHERE key=?', (key,)).fetchone()
+        now = time.time()
+        with self._lock:
+            if row:
+                self.hits += 1
+                self._pending['hits'] += 1
+                if now - row[1] >= TOUCH_INTERVAL_SEC:
+                    self._touched[key] = now
+            else:
+                self.misses += 1
+                self._pending['misses'] += 1
+            due = (sum(self._pending.values()) >= STATS_FLUSH_EVERY
+                   or time.monotonic() - self._last_flush >= STATS_FLUSH_SEC)
+        if due:
+            self.flush()
+        return json.loads(row[0]) if row else None
+
+    def _take_pending(self):
+        with self._lock:
+            pending, touched = self._pending, self._touched
+            self._pending, self._touched = {'hits': 0, 'misses': 0}, {}
+            self._last_flush = time.monotonic()
+        return pending, touched
+
+    def _restore_pending(self, pending, touched):
+        """기록하지 못한 통계/조회 시각을 되돌려 다음 flush 때 다시 기록"""
+        with self._lock:
+            for name, n in pending.items():
+                self._pending[name] += n
+            for key, ts in touched.items():
+                self._touched[key] = max(ts, self._touched.get(key, ts))
+
+    def _write_pending(self, conn, pending, touched):
+        for name, n in pending.items():
+            if n:
+                self._count(conn, name, n)
+        if touched:
+            conn.executemany('UPDATE ocr_cache SET last_access=? WHERE key=?',
+                             [(ts, key) for key, ts in touched.items()])
+
+    def flush(self):
+        """모아 둔 적중/미스 수와 조회 시각을 한 트랜잭션으로 기록"""
+        pending, touched = self._take_pending()
+        if not any(pending.values()) and not touched:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                self._write_pending(conn, pending, touched)
+        except sqlite3.Error as e:
+            self._restore_pending(pending, touched)
+            print(f"⚠ OCR 캐시 통계 기록 실패: {e}")
+
+    def peek_many(self, keys):
+        """{key: payload} — 일괄 재파싱용 (last_access/적중 통계를 건드리지 않음)"""
+        keys = [k for k in keys if k]
+        if not keys:
+            return {}
+        rows = self._connect().execute(
+            f"SELECT key, payload FROM ocr_cache WHERE key IN ({','.join('?' * len(keys))})", keys).fetchall()
+        return {key: json.loads(payload) for key, payload in rows}
+
+    def put(self, key, payload):
+        data = json.dumps(payload, ensure_ascii=False)
+        size = len(data.encode('utf-8'))
+        now = time.time()
+        pending, touched = self._take_pending()  # 어차피 쓰기 트랜잭션이므로 모아 둔 통계도 같이
+        conn = self._connect()
+        try:
+            with conn:
+                # REPLACE 는 삭제 트리거를 부르지 않으므로 UPSERT (크기 변화는 update 트리거가 반영)
+                conn.execute('''
+                    INSERT INTO ocr_cache (key, payload, size, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE
+                    SET payload = excluded.payload, size = excluded.size, last_access = excluded.last_access
+                ''', (key, data, size, now, now))
+                self._write_pending(conn, pending, touched)
+                self._evict(conn)
+        except sqlite3.Error:
+            self._restore_pending(pending, touched)  # 롤백됐으므로 통계는 다음 flush 로
+            raise
+
+    def _evict(self, conn):
+        """총 크기가 상한을 넘으면 가장 오래 안 쓴 항목부터 삭제"""
+        total = conn.execute("SELECT value FROM cache_stats WHERE name='bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        while total > self.max_bytes:
+            rows = conn.execute('SELECT key, size FROM ocr_cache ORDER BY last_access LIMIT 256').fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute('DELETE FROM ocr_cache WHERE key=?', (key,))
+                total -= size
+                evicted += 1
+        self._count(conn, 'evictions', evicted)
+
+    def stats(self):
+        self.flush()
+        totals = dict(self._connect().execute('SELECT name, value FROM cache_stats').fetchall())
+        entries, size = totals.get('entries', 0), totals.get('bytes', 0)
+        lookups = totals.get('hits', 0) + totals.get('misses', 0)
+        return {
+            "hits": totals.get('hits', 0),
+            "misses": totals.get('misses', 0),
+            "evictions": totals.get('evictions', 0),
+            "hit_rate": round(totals.get('hits', 0) / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """프로세스당 1개 (비활성화 시 None)"""
+    global _cache
+    if not OCR_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = OcrCache()
+    return _cache
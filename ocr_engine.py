@@ -0,0 +1,184 @@
+import os
+import queue
+import threading
+
+import numpy as np
+from PIL import Image
+import pytesseract
+
+try:
+    import tesserocr
+except ImportError:  # libtesseract 바인딩이 없는 환경 (예: Windows 로컬 개발)
+    tesserocr = None
+
+# ==========================
+# 설정
+# ==========================
+# auto: tesserocr 가 있으면 상주 핸들, 없으면 pytesseract(서브프로세스)
+OCR_BACKEND = os.getenv("OCR_BACKEND", "auto").lower()
+# (lang, psm, whitelist) 키마다 유지할 최대 핸들 수 (gunicorn 스레드 수와 맞춤)
+OCR_HANDLES_PER_KEY = int(os.getenv("OCR_HANDLES_PER_KEY", "2"))
+DEFAULT_LANG = 'kor+eng'
+
+# Windows에서만 경로 지정 (Render 리눅스에서는 미적용, 워커 프로세스에도 적용되도록 여기서 설정)
+if os.name == 'nt':
+    pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+    os.environ['TESSDATA_PREFIX'] = r'C:\Program Files\Tesseract-OCR\tessdata'
+
+
+def _to_pil(image):
+    if isinstance(image, Image.Image):
+        return image
+    return Image.fromarray(np.ascontiguousarray(image))
+
+
+# ==========================
+# pytesseract 백엔드 (호출마다 tesseract 프로세스 실행)
+# ==========================
+class PytesseractEngine:
+    name = 'pytesseract'
+
+    def _config(self, psm, whitelist, oem):
+        config = f'--oem {oem} --psm {psm}' if oem is not None else f'--psm {psm}'
+        if whitelist:
+            config += f' -c tessedit_char_whitelist="{whitelist}"'
+        return config
+
+    def image_to_string(self, image, lang=DEFAULT_LANG, psm=6, whitelist=None, oem=None):
+        return pytesseract.image_to_string(image, lang=lang, config=self._config(psm, whitelist, oem))
+
+    def image_to_data(self, image, lang=DEFAULT_LANG, psm=6, whitelist=None, oem=None):
+        """단어 박스/신뢰도가 담긴 TSV 문자열 (layout.parse_tsv 로 해석)"""
+        return pytesseract.image_to_data(image, lang=lang, config=self._config(psm, whitelist, oem))
+
+
+# ==========================
+# tesserocr 백엔드 (워커 프로세스 안에 초기화된 핸들 상주)
+# ==========================
+class _HandlePool:
+    """같은 설정의 PyTessBaseAPI 핸들을 최대 size 개까지 만들어 재사용"""
+
+    def __init__(self, factory, size):
+        self._factory = factory
+        self._size = max(1, size)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self._size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return self._factory()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def release(self, handle):
+        self._idle.put(handle)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().End()
+            except queue.Empty:
+                break
+
+
+class TesserocrEngine:
+    name = 'tesserocr'
+
+    def __init__(self, handles_per_key=OCR_HANDLES_PER_KEY):
+        if tesserocr is None:
+            raise RuntimeError("tesserocr is not installed")
+        self._handles_per_key = handles_per_key
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._tessdata = os.environ.get('TESSDATA_PREFIX')
+
+    def _factory(self, lang, psm, whitelist, oem):
+        def create():
+            kwargs = {'lang': lang, 'psm': psm}
+            if oem is not None:
+                kwargs['oem'] = oem
+            if self._tessdata:
+                kwargs['path'] = self._tessdata
+            api = tesserocr.PyTessBaseAPI(**kwargs)
+            if whitelist:
+                api.SetVariable("tessedit_char_whitelist", whitelist)
+            return api
+        return create
+
+    def _pool(self, lang, psm, whitelist, oem):
+        key = (lang, psm, whitelist, oem)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = _HandlePool(self._factory(lang, psm, whitelist, oem), self._handles_per_key)
+                    self._pools[key] = pool
+        return pool
+
+    def _run(self, image, lang, psm, whitelist, oem, read):
+        pool = self._pool(lang, psm, whitelist, oem)
+        api = pool.acquire()
+        try:
+            api.SetImage(_to_pil(image))
+            return read(api)
+        finally:
+            api.Clear()
+            pool.release(api)
+
+    def image_to_string(self, image, lang=DEFAULT_LANG, psm=6, whitelist=None, oem=None):
+        return self._run(image, lang, psm, whitelist, oem, lambda api: api.GetUTF8Text())
+
+    def image_to_data(self, image, lang=DEFAULT_LANG, psm=6, whitelist=None, oem=None):
+        """단어 박스/신뢰도가 담긴 TSV 문자열 (헤더 없음, layout.parse_tsv 로 해석)"""
+        return self._run(image, lang, psm, whitelist, oem, lambda api: api.GetTSVText(0))
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                pool.close()
+            self._pools.clear()
+
+
+# ==========================
+# 엔진 선택 (프로세스당 1개)
+# ==========================
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def _create_engine(backend):
+    if backend in ('auto', 'tesserocr') and tesserocr is not None:
+        try:
+            return TesserocrEngine()
+        except Exception as e:
+            if backend == 'tesserocr':
+                raise
+            print(f"⚠ tesserocr 초기화 실패, pytesseract 로 대체: {e}")
+    elif backend == 'tesserocr':
+        raise RuntimeError("OCR_BACKEND=tesserocr but tesserocr is not installed")
+    return PytesseractEngine()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = _create_engine(OCR_BACKEND)
+    return _engine
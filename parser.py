@@ -1,13 +1,12 @@
+import os
 import re
-import json
-from difflib import get_close_matches
+import store_learning
+from layout import MIN_LINE_CONF
+from receipt_tokens import extract_fields
+from store_matcher import StoreMatcher, load_entries
 
-# ✅ 교정 사전 로드
-try:
-    with open("store_learning.json", "r", encoding="utf-8") as f:
-        learning_dict = json.load(f)
-except FileNotFoundError:
-    learning_dict = {}
+# 추가 브랜드/별칭 목록 (선택, store_matcher.load_entries 형식)
+STORE_BRANDS_PATH = os.getenv("STORE_BRANDS_PATH")
 
 # ✅ 브랜드 매핑
 brand_map = {
@@ -27,6 +26,16 @@ brand_candidates = [
     "코스트코", "홈플러스", "롯데마트", "농협", "다이소", "올리브영", "ABC마트"
 ]
 
+# ✅ 키워드 규칙 (원본 이름에 포함되면, 앞쪽 우선)
+store_keywords = [
+    ("마트", "이마트24"),
+    ("emart", "이마트24"),
+    ("star", "스타벅스"),
+    ("스벅", "스타벅스"),
+    ("gs25", "GS25"),
+    ("cu", "CU"),
+]
+
 # ✅ 카테고리 매핑
 category_map = {
     "스타벅스": "카페",
@@ -41,85 +50,84 @@ category_map = {
     "코스트코": "마트"
 }
 
+# ✅ 매칭 엔진 (시작 시 1회 구축, add_alias/add_brand 로 핫 추가)
+def _build_store_matcher():
+    aliases, brands = list(brand_map.items()), list(brand_candidates)
+    if STORE_BRANDS_PATH:
+        extra_aliases, extra_brands = load_entries(STORE_BRANDS_PATH)
+        aliases += extra_aliases
+        brands += extra_brands
+    return StoreMatcher(aliases, store_keywords, brands)
+
+store_matcher = _build_store_matcher()
+
 # ==============================
 # 🔹 OCR 텍스트 전처리
 # ==============================
+_NON_TEXT = re.compile(r'[^가-힣A-Za-z0-9]')
+
 def normalize_ocr_text(lines):
-    merged = " ".join(lines)
-    merged = re.sub(r'[^가-힣A-Za-z0-9]', '', merged)
-    return merged
+    return _NON_TEXT.sub('', " ".join(lines))
 
 # ==============================
 # 🔹 브랜드명 정규화 (학습 + 자동 보정)
 # ==============================
-def normalize_store_name(name):
+def normalize_store_name(name, user_id=None):
     # ✅ 너무 긴 문자열 처리
     if len(name) > 25:
         name = name[:25]
 
-    # ✅ 교정 사전 우선
-    if name in learning_dict:
-        return learning_dict[name]
-
-    name_clean = name.replace(" ", "").lower()
-
-    # ✅ brand_map 매핑
-    for key, val in brand_map.items():
-        if key in name_clean:
-            return val
+    # ✅ 교정 사전 우선 (사용자 별칭 → 공용 별칭, store_aliases)
+    learned = store_learning.lookup(name, user_id)
+    if learned:
+        return learned
 
-    # ✅ 키워드 기반
-    if "마트" in name or "emart" in name:
-        return "이마트24"
-    if "star" in name or "스벅" in name:
-        return "스타벅스"
-    if "gs25" in name:
-        return "GS25"
-    if "cu" in name:
-        return "CU"
+    # ✅ brand_map 별칭 → 키워드 → Fuzzy Matching (store_matcher)
+    return store_matcher.match(name) or name  # 기본 반환
 
-    # ✅ Fuzzy Matching
-    match = get_close_matches(name_clean, [b.lower() for b in brand_candidates], n=1, cutoff=0.3)
-    if match:
-        return brand_candidates[[b.lower() for b in brand_candidates].index(match[0])]
-
-    return name  # 기본 반환
+def is_known_store(name):
+    """정규화된 가맹점명이 알려진 브랜드인지 (적응형 OCR 의 가맹점 신뢰 판단)"""
+    return bool(name) and name != "미확인" and store_matcher.match(name) == name
 
 # ==============================
-# 🔹 총금액 추출
+# 🔹 총금액 / 날짜 추출 (receipt_tokens 단일 스캔)
 # ==============================
 def extract_total(lines):
-    text = " ".join(lines)
-    nums = re.findall(r'\d{1,3}(?:,\d{3})+|\d{4,}', text)
-    if nums:
-        return max(int(n.replace(",", "")) for n in nums if int(n.replace(",", "")) < 2000000)
-    return None
+    return extract_fields(lines)["total"]
+
+def extract_date(lines):
+    return extract_fields(lines)["date"]
 
 # ==============================
-# 🔹 날짜 추출
+# 🔹 연-월 키 (통계/인덱스용, 'YYYY-MM')
 # ==============================
-def extract_date(lines):
-    text = " ".join(lines)
-    match = re.search(r'(\d{4}[-./년]\d{1,2}[-./월]\d{1,2}(?:\s+\d{1,2}:\d{2}(?::\d{2})?)?)', text)
-    if match:
-        return match.group(1).replace(".", "-").replace("/", "-").replace("년", "-").replace("월", "-").replace("일", "")
-    return None
+_MONTH_RE = re.compile(r'\s*(\d{4})\s*[-./년]\s*(\d{1,2})')
+
+def month_key(date):
+    match = _MONTH_RE.match(date or "")
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        return None
+    return f"{match.group(1)}-{int(match.group(2)):02d}"
 
 # ==============================
 # 🔹 메인 파서
 # ==============================
-def parse_receipt_text(lines, roi_brand=None):
+def parse_receipt_text(lines, roi_brand=None, line_boxes=None, user_id=None):
+    """lines: OCR 문자열 라인, line_boxes: layout.group_lines 결과 (박스/신뢰도 포함, 선택),
+    user_id: 해당 사용자의 교정 별칭을 우선 적용"""
     parsed = {}
-    store_name_raw = None
 
-    # ✅ 1. OCR 라인에서 "가맹점" 또는 "매장명" 찾기
-    for line in lines:
-        if "가맹점" in line:
-            store_name_raw = line.split("가맹점")[-1].strip()
-            break
-        elif "매장명" in line:
-            store_name_raw = line.split("매장명")[-1].strip()
-            break
+    # ✅ 0. 구조화 라인이 있으면 신뢰도 낮은 라인은 fallback/금액 후보에서 제외
+    confident = None
+    if line_boxes:
+        lines = [l["text"] for l in line_boxes]
+        confident = [l["conf"] >= MIN_LINE_CONF for l in line_boxes]
+        if not any(confident):
+            confident = None
+
+    # ✅ 1. 한 번의 토큰 스캔으로 "가맹점"/"매장명" 뒤 텍스트, 총액(키워드 근접), 날짜, 사업자번호
+    fields = extract_fields(lines, confident)
+    store_name_raw = fields["store_raw"]
 
     # ✅ 2. ROI 브랜드 사용
     if not store_name_raw and roi_brand and len(roi_brand.strip()) >= 1:
@@ -127,15 +135,16 @@ def parse_receipt_text(lines, roi_brand=None):
 
     # ✅ 3. OCR 병합 텍스트 기반 (fallback)
     if not store_name_raw:
-        merged_text = normalize_ocr_text(lines)
-        store_name_raw = merged_text
+        confident_lines = [l for l, ok in zip(lines, confident) if ok] if confident else lines
+        store_name_raw = normalize_ocr_text(confident_lines)
 
     # ✅ 4. 브랜드명 정규화
-    store_name = normalize_store_name(store_name_raw)
+    store_name = normalize_store_name(store_name_raw, user_id)
 
     parsed["가맹점"] = store_name if store_name else "미확인"
-    parsed["총금액"] = extract_total(lines)
-    parsed["날짜"] = extract_date(lines)
+    parsed["총금액"] = fields["total"]
+    parsed["날짜"] = fields["date"]
     parsed["카테고리"] = category_map.get(store_name, "기타")
+    parsed["사업자번호"] = fields["bizno"]
 
-    return parsed, lines, learning_dict
+    return parsed, lines
@@ -0,0 +1,299 @@
+import os
+import json
+import sqlite3
+import datetime
+
+import cv2
+
+import db
+import image_store
+from parser import parse_receipt_text, month_key, is_known_store
+from ocr_engine import get_engine
+from layout import parse_tsv, group_lines, top_brand_text, bottom_amount, MIN_LINE_CONF
+from ocr_cache import get_cache, make_key
+from preprocess import preprocess, prepare, binarize, StageReport, ImageRejected, TARGET_TEXT_HEIGHT
+from receipt_tokens import tokenize, extract_fields, AMOUNT, DATE
+
+# adaptive: 저해상도 layout 1회로 끝내고 필드가 덜 읽힌 영수증만 단계적으로 재인식
+# layout: 전체 페이지 1회 인식(TSV) 후 위치로 브랜드/금액 추출, roi: 기존 ROI 2회 + 전체 1회
+OCR_MODE = os.getenv("OCR_MODE", "adaptive").lower()
+# adaptive 빠른 단계의 목표 글자 높이(px) — 표준 단계는 preprocess.TARGET_TEXT_HEIGHT
+OCR_FAST_TEXT_HEIGHT = int(os.getenv("OCR_FAST_TEXT_HEIGHT", "20"))
+# 전처리 로직을 바꾸면 올릴 것 (OCR 캐시 키에 포함)
+PREPROCESS_VERSION = 3
+REQUIRED_FIELDS = ("가맹점", "총금액", "날짜")
+
+# ==========================
+# OCR 전처리/ROI
+# ==========================
+def _roi_gray(roi):
+    return cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY) if roi.ndim == 3 else roi
+
+def extract_top_brand(img):
+    h, w = img.shape[:2]
+    roi = img[0:int(h * 0.2), 0:w]
+    roi_gray = _roi_gray(roi)
+    roi_gray = cv2.threshold(roi_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    roi_text = get_engine().image_to_string(
+        roi_gray, lang='kor+eng', oem=3, psm=7, whitelist="가-힣A-Za-z0-9"
+    ).strip()
+    return roi_text
+
+def extract_bottom_amount(img):
+    h, w = img.shape[:2]
+    roi = img[int(h * 0.7):h, 0:w]
+    roi_gray = _roi_gray(roi)
+    roi_gray = cv2.threshold(roi_gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    text = get_engine().image_to_string(
+        roi_gray, lang='kor+eng', oem=3, psm=6, whitelist="0123456789,"
+    )
+    nums = [int(n.replace(",", "")) for n in text.split() if n.replace(",", "").isdigit()]
+    return max(nums) if nums else None
+
+def run_roi_ocr(image_bytes, report=None):
+    """기존 방식: 상단/하단 ROI 재인식 + 전체 페이지 인식 (디코드는 1회)"""
+    processed_image, img, report = preprocess(image_bytes, color=True, report=report)
+    roi_brand = extract_top_brand(img)
+    report.mark("roi_brand")
+    roi_amount = extract_bottom_amount(img)
+    report.mark("roi_amount")
+    del img
+
+    ocr_text = get_engine().image_to_string(processed_image, lang='kor+eng', psm=6)
+    report.mark("ocr")
+    return ocr_text, None, roi_brand, roi_amount, report
+
+def extract_date_sparse(img):
+    """날짜만 다시 찾기: 숫자/구분자 whitelist + PSM 11(흩어진 텍스트)로 전체 페이지 재인식"""
+    text = get_engine().image_to_string(img, lang='kor+eng', psm=11, whitelist="0123456789-./:")
+    return extract_fields(text.splitlines())["date"]
+
+def _layout_pass(image, report, stage="ocr"):
+    """이진화된 페이지 1회 인식 → (ocr_text, line_boxes, roi_brand, roi_amount)"""
+    tsv = get_engine().image_to_data(image, lang='kor+eng', psm=6)
+    report.mark(stage)
+    line_boxes = group_lines(parse_tsv(tsv))
+    page_height = image.shape[0] if hasattr(image, "shape") else image.size[1]
+    roi_brand = top_brand_text(line_boxes, page_height)
+    roi_amount = bottom_amount(line_boxes, page_height)
+    ocr_text = "\n".join(l["text"] for l in line_boxes)
+    report.mark("layout")
+    return ocr_text, line_boxes, roi_brand, roi_amount
+
+def run_layout_ocr(image_bytes, report=None):
+    """전체 페이지 1회 인식 → 단어 박스/신뢰도로 브랜드·금액 후보를 위치 기반 추출"""
+    processed_image, img, report = preprocess(image_bytes, report=report)
+    del img
+    return (*_layout_pass(processed_image, report), report)
+
+def confident_fields(parsed_result, line_boxes):
+    """믿을 만하게 읽힌 필드 집합: 가맹점은 알려진 브랜드로 정규화됐을 때,
+    총금액/날짜는 그 값이 신뢰도 통과 라인에서 토큰으로 읽혔을 때"""
+    found = set()
+    if is_known_store(parsed_result.get("가맹점")):
+        found.add("가맹점")
+    line_boxes = line_boxes or []
+    ok = [l["conf"] >= MIN_LINE_CONF for l in line_boxes]
+    for t in tokenize([l["text"] for l in line_boxes]):
+        if not ok[t.line]:
+            continue
+        if t.kind == AMOUNT and t.value == parsed_result.get("총금액"):
+            found.add("총금액")
+        elif t.kind == DATE and t.value == parsed_result.get("날짜"):
+            found.add("날짜")
+    return found
+
+def _ocr_dict(ocr_text, line_boxes, roi_brand, roi_amount):
+    return {"raw_text": ocr_text, "line_boxes": line_boxes, "roi_brand": roi_brand, "roi_amount": roi_amount}
+
+def run_adaptive_ocr(image_bytes, report=None):
+    """단계적 인식: fast(저해상도 layout) → full(표준 해상도 layout) → targeted(빠진 필드만 재인식)
+
+    앞 단계에서 가맹점/총금액/날짜가 모두 믿을 만하게 읽히면 거기서 멈춘다. 결과가 user_id 없이
+    캐시되므로 판단도 사용자별 별칭 없이 (공용 별칭/브랜드 목록만으로) 한다.
+    targeted 단계는 빠진 필드별로 상단 ROI(PSM 7), 하단 금액 ROI, 날짜용 PSM 11 만 돌리고
+    결과를 roi_brand/roi_amount/roi_date 로 남겨 parse_ocr 가 그대로 재현할 수 있게 한다.
+    반환: OCR 원시 결과 dict (+ tier, escalated)
+    """
+    report = report or StageReport()
+    _, gray, report = prepare(image_bytes, report=report)
+
+    def attempt(text_height, tag):
+        image = binarize(gray, report, text_height, tag)
+        ocr = _ocr_dict(*_layout_pass(image, report, "ocr" + tag))
+        found = confident_fields(parse_ocr(ocr), ocr["line_boxes"])
+        report.mark("parse" + tag)
+        return image, ocr, [f for f in REQUIRED_FIELDS if f not in found]
+
+    tier = "fast"
+    _, ocr, missing = attempt(OCR_FAST_TEXT_HEIGHT, "_fast")
+    escalated = list(missing)
+    if missing:
+        tier = "full"
+        image, full, full_missing = attempt(TARGET_TEXT_HEIGHT, "_full")
+        if len(full_missing) <= len(missing):
+            ocr, missing = full, full_missing
+    if missing:
+        tier = "targeted"
+        if "가맹점" in missing:
+            ocr["roi_brand"] = extract_top_brand(image) or ocr["roi_brand"]
+            report.mark("roi_brand")
+        if "총금액" in missing:
+            ocr["roi_amount"] = extract_bottom_amount(image) or ocr["roi_amount"]
+            report.mark("roi_amount")
+        if "날짜" in missing:
+            ocr["roi_date"] = extract_date_sparse(image)
+            report.mark("roi_date")
+    ocr["tier"], ocr["escalated"] = tier, escalated
+    return ocr
+
+# ==========================
+# 인식 + 파싱 + 저장
+# ==========================
+def ocr_signature():
+    """OCR 결과에 영향을 주는 설정 (캐시 키 구성요소)"""
+    mode = f"adaptive{OCR_FAST_TEXT_HEIGHT}" if OCR_MODE == 'adaptive' else OCR_MODE
+    return f"{get_engine().name}|kor+eng|psm6|{mode}|pp{PREPROCESS_VERSION}"
+
+def ocr_pass(image_bytes, report):
+    """OCR_MODE 에 따라 인식 1회 (캐시 없이) → OCR 원시 결과 dict, report.tier 에 도달 단계 기록
+
+    사용자와 무관해야 함 (캐시 키에 user_id 가 없음) — 사용자별 별칭은 parse_ocr 에서만 적용
+    """
+    if OCR_MODE == 'adaptive':
+        ocr = run_adaptive_ocr(image_bytes, report)
+    else:
+        run = run_roi_ocr if OCR_MODE == 'roi' else run_layout_ocr
+        ocr = _ocr_dict(*run(image_bytes, report)[:4])
+        ocr["tier"] = OCR_MODE
+    report.tier = ocr["tier"]
+    return ocr
+
+def run_ocr(image_bytes, report=None):
+    """이미지 → OCR 원시 결과 dict (같은 이미지/설정이면 캐시에서 반환)"""
+    report = report or StageReport()
+    cache = get_cache()
+    key = make_key(image_bytes, ocr_signature()) if cache else None
+    if cache:
+        cached = cache.get(key)
+        report.mark("cache_lookup")
+        if cached is not None:
+            report.tier = "cache"
+            return cached
+
+    ocr = ocr_pass(image_bytes, report)
+    ocr["cache_key"] = key
+    if cache:
+        cache.put(key, ocr)
+        report.mark("cache_store")
+    return ocr
+
+def parse_ocr(ocr, user_id=None):
+    """OCR 원시 결과 → parsed_result (캐시된 텍스트에 파서만 다시 돌릴 때도 사용)"""
+    ocr_lines = ocr["raw_text"].splitlines()
+    parsed_result, _ = parse_receipt_text(ocr_lines, ocr["roi_brand"], ocr["line_boxes"], user_id)
+
+    if not parsed_result.get("총금액") and ocr["roi_amount"]:
+        parsed_result["총금액"] = ocr["roi_amount"]
+    if not parsed_result.get("날짜") and ocr.get("roi_date"):
+        parsed_result["날짜"] = ocr["roi_date"]
+    return parsed_result
+
+def recognize(image_bytes, report=None, user_id=None):
+    """이미지 → (parsed_result, ocr) — 단계별 시간은 report 에 기록"""
+    report = report or StageReport()
+    ocr = run_ocr(image_bytes, report)
+    parsed_result = parse_ocr(ocr, user_id)
+    report.mark("parse")
+    return parsed_result, ocr
+
+def store_image(image_bytes, report, db_path=None):
+    """원본/축소본 보관 → 이미지 해시 (보관에 실패해도 인식 결과 저장은 계속)"""
+    try:
+        digest = image_store.put(image_bytes, db_path)
+    except (OSError, sqlite3.Error) as e:
+        print(f"⚠ 이미지 보관 실패: {e}")
+        digest = None
+    report.mark("image_store")
+    return digest
+
+def build_row(user_id, parsed_result, roi_brand, ocr_key=None, image_hash=None):
+    """transactions INSERT 파라미터 튜플 (user_id, store, amount, date, category, ocr_store, ym, ocr_key, image_hash)
+
+    ocr_key: OCR 캐시 키 (reparse.py 가 원문을 다시 찾을 때 사용)
+    image_hash: image_store 의 원본/축소본 해시
+    """
+    date_value = parsed_result.get("날짜") or datetime.datetime.now().strftime('%Y-%m-%d')
+
+    # ocr_store에 fallback 적용
+    ocr_original_value = roi_brand if roi_brand else parsed_result.get("가맹점")
+    return (user_id,
+            parsed_result.get("가맹점"),
+            parsed_result.get("총금액"),
+            date_value,
+            parsed_result.get("카테고리"),
+            ocr_original_value,
+            month_key(date_value),
+            ocr_key,
+            image_hash)
+
+def save_transaction(db_path, user_id, parsed_result, roi_brand, ocr_key=None, image_hash=None):
+    return db.insert_transaction(build_row(user_id, parsed_result, roi_brand, ocr_key, image_hash), db_path)
+
+def save_transactions(db_path, rows):
+    """여러 건을 한 트랜잭션으로 저장 (배치 업로드)"""
+    return db.insert_transactions(rows, db_path)
+
+def process_receipt(db_path, user_id, image_bytes, report=None):
+    """/ocr 한 건 전체 처리 (응답 JSON 형태 그대로 반환)"""
+    report = report or StageReport()
+    parsed_result, ocr = recognize(image_bytes, report, user_id)
+    image_hash = store_image(image_bytes, report, db_path)
+    transaction_id = save_transaction(db_path, user_id, parsed_result, ocr["roi_brand"], ocr["cache_key"], image_hash)
+    report.mark("db_insert")
+    return {"status": "success", "receipt": parsed_result, "raw_text": ocr["raw_text"],
+            "roi_brand": ocr["roi_brand"], "transaction_id": transaction_id,
+            "timings": report.to_dict()}
+
+def recognize_receipt(image_bytes, user_id=None):
+    """배치 업로드 워커용: 저장 없이 인식 결과만 반환"""
+    report = StageReport()
+    parsed_result, ocr = recognize(image_bytes, report, user_id)
+    image_hash = store_image(image_bytes, report)
+    return {"receipt": parsed_result, "raw_text": ocr["raw_text"], "roi_brand": ocr["roi_brand"],
+            "ocr_key": ocr["cache_key"], "image_hash": image_hash, "timings": report.to_dict()}
+
+def process_job(db_path, job_id):
+    """작업 큐 워커 프로세스 진입점: ocr_jobs 에서 이미지를 읽어 인식만 수행
+
+    저장(transactions INSERT + ocr_jobs 갱신)은 부모 프로세스의 그룹 커밋 writer 가
+    여러 작업을 묶어 처리하도록 INSERT 파라미터(row)와 응답 JSON 을 돌려준다.
+    """
+    row = db.connect(db_path).execute('SELECT user_id, image FROM ocr_jobs WHERE id=?', (job_id,)).fetchone()
+    if not row:
+        return
+    user_id, image_bytes = row
+    report = StageReport()
+    try:
+        parsed_result, ocr = recognize(image_bytes, report, user_id)
+        image_hash = store_image(image_bytes, report, db_path)
+        result = {"status": "success", "receipt": parsed_result, "raw_text": ocr["raw_text"],
+                  "roi_brand": ocr["roi_brand"], "timings": report.to_dict()}
+        row = build_row(user_id, parsed_result, ocr["roi_brand"], ocr["cache_key"], image_hash)
+        return {"status": "done", "row": row, "result": result, "timings": result["timings"]}
+    except ImageRejected as e:
+        # 품질 게이트에서 바로 거절 (OCR 안 돌림): 사유/점수를 결과에 남겨 클라이언트가 재촬영 안내
+        return {"status": "failed", "rejected": True, "error": f"image rejected: {e.reason}",
+                "result": {"status": "rejected", **e.to_dict()}, "timings": report.to_dict()}
+    except Exception as e:
+        return {"status": "failed", "error": str(e), "timings": None}
+
+def finish_job(conn, job_id, outcome):
+    """process_job 결과 저장 (그룹 커밋 writer 안에서 호출: 한 트랜잭션에 INSERT + 작업 상태)"""
+    result, error = outcome.get("result"), outcome.get("error")
+    if outcome["status"] == "done":
+        result["transaction_id"] = conn.execute(db.INSERT_TRANSACTION_SQL, outcome["row"]).lastrowid
+    conn.execute('''
+        UPDATE ocr_jobs SET status=?, result=?, error=?, image=NULL, updated_at=datetime('now')
+        WHERE id=?
+    ''', (outcome["status"], json.dumps(result, ensure_ascii=False) if result else None, error, job_id))
@@ -0,0 +1,362 @@
+import io
+import os
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# ==========================
+# 설정
+# ==========================
+# 디코드 단계에서 허용할 최대 픽셀 수 (넘으면 IMREAD_REDUCED_* 로 1/2, 1/4, 1/8 디코드)
+DECODE_MAX_PIXELS = int(os.getenv("DECODE_MAX_PIXELS", str(8_000_000)))
+# 이진화 직전 이미지의 최대 픽셀 수 (업스케일 상한)
+OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", str(12_000_000)))
+TARGET_TEXT_HEIGHT = 32   # Tesseract 가 잘 읽는 글자 높이(px)
+MIN_SCALE, MAX_SCALE = 0.5, 2.0
+ANALYSIS_WIDTH = 800      # 글자 높이 추정/윤곽 검출용 축소 폭
+# 품질 게이트 (축소본 기준): 라플라시안 분산(선명도), 밝기 표준편차(대비)
+QUALITY_GATE = os.getenv("QUALITY_GATE", "1") == "1"
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "15"))
+QUALITY_MIN_CONTRAST = float(os.getenv("QUALITY_MIN_CONTRAST", "12"))
+MAX_SKEW_DEG = 15.0       # 이보다 큰 기울기 추정값은 신뢰하지 않음
+MIN_SKEW_DEG = 0.3        # 이보다 작으면 회전 생략
+MARGIN_PAD = 0.02         # 여백 자를 때 남길 여유 (변 길이 비율)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+_REDUCED_FLAGS = {
+    True: {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+           4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8},
+    False: {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+            4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8},
+}
+
+
+class ImageRejected(ValueError):
+    """OCR 을 돌려도 의미 없는 이미지 (흐림/저대비) — API 는 422 로 응답"""
+
+    def __init__(self, reason, scores):
+        super().__init__(reason)
+        self.reason = reason
+        self.scores = scores
+
+    def __reduce__(self):  # 프로세스 풀 경계를 넘을 때 scores 유지
+        return ImageRejected, (self.reason, self.scores)
+
+    def to_dict(self):
+        return {"error": "Image rejected", "reason": self.reason, "quality": self.scores}
+
+
+# ==========================
+# 단계별 시간/배열 크기/메모리 기록
+# ==========================
+def rss_bytes():
+    """현재 프로세스 RSS (리눅스 /proc 기준, 없으면 None)"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StageReport:
+    def __init__(self):
+        self.stages = []
+        self.peak_bytes = 0
+        self.quality = None
+        self.tier = None
+        self.upload = None
+        # RSS 는 단계 경계에서만 샘플링 (같은 프로세스의 다른 요청 몫도 섞일 수 있는 근사치)
+        self.rss_start = rss_bytes()
+        self.peak_rss = self.rss_start
+        self._t = time.perf_counter()
+
+    def mark(self, name, array=None):
+        now = time.perf_counter()
+        stage = {"stage": name, "ms": round((now - self._t) * 1000, 2)}
+        if array is not None:
+            stage["shape"] = list(array.shape)
+            stage["bytes"] = int(array.nbytes)
+            self.peak_bytes = max(self.peak_bytes, int(array.nbytes))
+        if self.rss_start is not None:
+            self.peak_rss = max(self.peak_rss, rss_bytes() or 0)
+        self.stages.append(stage)
+        self._t = now
+
+    def to_dict(self):
+        out = {"stages": self.stages, "peak_array_bytes": self.peak_bytes,
+               "total_ms": round(sum(s["ms"] for s in self.stages), 2)}
+        if self.rss_start is not None:
+            out["peak_rss_bytes"] = self.peak_rss
+            out["rss_growth_bytes"] = self.peak_rss - self.rss_start
+        if self.upload is not None:
+            out["upload"] = self.upload
+        if self.quality is not None:
+            out["quality"] = self.quality
+        if self.tier is not None:
+            out["tier"] = self.tier
+        return out
+
+
+# ==========================
+# 디코드 (1회, 복사 없이 버퍼에서 바로)
+# ==========================
+def image_size(image_bytes):
+    """헤더만 읽어 (w, h) 반환, 실패 시 None (mmap 등 파일 객체는 복사 없이 그대로)"""
+    fp = image_bytes if hasattr(image_bytes, "seek") else io.BytesIO(image_bytes)
+    try:
+        fp.seek(0)
+        with Image.open(fp) as im:
+            return im.size
+    except Exception:
+        return None
+
+
+def reduction_for(size, max_pixels=DECODE_MAX_PIXELS):
+    if not size:
+        return 1
+    w, h = size
+    factor = 1
+    while factor < 8 and (w // factor) * (h // factor) > max_pixels:
+        factor *= 2
+    return factor
+
+
+def decode_image(image_bytes, color=False, max_pixels=DECODE_MAX_PIXELS):
+    buf = np.frombuffer(image_bytes, dtype=np.uint8)
+    factor = reduction_for(image_size(image_bytes), max_pixels)
+    img = cv2.imdecode(buf, _REDUCED_FLAGS[color][factor])
+    if img is None:
+        raise ValueError("Unsupported or corrupt image")
+    return img
+
+
+# ==========================
+# 분석 (축소본에서)
+# ==========================
+def _analysis_copy(gray):
+    h, w = gray.shape[:2]
+    if w <= ANALYSIS_WIDTH:
+        return gray, 1.0
+    ratio = ANALYSIS_WIDTH / w
+    return cv2.resize(gray, (ANALYSIS_WIDTH, max(1, int(h * ratio))), interpolation=cv2.INTER_AREA), ratio
+
+
+def quality_scores(gray):
+    """{"sharpness": 라플라시안 분산, "contrast": 밝기 표준편차} (축소본에서, 수 ms)"""
+    small, _ = _analysis_copy(gray)
+    return {"sharpness": round(float(cv2.Laplacian(small, cv2.CV_32F).var()), 1),
+            "contrast": round(float(small.std()), 1)}
+
+
+def check_quality(gray):
+    """흐리거나 대비가 없는 이미지는 OCR 전에 ImageRejected"""
+    scores = quality_scores(gray)
+    if QUALITY_GATE:
+        if scores["contrast"] < QUALITY_MIN_CONTRAST:
+            raise ImageRejected("low_contrast", scores)
+        if scores["sharpness"] < QUALITY_MIN_SHARPNESS:
+            raise ImageRejected("blurry", scores)
+    return scores
+
+
+def _receipt_contour(small):
+    blurred = cv2.GaussianBlur(small, (5, 5), 0)
+    _, mask = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, np.ones((9, 9), np.uint8))
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    largest = max(contours, key=cv2.contourArea)
+    area_ratio = cv2.contourArea(largest) / float(small.shape[0] * small.shape[1])
+    return largest if 0.2 <= area_ratio <= 0.95 else None
+
+
+def _order_corners(pts):
+    """4점 → 좌상, 우상, 우하, 좌하"""
+    s = pts.sum(axis=1)
+    d = np.diff(pts, axis=1).ravel()
+    return np.array([pts[np.argmin(s)], pts[np.argmin(d)], pts[np.argmax(s)], pts[np.argmax(d)]],
+                    dtype=np.float32)
+
+
+def find_receipt_quad(gray):
+    """영수증 윤곽의 네 꼭짓점 (원본 좌표, 좌상부터 시계 방향) — 못 찾으면 None"""
+    small, ratio = _analysis_copy(gray)
+    contour = _receipt_contour(small)
+    if contour is None:
+        return None
+    hull = cv2.convexHull(contour)
+    approx = cv2.approxPolyDP(hull, 0.02 * cv2.arcLength(hull, True), True)
+    pts = approx.reshape(-1, 2) if len(approx) == 4 else cv2.boxPoints(cv2.minAreaRect(contour))
+    return _order_corners(np.asarray(pts, dtype=np.float32) / ratio)
+
+
+def _is_axis_aligned(quad, tol=0.01):
+    x, y, w, h = cv2.boundingRect(quad.astype(np.int32))
+    rect = np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]], dtype=np.float32)
+    return float(np.abs(quad - rect).max()) <= tol * max(w, h)
+
+
+def warp_quad(img, quad):
+    """사각형 영역을 정면 직사각형으로 펴기 (축 정렬이면 복사 없는 슬라이스)"""
+    if _is_axis_aligned(quad):
+        x, y, w, h = cv2.boundingRect(quad.astype(np.int32))
+        return img[max(y, 0):y + h, max(x, 0):x + w]
+    tl, tr, br, bl = quad
+    width = int(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl)))
+    height = int(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr)))
+    dst = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+    matrix = cv2.getPerspectiveTransform(quad, dst)
+    return cv2.warpPerspective(img, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_REPLICATE)
+
+
+def estimate_skew(gray):
+    """텍스트 줄 기울기(도, 반시계 +) — 가로로 번진 글자 덩어리들의 minAreaRect 각도 중앙값"""
+    small, _ = _analysis_copy(gray)
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (25, 3)))
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    angles = []
+    for c in contours:
+        (_, _), (w, h), angle = cv2.minAreaRect(c)
+        if min(w, h) < 3:
+            continue
+        if w < h:
+            w, h, angle = h, w, angle + 90
+        # 긴 변 방향을 [-90, 90) 으로 — OpenCV 버전마다 minAreaRect 각도 범위가 [-90, 0) / (0, 90] 로 다름
+        angle = (angle + 90) % 180 - 90
+        if w / h >= 5:
+            angles.append(-angle)
+    if len(angles) < 3:
+        return 0.0
+    angle = float(np.median(angles))
+    return angle if abs(angle) <= MAX_SKEW_DEG else 0.0
+
+
+def rotate(img, angle):
+    """angle 도 만큼 반시계 회전 (크기 유지, 가장자리는 복제)"""
+    h, w = img.shape[:2]
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(img, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def content_box(gray):
+    """글자가 있는 영역 (x, y, w, h), 여백 조금 남김 — 못 찾으면 None"""
+    small, ratio = _analysis_copy(gray)
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))  # 점 잡음 제거
+    pts = cv2.findNonZero(binary)
+    if pts is None:
+        return None
+    x, y, w, h = cv2.boundingRect(pts)
+    sh, sw = small.shape[:2]
+    pad = int(MARGIN_PAD * max(sh, sw))
+    x0, y0 = max(x - pad, 0), max(y - pad, 0)
+    x1, y1 = min(x + w + pad, sw), min(y + h + pad, sh)
+    if (x1 - x0) * (y1 - y0) < 0.1 * sw * sh:
+        return None  # 거의 빈 이미지 → 자르지 않음
+    return tuple(int(round(v / ratio)) for v in (x0, y0, x1 - x0, y1 - y0))
+
+
+def correct_geometry(img, gray, report):
+    """원근 보정 → 기울기 보정 → 여백 자르기 (img 와 gray 에 같은 변환) → (img, gray)"""
+    quad = find_receipt_quad(gray)
+    if quad is not None:
+        gray = warp_quad(gray, quad)
+        img = warp_quad(img, quad) if img is not gray else gray
+    report.mark("warp", gray)
+
+    angle = estimate_skew(gray)
+    if abs(angle) >= MIN_SKEW_DEG:
+        gray = rotate(gray, -angle)
+        img = rotate(img, -angle) if img.ndim == 3 else gray
+    report.mark("deskew", gray)
+
+    box = content_box(gray)
+    if box:
+        x, y, w, h = box
+        gray = gray[y:y + h, x:x + w]  # view, 복사 없음
+        img = img[y:y + h, x:x + w]
+    report.mark("crop", gray)
+    return img, gray
+
+
+def estimate_text_height(gray):
+    """연결 성분 높이의 중앙값으로 글자 높이(px, 원본 기준) 추정 — 못 찾으면 None"""
+    small, ratio = _analysis_copy(gray)
+    _, binary = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    n, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    if n <= 1:
+        return None
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    sh, sw = small.shape[:2]
+    keep = (heights >= 3) & (heights < sh * 0.1) & (widths < sw * 0.3) & (areas >= 6)
+    if keep.sum() < 10:
+        return None
+    return float(np.median(heights[keep])) / ratio
+
+
+def choose_scale(text_height, shape, max_pixels=OCR_MAX_PIXELS, target=TARGET_TEXT_HEIGHT):
+    scale = 2.0 if not text_height else target / text_height
+    scale = min(max(scale, MIN_SCALE), MAX_SCALE)
+    h, w = shape[:2]
+    if h * w * scale * scale > max_pixels:
+        scale = (max_pixels / float(h * w)) ** 0.5
+    return scale
+
+
+# ==========================
+# 전처리 파이프라인
+# ==========================
+def binarize(gray, report=None, text_height=TARGET_TEXT_HEIGHT, tag=""):
+    """기하 보정된 그레이 → 글자 높이 기준 스케일 → 적응형 이진화
+
+    text_height: 목표 글자 높이 (적응형 OCR 의 빠른 단계는 낮춰서 작은 이미지로 인식)
+    tag: 단계 이름 접미사 (같은 이미지를 여러 해상도로 이진화할 때 구분)
+    """
+    report = report or StageReport()
+    scale = choose_scale(estimate_text_height(gray), gray.shape, target=text_height)
+    if abs(scale - 1.0) > 0.05:
+        interp = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interp)
+    report.mark("scale" + tag, gray)
+
+    thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                   cv2.THRESH_BINARY, 31, 15)
+    report.mark("threshold" + tag, thresh)
+    return thresh
+
+
+def correct_array(img, report=None):
+    """디코드된 이미지(컬러/그레이) → (기하 보정된 원본, 기하 보정된 그레이)
+
+    흐림/저대비 이미지는 기하 보정 전에 ImageRejected.
+    """
+    report = report or StageReport()
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+    report.mark("grayscale", gray)
+
+    report.quality = check_quality(gray)
+    report.mark("quality")
+    return correct_geometry(img, gray, report)
+
+
+def prepare(image_bytes, color=False, report=None):
+    """bytes → (기하 보정된 원본, 기하 보정된 그레이, StageReport) — 이진화는 호출자가 해상도별로"""
+    report = report or StageReport()
+    img = decode_image(image_bytes, color=color)
+    report.mark("decode", img)
+    img, gray = correct_array(img, report)
+    return img, gray, report
+
+
+def preprocess(image_bytes, color=False, report=None):
+    """bytes → (이진화 PIL 이미지, 기하 보정된 원본 배열, StageReport)"""
+    img, gray, report = prepare(image_bytes, color=color, report=report)
+    return Image.fromarray(binarize(gray, report)), img, report
@@ -0,0 +1,230 @@
+"""영수증 텍스트 토크나이저 + 필드 추출 (컴파일된 정규식으로 텍스트 1회 스캔)
+
+라인들을 한 번만 훑어 금액/날짜/시각/사업자번호/전화번호/키워드 토큰을 만들고,
+합계·결제금액 같은 키워드와의 거리로 필드를 고른다. 캐시된 OCR 텍스트를
+대량으로 다시 파싱할 때도 그대로 쓴다.
+
+    python receipt_tokens.py bench --count 20000             # 합성 텍스트, 기존 구현과 처리량 비교
+    python receipt_tokens.py bench --cache ocr_cache.db      # 캐시된 OCR 텍스트로
+"""
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+from collections import namedtuple
+from contextlib import closing
+
+AMOUNT, DATE, TIME, BIZNO, PHONE, TOTAL_KW, STORE_KW = (
+    "amount", "date", "time", "bizno", "phone", "total_kw", "store_kw")
+MAX_AMOUNT = 2000000  # 이 이상은 금액 후보에서 제외 (카드/승인번호 등)
+
+Token = namedtuple("Token", "kind value line start end")
+
+# 총액 키워드 → 우선순위 (작을수록 강함). OCR 이 글자 사이에 공백을 넣어도 매칭
+TOTAL_KEYWORDS = {
+    "결제금액": 0, "받을금액": 0, "승인금액": 0,
+    "총결제금액": 0, "총금액": 1, "총액": 1, "합계금액": 1, "합계": 2,
+}
+STORE_KEYWORDS = ("가맹점", "매장명")
+
+
+def _spaced(word):
+    return r"[ \t]*".join(map(re.escape, word))
+
+
+# 앞쪽 대안이 우선: 사업자번호/전화번호/날짜의 숫자가 금액으로 잡히지 않게.
+# 맨 앞 lookahead 는 토큰이 시작될 수 있는 글자에서만 대안들을 시도하게 하는 빠른 필터
+_TOKEN_STARTS = "".join(sorted({k[0] for k in TOTAL_KEYWORDS} | {k[0] for k in STORE_KEYWORDS}))
+TOKEN_RE = re.compile(r"(?=[\d" + _TOKEN_STARTS + "])(?:" + "|".join([
+    # 숫자 토큰은 숫자 시작 위치에서만 (숫자 중간 위치는 lookbehind 한 번으로 건너뜀)
+    r"(?<![\d,])(?:" + "|".join([
+        r"(?P<bizno>\d{3}-\d{2}-\d{5}(?!\d))",
+        r"(?P<phone>0\d{1,2}-\d{3,4}-\d{4}(?!\d))",
+        r"(?P<date>\d{4}[-./년]\d{1,2}[-./월]\d{1,2}(?:[ \t]+\d{1,2}:\d{2}(?::\d{2})?)?)",
+        r"(?P<time>\d{1,2}:\d{2}(?::\d{2})?(?!\d))",
+        r"(?P<amount>(?:\d{1,3}(?:,\d{3})+|\d{4,})(?!\d))",
+    ]) + ")",
+    "(?P<total_kw>" + "|".join(_spaced(k) for k in sorted(TOTAL_KEYWORDS, key=len, reverse=True)) + ")",
+    "(?P<store_kw>" + "|".join(map(_spaced, STORE_KEYWORDS)) + ")",
+]) + ")")
+_SPACES = re.compile(r"[ \t]+")
+_DATE_SEPARATORS = str.maketrans({".": "-", "/": "-", "년": "-", "월": "-"})
+
+
+def _scan(text):
+    """'\n' 으로 이은 텍스트 1회 스캔 → Token 리스트 (start/end 는 해당 라인 기준 위치)"""
+    tokens = []
+    append, new, count = tokens.append, tuple.__new__, text.count
+    line, line_start, pos = 0, 0, 0
+    for m in TOKEN_RE.finditer(text):
+        start, end = m.span()
+        if count("\n", pos, start):
+            line += count("\n", pos, start)
+            line_start = text.rindex("\n", pos, start) + 1
+        pos = start
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == AMOUNT:
+            value = int(value.replace(",", ""))
+        elif kind == DATE:
+            value = value.translate(_DATE_SEPARATORS)
+        elif kind == TOTAL_KW or kind == STORE_KW:
+            value = _SPACES.sub("", value)
+        # Token(...) 보다 빠른 생성 (대량 재파싱 시 토큰 수만큼 호출됨)
+        append(new(Token, (kind, value, line, start - line_start, end - line_start)))
+    return tokens
+
+
+def tokenize(lines):
+    """라인 리스트 → Token 리스트 (라인 순, 라인 안에서는 위치 순)"""
+    return _scan("\n".join(lines))
+
+
+def _total_near_keyword(keywords, amounts):
+    """가장 강한(같으면 아래쪽) 총액 키워드와 같은 줄 오른쪽의 최대 금액, 없으면 다음 줄 첫 금액"""
+    keywords = sorted(keywords, key=lambda t: (TOTAL_KEYWORDS[t.value], -t.line))
+    for kw in keywords:
+        same_line = [a.value for a in amounts if a.line == kw.line and a.start >= kw.end]
+        if same_line:
+            return max(same_line)
+        next_line = [a.value for a in amounts if a.line == kw.line + 1]
+        if next_line:
+            return next_line[0]
+    return None
+
+
+def extract_fields(lines, confident=None, tokens=None):
+    """lines → {"store_raw", "total", "date", "bizno"}
+
+    confident: 라인별 신뢰도 통과 여부 (있으면 총액은 신뢰 라인에서 먼저 찾음)
+    """
+    tokens = tokenize(lines) if tokens is None else tokens
+    store_kw = date = bizno = None
+    amounts, keywords = [], []
+    for t in tokens:
+        kind = t.kind
+        if kind == AMOUNT:
+            if t.value < MAX_AMOUNT:
+                amounts.append(t)
+        elif kind == TOTAL_KW:
+            keywords.append(t)
+        elif kind == STORE_KW:
+            # 첫 키워드 라인의 마지막 키워드 뒤 (기존 line.split(키워드)[-1])
+            if store_kw is None or store_kw.line == t.line:
+                store_kw = t
+        elif kind == DATE:
+            date = date or t.value
+        elif kind == BIZNO:
+            bizno = bizno or t.value
+
+    total = None
+    pools = [amounts]
+    if confident is not None:
+        pools.insert(0, [a for a in amounts if confident[a.line]])
+    for pool in pools:
+        total = _total_near_keyword(keywords, pool) or max((a.value for a in pool), default=None)
+        if total:
+            break
+
+    return {
+        "store_raw": lines[store_kw.line][store_kw.end:].strip() if store_kw else None,
+        "total": total,
+        "date": date,
+        "bizno": bizno,
+    }
+
+
+# ==========================
+# 마이크로벤치마크
+# ==========================
+def _legacy_extract(lines):
+    """parser.py 의 이전 구현 (가맹점 라인 탐색 + extract_total + extract_date, 매번 join/미컴파일 정규식)"""
+    store = None
+    for line in lines:
+        if "가맹점" in line:
+            store = line.split("가맹점")[-1].strip()
+            break
+        elif "매장명" in line:
+            store = line.split("매장명")[-1].strip()
+            break
+    text = " ".join(lines)
+    nums = re.findall(r'\d{1,3}(?:,\d{3})+|\d{4,}', text)
+    values = [int(n.replace(",", "")) for n in nums if int(n.replace(",", "")) < 2000000]
+    total = max(values) if values else None
+    text = " ".join(lines)
+    match = re.search(r'(\d{4}[-./년]\d{1,2}[-./월]\d{1,2}(?:\s+\d{1,2}:\d{2}(?::\d{2})?)?)', text)
+    date = match.group(1).replace(".", "-").replace("/", "-").replace("년", "-").replace("월", "-") if match else None
+    return total, date, store
+
+
+def synthetic_texts(count, seed=1):
+    """[(텍스트, 기대 총액, 기대 날짜)]"""
+    rng = random.Random(seed)
+    stores = ["스타벅스 강남점", "이디야커피 역삼", "GS25 선릉점", "CU 삼성점", "버거킹 서초"]
+    items = ["아메리카노", "카페라떼", "삼각김밥", "생수", "와퍼세트", "감자튀김"]
+    texts = []
+    for _ in range(count):
+        lines = [f"가맹점 {rng.choice(stores)}", f"사업자번호 {rng.randint(100, 999)}-{rng.randint(10, 99)}-{rng.randint(10000, 99999)}",
+                 f"TEL 02-{rng.randint(100, 9999)}-{rng.randint(1000, 9999)}",
+                 f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}"]
+        date = lines[-1]
+        total = 0
+        for _ in range(rng.randint(2, 8)):
+            price = rng.randint(5, 90) * 100
+            qty = rng.randint(1, 3)
+            total += price * qty
+            lines.append(f"{rng.choice(items)} {qty} {price:,} {price * qty:,}")
+        lines += [f"공급가액 {total * 10 // 11:,}", f"부가세 {total - total * 10 // 11:,}",
+                  f"합 계 {total:,}", f"카드번호 {rng.randint(1000, 9999)}-****-****-{rng.randint(1000, 9999)}",
+                  f"결제금액 {total:,}"]
+        texts.append(("\n".join(lines), total, date))
+    return texts
+
+
+def cached_texts(path, limit):
+    with closing(sqlite3.connect(path)) as conn:
+        rows = conn.execute('SELECT payload FROM ocr_cache LIMIT ?', (limit,)).fetchall()
+    return [(json.loads(payload)["raw_text"], None, None) for (payload,) in rows]
+
+
+def _run(fn, samples):
+    """(texts/s, 총액 정확도, 날짜 정확도) — fn(lines) → (total, date, store), 정답이 없는 샘플은 정확도에서 제외"""
+    lines = [text.splitlines() for text, _, _ in samples]
+    start = time.perf_counter()
+    results = [fn(l) for l in lines]
+    elapsed = time.perf_counter() - start
+    labeled = [(r, s) for r, s in zip(results, samples) if s[1] is not None]
+    acc_total = sum(r[0] == s[1] for r, s in labeled) / len(labeled) if labeled else None
+    acc_date = sum(r[1] == s[2] for r, s in labeled) / len(labeled) if labeled else None
+    return len(samples) / elapsed if elapsed else float("inf"), acc_total, acc_date
+
+
+def _new_extract(lines):
+    fields = extract_fields(lines)
+    return fields["total"], fields["date"], fields["store_raw"]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="영수증 필드 추출기")
+    ap.add_argument("command", choices=["bench"])
+    ap.add_argument("--count", type=int, default=20000)
+    ap.add_argument("--cache", help="ocr_cache.db 의 raw_text 사용")
+    args = ap.parse_args(argv)
+
+    texts = cached_texts(args.cache, args.count) if args.cache else synthetic_texts(args.count)
+    if not texts:
+        print("텍스트 없음")
+        return 1
+    print(f"텍스트 {len(texts)}개")
+    for name, fn in (("legacy", _legacy_extract), ("tokenizer", _new_extract)):
+        rate, acc_total, acc_date = _run(fn, texts)
+        acc = f" 총액 정확도 {acc_total:.3f} 날짜 정확도 {acc_date:.3f}" if acc_total is not None else ""
+        print(f"  {name:<10}: {rate:,.0f} texts/s{acc}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""저장된 영수증 일괄 재파싱 (parser.py / 브랜드 목록을 고친 뒤 기존 행에 반영)
+
+    python reparse.py --dry-run              # 바뀔 내용만 출력
+    python reparse.py --workers 4            # 청크 단위로 반영, 중단 후 다시 실행하면 이어서
+    python reparse.py --restart              # 체크포인트 무시하고 처음부터
+    python reparse.py --reocr                # 보관된 원본 이미지로 OCR 부터 다시
+
+transactions 를 id 순으로 청크씩 읽어, OCR 캐시에 원문이 남아 있으면 전체 필드를,
+없으면 ocr_store 로 가맹점/카테고리만 프로세스 풀에서 다시 계산한다.
+바뀐 필드는 청크마다 한 트랜잭션으로 기록한다. 사용자가 고친 필드(corrected_fields)는
+덮어쓰지 않으며, 갱신 SQL 에서도 다시 확인하므로 실행 중에 들어온 수정도 보존된다.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import db
+import parser
+import pipeline
+import image_store
+import store_learning
+from ocr_cache import get_cache
+
+SELECT_SQL = '''
+    SELECT id, user_id, store, amount, date, category, ocr_store, ocr_key, image_hash, corrected_fields
+    FROM transactions
+    WHERE id > ? AND deleted_at IS NULL {user_filter}
+    ORDER BY id
+    LIMIT ?
+'''
+# 필드별: 그 사이 사용자가 고쳤거나 값이 바뀌었으면 그대로 둠
+_GUARD = "instr(COALESCE(corrected_fields, ''), ',{f},') OR {f} IS NOT ?"
+# 카테고리는 가맹점에서 계산하므로 가맹점이 읽은 값 그대로이고 (바뀔 예정이면) 가맹점 갱신도 통과할 때만
+_CATEGORY_GUARD = _GUARD.format(f="category") + " OR store IS NOT ?"
+_STORE_CORRECTED = " OR instr(COALESCE(corrected_fields, ''), ',store,')"
+
+
+def _init_worker(db_path):
+    db.DB_PATH = db_path  # store_learning 조회 대상
+
+
+def protected_fields(row):
+    """덮어쓰면 안 되는 필드 집합"""
+    corrected = row["corrected_fields"]
+    if corrected is not None:
+        return {f for f in corrected.split(",") if f}
+    # v5 이전 행은 수정 이력이 없으므로 흔적으로 추정:
+    # 가맹점 교정은 store_aliases 에 남고, 카테고리가 가맹점에서 나올 값과 다르면 손으로 고친 것
+    protected = set()
+    if row["ocr_store"] and store_learning.lookup(row["ocr_store"], row["user_id"]) == row["store"]:
+        protected.add("store")
+    if row["category"] != parser.category_map.get(row["store"], "기타"):
+        protected.add("category")
+    return protected
+
+
+def reparse_row(row, ocr):
+    """워커: 행 하나 → {필드: (이전 값, 새 값)} (바뀐 필드만)"""
+    if ocr:
+        parsed = pipeline.parse_ocr(ocr, row["user_id"])
+        new = {"store": parsed.get("가맹점"), "amount": parsed.get("총금액"), "date": parsed.get("날짜")}
+    elif row["ocr_store"]:
+        new = {"store": parser.normalize_store_name(row["ocr_store"], row["user_id"])}
+    else:
+        return {}
+    if new.get("store") == "미확인":
+        new["store"] = None
+
+    protected = protected_fields(row)
+    for field in protected:
+        new.pop(field, None)
+    store = new.get("store") or row["store"]
+    if "category" not in protected:
+        new["category"] = parser.category_map.get(store, "기타")
+
+    return {f: (row[f], v) for f, v in new.items() if v is not None and v != row[f]}
+
+
+def reocr_row(row, ocr):
+    """워커 (--reocr): 보관된 원본이 있으면 현재 OCR 파이프라인으로 다시 인식한 뒤 reparse_row
+
+    원본이 없거나(정리됨) 품질 게이트에서 거절되면 캐시 원문(ocr)으로 재파싱만 한다.
+    새 OCR 캐시 키도 변경 사항에 포함 → 이후 재파싱이 새 원문을 사용.
+    """
+    image = image_store.read_original(row["image_hash"]) if row["image_hash"] else None
+    if image is None:
+        return reparse_row(row, ocr)
+    try:
+        ocr = pipeline.run_ocr(image)
+    except pipeline.ImageRejected:
+        return reparse_row(row, ocr)
+    diff = reparse_row(row, ocr)
+    if ocr["cache_key"] and ocr["cache_key"] != row["ocr_key"]:
+        diff["ocr_key"] = (row["ocr_key"], ocr["cache_key"])
+    return diff
+
+
+def write_changes(conn, changes):
+    """[(id, {필드: (이전, 새)}, 읽을 때의 store)] → 필드 조합별 executemany (호출자가 트랜잭션 관리)
+
+    카테고리는 가맹점과 함께 판단: 가맹점 갱신이 가드에 걸려 건너뛰면 그 가맹점으로 계산한
+    카테고리도 쓰지 않는다 (UPDATE 의 SET 식은 모두 갱신 전 값을 봄).
+    """
+    groups = {}
+    for id_, diff, store in changes:
+        groups.setdefault(tuple(sorted(diff)), []).append((id_, diff, store))
+    for fields, items in groups.items():
+        sets, params_list = [], []
+        for f in fields:
+            if f == "category":
+                guard = _CATEGORY_GUARD + (_STORE_CORRECTED if "store" in fields else "")
+            else:
+                guard = _GUARD.format(f=f)
+            sets.append(f"{f} = CASE WHEN {guard} THEN {f} ELSE ? END")
+            if f == "date":
+                sets.append(f"ym = CASE WHEN {_GUARD.format(f='date')} THEN ym ELSE ? END")
+        for id_, diff, store in items:
+            params = []
+            for f in fields:
+                old, new = diff[f]
+                params += [old, store, new] if f == "category" else [old, new]
+                if f == "date":
+                    params += [old, parser.month_key(new)]
+            params_list.append(params + [id_])
+        conn.executemany(f"UPDATE transactions SET {', '.join(sets)} WHERE id=?", params_list)
+
+
+def load_checkpoint(path, db_path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return state if state.get("db") == os.path.abspath(db_path) else None
+
+
+def save_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="저장된 영수증 일괄 재파싱")
+    ap.add_argument("--db", default=db.DB_PATH)
+    ap.add_argument("--chunk", type=int, default=1000)
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    ap.add_argument("--user", help="이 사용자 행만")
+    ap.add_argument("--dry-run", action="store_true", help="바뀔 내용만 출력 (DB/체크포인트 그대로)")
+    ap.add_argument("--checkpoint", default="reparse.checkpoint.json")
+    ap.add_argument("--restart", action="store_true", help="체크포인트 무시")
+    ap.add_argument("--reocr", action="store_true", help="보관된 원본 이미지로 OCR 부터 다시 (image_store)")
+    args = ap.parse_args(argv)
+
+    db.DB_PATH = args.db
+    db.init_db(args.db)
+    conn = db.connect(args.db)
+    cache = get_cache()
+
+    state = None if args.restart or args.dry_run else load_checkpoint(args.checkpoint, args.db)
+    state = state or {"db": os.path.abspath(args.db), "last_id": 0, "scanned": 0, "changed": 0, "fields": {}}
+    if state["last_id"]:
+        print(f"↻ 체크포인트에서 이어서: id > {state['last_id']}", file=sys.stderr)
+
+    sql = SELECT_SQL.format(user_filter="AND user_id = ?" if args.user else "")
+    scanned = changed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.db,)) as pool:
+        while True:
+            params = [state["last_id"]] + ([args.user] if args.user else []) + [args.chunk]
+            cursor = conn.execute(sql, params)
+            cols = [d[0] for d in cursor.description]
+            rows = [dict(zip(cols, r)) for r in cursor.fetchall()]
+            if not rows:
+                break
+            payloads = cache.peek_many(r["ocr_key"] for r in rows) if cache else {}
+            diffs = list(pool.map(reocr_row if args.reocr else reparse_row, rows, [payloads.get(r["ocr_key"]) for r in rows],
+                                  chunksize=max(1, len(rows) // (args.workers * 4))))
+            chunk_changes = [(r["id"], d, r["store"]) for r, d in zip(rows, diffs) if d]
+
+            if args.dry_run:
+                for r, diff in zip(rows, diffs):
+                    for f, (old, new) in diff.items():
+                        print(f"#{r['id']} [{r['user_id']}] {f}: {old!r} → {new!r}")
+            else:
+                with conn:
+                    write_changes(conn, chunk_changes)
+
+            state["last_id"] = rows[-1]["id"]
+            scanned += len(rows)
+            changed += len(chunk_changes)
+            state["scanned"] += len(rows)
+            state["changed"] += len(chunk_changes)
+            for _, diff, _ in chunk_changes:
+                for f in diff:
+                    state["fields"][f] = state["fields"].get(f, 0) + 1
+            if not args.dry_run:
+                save_checkpoint(args.checkpoint, state)
+            elapsed = time.perf_counter() - start
+            print(f"… id ≤ {state['last_id']}: {scanned}행 / 변경 {changed}행 ({scanned / elapsed:,.0f} rows/s)",
+                  file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "dry_run": args.dry_run,
+        "scanned": scanned,
+        "changed": changed,
+        "fields": state["fields"],
+        "seconds": round(elapsed, 2),
+        "rows_per_sec": round(scanned / elapsed, 1) if elapsed else None,
+        "checkpoint": None if args.dry_run else state,
+    }, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
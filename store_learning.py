@@ -0,0 +1,160 @@
+"""OCR 가맹점명 교정 학습 (store_aliases 테이블)
+
+사용자가 가맹점명을 고치면 (user_id, OCR 원문) → 가맹점 한 행을 upsert 한다.
+user_id '' 는 전체 사용자 공용 별칭. 각 행은 증가하는 seq 를 가지므로
+프로세스별 메모리 캐시는 'seq > 마지막으로 본 seq' 만 다시 읽는다.
+
+    python store_learning.py import-json store_learning.json   # 기존 JSON 을 공용 별칭으로
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import threading
+
+import db  # db 도 이 모듈을 import (마이그레이션) → 모듈 수준에서 db 속성을 쓰지 말 것
+
+# ==========================
+# 설정
+# ==========================
+STORE_LEARNING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "store_learning.json")
+STORE_LEARNING_REFRESH_SEC = float(os.getenv("STORE_LEARNING_REFRESH_SEC", "2"))
+# 1: 사용자 교정을 공용 별칭에도 기록 (기존 store_learning.json 과 같은 동작), 0: 본인에게만
+STORE_LEARNING_SHARE = os.getenv("STORE_LEARNING_SHARE", "1") == "1"
+MAX_ALIAS_LEN = 100
+GLOBAL = ''
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS store_aliases (
+        user_id TEXT NOT NULL,
+        ocr_text TEXT NOT NULL,
+        store TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        updated_at TEXT DEFAULT (datetime('now')),
+        PRIMARY KEY (user_id, ocr_text)
+    ) WITHOUT ROWID
+'''
+
+# seq 는 쓰기 트랜잭션 안에서 MAX(seq)+1 (SQLite 는 쓰기가 직렬화되므로 중복 없음, 인덱스로 O(log n))
+UPSERT_SQL = '''
+    INSERT INTO store_aliases (user_id, ocr_text, store, seq, updated_at)
+    VALUES (?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM store_aliases), datetime('now'))
+    ON CONFLICT(user_id, ocr_text) DO UPDATE
+    SET store = excluded.store, seq = excluded.seq, updated_at = excluded.updated_at
+'''
+
+
+def install(conn):
+    conn.execute(CREATE_TABLE_SQL)
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_store_aliases_seq ON store_aliases(seq)')
+
+
+def import_json(conn, path=STORE_LEARNING_PATH):
+    """기존 store_learning.json → 공용 별칭 (이미 있는 키는 유지), 가져온 건수 반환"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            mapping = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return 0
+    count = 0
+    for ocr_text, store in mapping.items():
+        if not ocr_text or not store:
+            continue
+        exists = conn.execute('SELECT 1 FROM store_aliases WHERE user_id=? AND ocr_text=?',
+                              (GLOBAL, ocr_text)).fetchone()
+        if not exists:
+            conn.execute(UPSERT_SQL, (GLOBAL, ocr_text, store))
+            count += 1
+    return count
+
+
+def learn(user_id, ocr_text, store, db_path=None):
+    """교정 한 건 기록 (행 단위 upsert, 한 트랜잭션) → 기록 여부"""
+    if not ocr_text or not store or ocr_text == store or len(ocr_text) >= MAX_ALIAS_LEN:
+        return False
+    db_path = db_path or db.DB_PATH
+    scopes = [user_id] + ([GLOBAL] if STORE_LEARNING_SHARE and user_id != GLOBAL else [])
+    conn = db.connect(db_path)
+    with conn:
+        conn.executemany(UPSERT_SQL, [(scope, ocr_text, store) for scope in scopes])
+    get_cache(db_path).refresh(force=True)
+    return True
+
+
+# ==========================
+# 프로세스별 캐시 (seq 기반 증분 갱신)
+# ==========================
+class LearningCache:
+    def __init__(self, db_path, refresh_sec=STORE_LEARNING_REFRESH_SEC):
+        self.db_path = db_path
+        self.refresh_sec = refresh_sec
+        self.seq = 0
+        self._aliases = {}   # (user_id, ocr_text) → store
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force=False):
+        if not force and time.monotonic() - self._checked < self.refresh_sec:
+            return
+        with self._lock:
+            try:
+                rows = db.connect(self.db_path).execute(
+                    'SELECT user_id, ocr_text, store, seq FROM store_aliases WHERE seq > ? ORDER BY seq',
+                    (self.seq,)).fetchall()
+            except sqlite3.OperationalError:
+                rows = []  # 마이그레이션 전 (테이블 없음)
+            for user_id, ocr_text, store, seq in rows:
+                self._aliases[(user_id, ocr_text)] = store
+                self.seq = seq
+            self._checked = time.monotonic()
+
+    def lookup(self, ocr_text, user_id=None):
+        """사용자 별칭 → 공용 별칭 순, 없으면 None"""
+        self.refresh()
+        if user_id:
+            store = self._aliases.get((user_id, ocr_text))
+            if store:
+                return store
+        return self._aliases.get((GLOBAL, ocr_text))
+
+    def __len__(self):
+        return len(self._aliases)
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(db_path=None):
+    """프로세스당 DB 파일별 1개"""
+    db_path = db_path or db.DB_PATH
+    cache = _caches.get(db_path)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(db_path, LearningCache(db_path))
+    return cache
+
+
+def lookup(ocr_text, user_id=None, db_path=None):
+    return get_cache(db_path).lookup(ocr_text, user_id)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="가맹점명 교정 학습 데이터")
+    ap.add_argument("command", choices=["import-json"])
+    ap.add_argument("path", nargs="?", default=STORE_LEARNING_PATH)
+    ap.add_argument("--db", default=None)
+    args = ap.parse_args(argv)
+
+    conn = db.connect(args.db or db.DB_PATH)
+    with conn:
+        install(conn)
+        count = import_json(conn, args.path)
+    print(f"✔ 공용 별칭 {count}건 가져옴")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
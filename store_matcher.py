@@ -0,0 +1,426 @@
+"""가맹점명 매칭 엔진 (시작 시 1회 구축, 이후 조회는 인덱스만 사용)
+
+    1) 별칭(alias) 부분 문자열   — Aho–Corasick, 공백 제거 + 소문자 이름 기준
+    2) 키워드 규칙 부분 문자열    — Aho–Corasick, 원본 이름 기준
+    3) 퍼지 매칭                — 자모 분해 3-gram 역색인으로 후보를 좁힌 뒤
+                                  비트 병렬(Myers) 부분 편집 거리로 검증
+
+    python store_matcher.py bench --brands 100000   # 기존 difflib 매칭과 정확도/지연 비교
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+import threading
+from collections import deque
+
+# ==========================
+# 설정
+# ==========================
+STORE_FUZZY_MIN_SIM = float(os.getenv("STORE_FUZZY_MIN_SIM", "0.7"))  # 1 - 편집거리/브랜드 길이
+STORE_FUZZY_VERIFY = 16       # 편집 거리로 검증할 최대 후보 수 (공유 gram 수 상위)
+STORE_GRAM_MAX_POSTING = {3: 5000, 2: 500}  # 이보다 흔한 gram 은 후보 생성에서 제외 (최소 2개는 사용)
+STORE_PENDING_MAX = 256       # 핫 추가 항목이 이만큼 쌓이면 자동자를 다시 구축
+GRAM_SIZES = (3, 2)
+
+_KEY_STRIP = re.compile(r'[^가-힣a-z0-9]')
+
+
+# ==========================
+# 정규화
+# ==========================
+def jamo(text):
+    """한글 음절 → 초/중/종성 (OCR 오인식이 음절 일부만 바꾸는 경우가 많아 자모 단위로 비교)"""
+    out = []
+    for ch in text:
+        code = ord(ch) - 0xAC00
+        if 0 <= code < 11172:
+            out.append(chr(0x1100 + code // 588))
+            out.append(chr(0x1161 + (code % 588) // 28))
+            if code % 28:
+                out.append(chr(0x11A7 + code % 28))
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def fuzzy_key(name):
+    return jamo(_KEY_STRIP.sub("", name.lower()))
+
+
+def grams(key, q):
+    if len(key) <= q:
+        return {key} if key else set()
+    return {key[i:i + q] for i in range(len(key) - q + 1)}
+
+
+def substring_distance(pattern, text, max_dist):
+    """text 의 어느 부분 문자열과 pattern 의 최소 편집 거리 (Myers 비트 병렬, max_dist 초과 시 None)"""
+    m = len(pattern)
+    if m == 0:
+        return 0
+    peq = {}
+    for i, ch in enumerate(pattern):
+        peq[ch] = peq.get(ch, 0) | (1 << i)
+    mask = (1 << m) - 1
+    high = 1 << (m - 1)
+    pv, mv, score = mask, 0, m
+    best = m
+    for ch in text:
+        eq = peq.get(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & mask)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+        ph = (ph << 1) & mask
+        mh = (mh << 1) & mask
+        pv = mh | (~(xv | ph) & mask)
+        mv = ph & xv
+        if score < best:
+            best = score
+            if best == 0:
+                break
+    return best if best <= max_dist else None
+
+
+# ==========================
+# Aho–Corasick
+# ==========================
+class AhoCorasick:
+    """패턴별 우선순위(작을수록 우선)를 가진 다중 부분 문자열 검색"""
+
+    def __init__(self, patterns):
+        # patterns: [(pattern, priority, value)]
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [None]   # 이 노드에서 끝나는 (priority, value) 중 최우선
+        for pattern, priority, value in patterns:
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                nxt = self._goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(None)
+                node = nxt
+            if self._out[node] is None or priority < self._out[node][0]:
+                self._out[node] = (priority, value)
+        self._link = [0] * len(self._goto)  # 출력이 있는 가장 가까운 suffix 노드
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                fail = self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._link[nxt] = fail if self._out[fail] is not None else self._link[fail]
+
+    def search(self, text):
+        """text 안에 나타나는 패턴 중 최우선 (priority, value) 또는 None"""
+        goto, fail, out, link = self._goto, self._fail, self._out, self._link
+        best = None
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            hit = node if out[node] is not None else link[node]
+            while hit:
+                if best is None or out[hit][0] < best[0]:
+                    best = out[hit]
+                hit = link[hit]
+        return best
+
+
+class _SubstringRules:
+    """Aho–Corasick + 핫 추가 대기열 (대기열이 차면 자동자 재구축)"""
+
+    def __init__(self, patterns=()):
+        self._patterns = []
+        self._pending = []
+        self._lock = threading.Lock()
+        for pattern, value in patterns:
+            self._patterns.append((pattern, len(self._patterns), value))
+        self._automaton = AhoCorasick(self._patterns)
+
+    def add(self, pattern, value):
+        with self._lock:
+            entry = (pattern, len(self._patterns) + len(self._pending), value)
+            self._pending = self._pending + [entry]
+            if len(self._pending) >= STORE_PENDING_MAX:
+                self._patterns.extend(self._pending)
+                self._automaton = AhoCorasick(self._patterns)
+                self._pending = []
+
+    def __len__(self):
+        return len(self._patterns) + len(self._pending)
+
+    def search(self, text):
+        automaton, pending = self._automaton, self._pending
+        best = automaton.search(text)
+        for pattern, priority, value in pending:
+            if pattern in text and (best is None or priority < best[0]):
+                best = (priority, value)
+        return best[1] if best else None
+
+
+# ==========================
+# 퍼지 색인
+# ==========================
+class FuzzyIndex:
+    """자모 3-gram 으로 후보를 찾고, 없으면 2-gram 으로 한 번 더 (짧은 이름의 글자 누락 대비)"""
+
+    def __init__(self, names=()):
+        self._names = []
+        self._keys = []
+        self._gram_counts = {q: [] for q in GRAM_SIZES}
+        self._postings = {q: {} for q in GRAM_SIZES}
+        self._seen = set()
+        self._lock = threading.Lock()
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name):
+        key = fuzzy_key(name)
+        if len(key) < 2 or key in self._seen:
+            return
+        with self._lock:
+            if key in self._seen:
+                return
+            idx = len(self._names)
+            self._names.append(name)
+            self._keys.append(key)
+            for q in GRAM_SIZES:
+                gs = grams(key, q)
+                self._gram_counts[q].append(len(gs))
+                postings = self._postings[q]
+                for g in gs:
+                    postings.setdefault(g, []).append(idx)
+            self._seen.add(key)
+
+    def _candidates(self, query, q):
+        index = self._postings[q]
+        postings = sorted((index[g] for g in grams(query, q) if g in index), key=len)
+        cap = STORE_GRAM_MAX_POSTING[q]
+        selective = [p for p in postings if len(p) <= cap] or postings[:2]
+        counts = {}
+        for plist in selective:
+            for idx in plist:
+                counts[idx] = counts.get(idx, 0) + 1
+        return counts
+
+    def _verify(self, query, counts, q, min_sim):
+        gram_counts = self._gram_counts[q]
+        ranked = sorted(counts, key=lambda i: (-counts[i] / gram_counts[i], i))[:STORE_FUZZY_VERIFY]
+        best = None
+        for idx in ranked:
+            key = self._keys[idx]
+            max_dist = int(len(key) * (1 - min_sim))
+            if best is not None:
+                max_dist = min(max_dist, int(len(key) * (1 - best[0])))
+            dist = substring_distance(key, query, max_dist)
+            if dist is None:
+                continue
+            sim = 1 - dist / len(key)
+            if best is None or (sim, len(key)) > (best[0], len(self._keys[best[1]])):
+                best = (sim, idx)
+        return best
+
+    def match(self, name, min_sim=STORE_FUZZY_MIN_SIM):
+        """가장 비슷한 등록 이름 또는 None (유사도 = 1 - 부분 편집거리/등록 이름 자모 길이)"""
+        query = fuzzy_key(name)
+        if not query:
+            return None
+        for q in GRAM_SIZES:
+            counts = self._candidates(query, q)
+            best = self._verify(query, counts, q, min_sim) if counts else None
+            if best:
+                return self._names[best[1]]
+        return None
+
+
+# ==========================
+# 매칭 엔진
+# ==========================
+class StoreMatcher:
+    def __init__(self, aliases=(), keywords=(), brands=()):
+        """aliases/keywords: [(부분 문자열, 가맹점)] (앞쪽 우선), brands: 정식 이름
+
+        정식 이름 자체도 별칭으로 등록한다 (명시적 별칭 다음, 키워드 규칙보다 먼저:
+        '롯데마트' 가 '마트' 규칙에 걸려 이마트24 로 바뀌지 않도록).
+        """
+        brands = list(brands)
+        entries = [(k, v) for k, v in aliases] + [(b, b) for b in brands]
+        self._aliases = _SubstringRules((k.replace(" ", "").lower(), v) for k, v in entries)
+        self._keywords = _SubstringRules(keywords)
+        self._fuzzy = FuzzyIndex(brands)
+
+    def add_alias(self, alias, store):
+        self._aliases.add(alias.replace(" ", "").lower(), store)
+
+    def add_keyword(self, keyword, store):
+        self._keywords.add(keyword, store)
+
+    def add_brand(self, name):
+        self.add_alias(name, name)
+        self._fuzzy.add(name)
+
+    def stats(self):
+        return {"aliases": len(self._aliases), "keywords": len(self._keywords), "brands": len(self._fuzzy)}
+
+    def match(self, name):
+        """별칭 → 키워드 → 퍼지 순서로 정규화한 가맹점명, 없으면 None"""
+        name_clean = name.replace(" ", "").lower()
+        return (self._aliases.search(name_clean)
+                or self._keywords.search(name)
+                or self._fuzzy.match(name_clean))
+
+
+def load_entries(path):
+    """STORE_BRANDS_PATH 파일: 한 줄에 '정식이름' 또는 '별칭<TAB>정식이름'"""
+    aliases, brands = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "\t" in line:
+                alias, store = line.split("\t", 1)
+                aliases.append((alias.strip(), store.strip()))
+                brands.append(store.strip())
+            else:
+                brands.append(line)
+    return aliases, brands
+
+
+# ==========================
+# 벤치마크 (기존 difflib 매칭과 비교)
+# ==========================
+def _legacy_matcher(brand_map, keywords, brand_candidates):
+    """parser.normalize_store_name 의 이전 구현 (학습 사전 제외)"""
+    from difflib import get_close_matches
+
+    def match(name):
+        name_clean = name.replace(" ", "").lower()
+        for key, val in brand_map.items():
+            if key in name_clean:
+                return val
+        for keyword, val in keywords:
+            if keyword in name:
+                return val
+        hit = get_close_matches(name_clean, [b.lower() for b in brand_candidates], n=1, cutoff=0.3)
+        if hit:
+            return brand_candidates[[b.lower() for b in brand_candidates].index(hit[0])]
+        return None
+    return match
+
+
+def _random_hangul(rng, lo, hi):
+    return "".join(chr(0xAC00 + rng.randrange(11172)) for _ in range(rng.randint(lo, hi)))
+
+
+def _ocr_noise(rng, text):
+    """음절 하나의 종성/중성을 바꾸거나 글자 하나를 빼는 OCR 유사 오류"""
+    chars = list(text)
+    i = rng.randrange(len(chars))
+    code = ord(chars[i]) - 0xAC00
+    if 0 <= code < 11172 and rng.random() < 0.7:
+        if rng.random() < 0.5:
+            code = code - code % 28 + rng.randrange(28)
+        else:
+            code = code - ((code % 588) // 28) * 28 + rng.randrange(21) * 28
+        chars[i] = chr(0xAC00 + code)
+    elif len(chars) > 2:
+        del chars[i]
+    return "".join(chars)
+
+
+def make_queries(rng, brands, count):
+    """(질의, 기대 결과) — 지점명 접미사, OCR 오류, 공백, 무관한 문자열(기대 None)"""
+    suffixes = ["", " 강남점", "역삼점", " 본점", "(주)", " 2호점"]
+    queries = []
+    for _ in range(count):
+        if rng.random() < 0.15:
+            queries.append((_random_hangul(rng, 3, 8), None))
+            continue
+        brand = rng.choice(brands)
+        text = brand
+        if rng.random() < 0.5 and len(brand) >= 3:
+            text = _ocr_noise(rng, text)
+        queries.append((text + rng.choice(suffixes), brand))
+    return queries
+
+
+def _accuracy(fn, queries):
+    return sum(1 for q, expected in queries if fn(q) == expected) / len(queries)
+
+
+def _latency(fn, queries):
+    times = []
+    for q, _ in queries:
+        start = time.perf_counter()
+        fn(q)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {"p50_ms": round(times[len(times) // 2], 4), "p99_ms": round(times[int(len(times) * 0.99)], 4)}
+
+
+def bench(brands_total, queries_count, legacy_queries, seed):
+    import parser as receipt_parser
+
+    rng = random.Random(seed)
+    base = list(receipt_parser.brand_candidates)
+    keywords = receipt_parser.store_keywords
+    brand_map = receipt_parser.brand_map
+
+    print(f"== 정확도 (기본 브랜드 {len(base)}개, 질의 {queries_count}개)")
+    queries = make_queries(rng, base, queries_count)
+    legacy = _legacy_matcher(brand_map, keywords, base)
+    new = StoreMatcher(brand_map.items(), keywords, base).match
+    print(f"  legacy difflib : {_accuracy(legacy, queries):.3f}")
+    print(f"  store_matcher  : {_accuracy(new, queries):.3f}")
+
+    extra = [_random_hangul(rng, 2, 6) for _ in range(max(0, brands_total - len(base)))]
+    all_brands = base + extra
+    print(f"== 규모 (브랜드 {len(all_brands)}개)")
+    start = time.perf_counter()
+    matcher = StoreMatcher(brand_map.items(), keywords, all_brands)
+    print(f"  build          : {time.perf_counter() - start:.2f}s")
+    queries = make_queries(rng, all_brands, queries_count)
+    print(f"  store_matcher  : acc={_accuracy(matcher.match, queries):.3f} {_latency(matcher.match, queries)}")
+    if not legacy_queries:
+        return
+    legacy = _legacy_matcher(brand_map, keywords, all_brands)
+    sample = queries[:legacy_queries]
+    print(f"  legacy difflib : acc={_accuracy(legacy, sample):.3f} {_latency(legacy, sample)} (질의 {len(sample)}개)")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="가맹점명 매칭 엔진")
+    ap.add_argument("command", choices=["bench"])
+    ap.add_argument("--brands", type=int, default=100000)
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--legacy-queries", type=int, default=100, help="규모 테스트에서 difflib 로 돌릴 질의 수")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args(argv)
+    bench(args.brands, args.queries, args.legacy_queries, args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
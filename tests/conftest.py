@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# db/app 은 import 시점에 환경변수를 읽으므로 그 전에 임시 경로로 (저장소의 user_data.db 를 건드리지 않게)
+_TMP = tempfile.mkdtemp(prefix="receipt-ocr-tests-")
+os.environ.setdefault("DB_PATH", os.path.join(_TMP, "app.db"))
+os.environ.setdefault("IMAGE_STORE_DIR", os.path.join(_TMP, "image_store"))
+os.environ.setdefault("OCR_CACHE_PATH", os.path.join(_TMP, "ocr_cache.db"))
+os.environ.setdefault("OCR_ASYNC", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    import db
+    path = str(tmp_path / "test.db")
+    db.init_db(path)
+    return path
+
+
+@pytest.fixture
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def login(app_module):
+    """login(user_id) → 그 사용자로 로그인된 테스트 클라이언트 (app DB 를 공유하므로 테스트마다 다른 id 권장)"""
+    import user_store
+
+    def make(user_id):
+        user_store.get_store().save(user_id, "tester", f"{user_id}@example.com")
+        client = app_module.app.test_client()
+        with client.session_transaction() as session:
+            session["_user_id"] = user_id
+            session["_fresh"] = True
+        return client
+    return make
+
+
+@pytest.fixture
+def client(login):
+    """user 'u1' 로 로그인된 테스트 클라이언트"""
+    return login("u1")
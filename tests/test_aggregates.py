@@ -0,0 +1,67 @@
+import random
+import sqlite3
+from contextlib import closing
+
+import aggregates
+import db
+
+
+def _insert(db_path, user_id, amount, date, category):
+    return db.insert_transaction((user_id, "가게", amount, date, category, "가게", date and date[:7], None, None),
+                                 db_path)
+
+
+def test_triggers_track_every_write_path(db_path):
+    rng = random.Random(4)
+    ids = []
+    for _ in range(200):
+        op = rng.random()
+        if op < 0.4 or not ids:
+            date = rng.choice(["2024-01-05", "2024-02-11", None])
+            ids.append(_insert(db_path, rng.choice(["u1", "u2"]), rng.choice([1000, 2500, None]), date,
+                               rng.choice(["카페", "마트", None])))
+            continue
+        user_id, id_ = db.connect(db_path).execute(
+            'SELECT user_id, id FROM transactions WHERE id=?', (rng.choice(ids),)).fetchone() or (None, None)
+        if id_ is None:
+            continue
+        if op < 0.55:
+            db.update_transaction_field(user_id, id_, "amount", rng.choice([500, 7000]), db_path)
+        elif op < 0.65:
+            db.update_transaction_field(user_id, id_, "category", rng.choice(["카페", "편의점"]), db_path)
+        elif op < 0.75:
+            db.update_transaction_field(user_id, id_, "date", rng.choice(["2024-03-01", "2023-12-31"]), db_path)
+        elif op < 0.85:
+            db.soft_delete_transaction(user_id, id_, db_path)
+        elif op < 0.93:
+            db.restore_transaction(user_id, id_, db_path)
+        else:
+            db.hard_delete_transaction(user_id, id_, db_path)
+    assert aggregates.check(db.connect(db_path)) == []
+
+
+def test_batch_insert_and_totals(db_path):
+    db.insert_transactions([
+        ("u1", "a", 1000, "2024-01-01", "카페", "a", "2024-01", None, None),
+        ("u1", "b", 2000, "2024-01-02", "카페", "b", "2024-01", None, None),
+        ("u1", "c", None, None, None, "c", None, None, None),
+    ], db_path)
+    assert db.month_category_totals("u1", db_path) == [("", "", 0, 1), ("2024-01", "카페", 3000, 2)]
+
+
+def test_check_and_rebuild_cli(db_path):
+    _insert(db_path, "u1", 1000, "2024-01-05", "카페")
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute('UPDATE user_month_category SET total = 1')
+    assert aggregates.main(["check", "--db", db_path]) == 1
+    assert aggregates.main(["rebuild", "--db", db_path]) == 0
+    assert aggregates.main(["check", "--db", db_path]) == 0
+
+
+def test_cli_defaults_to_app_db(db_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", db_path)
+    _insert(db_path, "u1", 1000, "2024-01-05", "카페")
+    with closing(sqlite3.connect(db_path)) as conn, conn:
+        conn.execute('UPDATE user_month_category SET total = 1')
+    assert aggregates.main(["check"]) == 1
+    assert aggregates.main(["rebuild"]) == 0
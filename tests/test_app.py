@@ -0,0 +1,44 @@
+import sqlite3
+
+import db
+
+
+def test_user_info_logged_in(client):
+    assert client.get('/user-info').get_json()["logged_in"] is True
+
+
+def test_locked_database_maps_to_503(client, monkeypatch):
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(db, "month_category_totals", locked)
+    resp = client.get('/api/stats')
+    assert resp.status_code == 503
+    assert resp.headers["X-Error-Code"] == "db_locked"
+    assert resp.headers["Retry-After"] == "1"
+    assert resp.get_json()["code"] == "db_locked"
+
+
+def test_other_operational_errors_stay_500(client, monkeypatch):
+    def broken(*args, **kwargs):
+        raise sqlite3.OperationalError("no such table: user_month_category")
+
+    monkeypatch.setattr(db, "month_category_totals", broken)
+    resp = client.get('/api/stats')
+    assert resp.status_code == 500
+    assert "X-Error-Code" not in resp.headers
+
+
+def test_job_wait_is_capped(client, app_module, monkeypatch):
+    waits = []
+
+    def wait(job_id, user_id, timeout):
+        waits.append(timeout)
+        return {"id": job_id, "state": "running"}
+
+    monkeypatch.setattr(app_module.job_queue, "wait", wait)
+    monkeypatch.setattr(app_module.job_queue, "get", lambda job_id, user_id: {"id": job_id, "state": "queued"})
+    assert client.get('/ocr/jobs/j1?wait=20').get_json()["state"] == "running"
+    assert waits == [app_module.JOB_WAIT_MAX] and app_module.JOB_WAIT_MAX <= 2
+    assert client.get('/ocr/jobs/j1').get_json()["state"] == "queued"  # 기본은 대기 없이 바로
+    assert waits == [app_module.JOB_WAIT_MAX]
@@ -0,0 +1,62 @@
+import io
+import shutil
+
+import pytest
+from PIL import Image
+
+import benchmark
+import pipeline
+
+
+class BlankEngine:
+    """tesseract 없이 파이프라인을 끝까지 돌리기 위한 엔진 (아무것도 읽지 못함)"""
+    name = "blank"
+
+    def image_to_string(self, image, **kwargs):
+        return ""
+
+    def image_to_data(self, image, **kwargs):
+        return ""
+
+
+@pytest.fixture
+def samples():
+    return benchmark.make_corpus(4, seed=1, font_path=benchmark.find_font())
+
+
+def _blank_jpeg():
+    buf = io.BytesIO()
+    Image.new("RGB", (640, 900), 255).save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+def test_run_one_over_samples(monkeypatch, samples):
+    monkeypatch.setattr(pipeline, "get_engine", lambda: BlankEngine())
+    results = [benchmark.run_one(sample) for sample in samples]
+    for r in results:
+        assert r["stages"]["total"] >= r["stages"]["parse"] >= 0
+        assert set(r["correct"]) == set(benchmark.FIELDS)
+        assert r["tier"] in ("targeted", "rejected")
+    summary = benchmark.summarize(results, wall=1.0, workers=1)
+    assert summary["images"] == 4 and sum(summary["tiers"].values()) == 4
+    assert summary["accuracy"]["가맹점"] == 0
+
+
+def test_run_one_records_rejected_image(monkeypatch, samples):
+    monkeypatch.setattr(pipeline, "get_engine", lambda: BlankEngine())
+    result = benchmark.run_one((_blank_jpeg(), samples[0][1]))
+    assert result["tier"] == "rejected" and result["rejected"]
+    assert not any(result["correct"].values())
+
+    summary = benchmark.summarize([result, benchmark.run_one(samples[0])], wall=1.0, workers=1)
+    assert sum(summary["rejected"].values()) >= 1
+    assert benchmark.compare(summary, {**summary, "rejected": {}}, 0.15) == [
+        f"rejected images 0 → {sum(summary['rejected'].values())}"]
+
+
+@pytest.mark.skipif(not shutil.which("tesseract") or not benchmark.find_font(),
+                    reason="tesseract 바이너리/한글 폰트 필요")
+def test_run_one_reads_samples_with_tesseract(samples):
+    results = [benchmark.run_one(sample) for sample in samples]
+    summary = benchmark.summarize(results, wall=1.0, workers=1)
+    assert summary["accuracy"]["총금액"] > 0
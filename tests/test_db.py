@@ -0,0 +1,61 @@
+import sqlite3
+
+import db
+
+
+def _row(user_id="u1", store="스타벅스", amount=4500, date="2024-03-01"):
+    return (user_id, store, amount, date, "카페", store, "2024-03", None, None)
+
+
+def test_group_commit_shares_one_transaction(db_path):
+    writer = db.GroupCommitWriter(db_path, max_batch=2, wait_ms=2000)
+    seen = []
+
+    def first(conn):
+        return conn.execute(db.INSERT_TRANSACTION_SQL, _row(amount=1)).lastrowid
+
+    def second(conn):
+        # 앞 작업의 INSERT 가 아직 커밋되지 않았어야 함 (다른 연결에서 안 보임)
+        other = sqlite3.connect(db_path)
+        seen.append(other.execute('SELECT COUNT(*) FROM transactions').fetchone()[0])
+        other.close()
+        seen.append(conn.in_transaction)
+        return conn.execute(db.INSERT_TRANSACTION_SQL, _row(amount=2)).lastrowid
+
+    futures = [writer.submit(first), writer.submit(second)]
+    ids = [f.result(timeout=10) for f in futures]
+
+    assert seen == [0, True]
+    assert len(set(ids)) == 2
+    assert db.connect(db_path).execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 2
+
+
+def test_group_commit_failed_item_rolls_back_alone(db_path):
+    writer = db.GroupCommitWriter(db_path, max_batch=3, wait_ms=2000)
+
+    def insert(amount):
+        return lambda conn: conn.execute(db.INSERT_TRANSACTION_SQL, _row(amount=amount)).lastrowid
+
+    def broken(conn):
+        conn.execute(db.INSERT_TRANSACTION_SQL, _row(amount=99))
+        raise ValueError("boom")
+
+    futures = [writer.submit(insert(1)), writer.submit(broken), writer.submit(insert(3))]
+    assert futures[0].result(timeout=10)
+    assert isinstance(futures[1].exception(timeout=10), ValueError)
+    assert futures[2].result(timeout=10)
+    amounts = [r[0] for r in db.connect(db_path).execute('SELECT amount FROM transactions ORDER BY id')]
+    assert amounts == [1, 3]
+
+
+def test_list_transactions_keyset_and_soft_delete(db_path):
+    db.insert_transactions([_row(amount=i) for i in range(5)], db_path)
+    rows = db.list_transactions("u1", ("id", "amount"), limit=2, db_path=db_path)
+    assert [r[1] for r in rows] == [4, 3]
+    rest = db.list_transactions("u1", ("id", "amount"), after_id=rows[-1][0], db_path=db_path)
+    assert [r[1] for r in rest] == [2, 1, 0]
+
+    db.soft_delete_transaction("u1", rows[0][0], db_path)
+    assert not db.find_transaction("u1", rows[0][0], deleted=False, db_path=db_path)
+    db.restore_transaction("u1", rows[0][0], db_path)
+    assert db.find_transaction("u1", rows[0][0], deleted=False, db_path=db_path)
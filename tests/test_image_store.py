@@ -0,0 +1,110 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import db
+import image_store
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_store, "IMAGE_STORE_DIR", str(tmp_path / "images"))
+    monkeypatch.setattr(image_store, "IMAGE_STORE_ENABLED", True)
+    return tmp_path / "images"
+
+
+def _jpeg(shade, size=(200, 300)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, (shade, shade, shade)).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _save_txn(db_path, digest, user_id="u1"):
+    row = (user_id, "스타벅스", 4500, "2024-03-01", "카페", "스타벅스", "2024-03", None, digest)
+    db.insert_transactions([row], db_path)
+    return db.connect(db_path).execute('SELECT MAX(id) FROM transactions').fetchone()[0]
+
+
+def _files(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root) for d, _, fs in os.walk(root) for f in fs)
+
+
+def _refs(db_path, digest):
+    row = db.connect(db_path).execute('SELECT refs FROM images WHERE hash=?', (digest,)).fetchone()
+    return row[0] if row else None
+
+
+def test_hard_delete_removes_image_after_last_reference(db_path, store):
+    image = _jpeg(120)
+    digest = image_store.put(image, db_path)
+    first = _save_txn(db_path, digest)
+    assert image_store.put(image, db_path) == digest  # 같은 이미지 재업로드 → 참조만 추가
+    second = _save_txn(db_path, digest, user_id="u2")
+    assert _refs(db_path, digest) == 2
+    assert len(_files(store)) == 2  # 원본 + 축소본
+
+    db.hard_delete_transaction("u1", first, db_path)
+    assert _refs(db_path, digest) == 1
+    assert image_store.locate(digest, "original", db_path)
+
+    db.hard_delete_transaction("u2", second, db_path)
+    assert _refs(db_path, digest) is None
+    assert _files(store) == []
+
+
+def test_soft_delete_keeps_image(db_path, store):
+    digest = image_store.put(_jpeg(80), db_path)
+    tid = _save_txn(db_path, digest)
+    db.soft_delete_transaction("u1", tid, db_path)
+    assert image_store.locate(digest, "thumb", db_path)
+
+
+def test_eviction_unlinks_under_lock_and_put_restores(db_path, store, monkeypatch):
+    images = [_jpeg(shade, (400, 600)) for shade in (10, 60, 110)]
+    limit = sum(len(i) for i in images[1:])
+    monkeypatch.setattr(image_store, "IMAGE_STORE_MAX_BYTES", limit)
+    digests = [image_store.put(i, db_path) for i in images[:2]]
+    db.connect(db_path).execute('UPDATE images SET last_access = 0 WHERE hash=?', (digests[0],))
+    db.connect(db_path).commit()
+    image_store.put(images[2], db_path)
+    assert image_store.locate(digests[0], "original", db_path) is None  # 가장 오래 안 본 원본 정리
+    assert image_store.locate(digests[0], "thumb", db_path)  # 축소본은 남음
+    assert image_store.stats(db_path)["original_bytes"] <= limit
+
+    image_store.put(images[0], db_path)  # 같은 해시 다시 올리면 원본 복구
+    assert image_store.locate(digests[0], "original", db_path)
+
+
+def test_gc_recounts_and_drops_old_orphans(db_path, store):
+    kept = image_store.put(_jpeg(30), db_path)
+    _save_txn(db_path, kept)
+    orphan = image_store.put(_jpeg(200), db_path)  # 거래 저장 실패로 참조만 예약된 이미지
+    assert image_store.gc(db_path, grace_sec=3600) == 0  # 유예 시간 안
+    assert image_store.gc(db_path, grace_sec=0) == 1
+    assert _refs(db_path, orphan) is None
+    assert _refs(db_path, kept) == 1
+    assert len(_files(store)) == 2
+
+
+def test_put_writes_files_outside_the_write_lock(db_path, store, monkeypatch):
+    in_txn = []
+    write_temp = image_store._write_temp
+
+    def recording(path, data):
+        in_txn.append(db.connect(db_path).in_transaction)
+        return write_temp(path, data)
+
+    monkeypatch.setattr(image_store, "_write_temp", recording)
+    image = _jpeg(150)
+    digest = image_store.put(image, db_path)
+    assert in_txn == [False, False]  # 원본 + 축소본
+
+    db.connect(db_path).execute('UPDATE images SET original_bytes = 0 WHERE hash=?', (digest,))
+    db.connect(db_path).commit()
+    os.unlink(image_store._path("originals", digest, "jpg"))  # 정리된 원본
+    assert image_store.put(image, db_path) == digest  # 원본만 복구, 축소본은 그대로
+    assert in_txn == [False, False, False]
+    assert not [f for f in _files(store) if f.endswith(".tmp")]
+    assert len(_files(store)) == 2
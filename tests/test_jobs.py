@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+import db
+import jobs
+
+
+@pytest.fixture
+def queue(db_path):
+    jobs.init_jobs_table(db_path)
+    q = jobs.JobQueue(db_path, workers=1, max_queue=3)
+    q._started = True  # 디스패처/프로세스 풀 없이 큐 API 만 사용
+    return q
+
+
+def _set(db_path, job_id, status, age_sec):
+    conn = db.connect(db_path)
+    with conn:
+        conn.execute("UPDATE ocr_jobs SET status=?, updated_at=datetime('now', ?) WHERE id=?",
+                     (status, f'-{age_sec} seconds', job_id))
+
+
+def test_concurrent_submit_respects_max_queue(queue):
+    accepted, rejected = [], []
+    barrier = threading.Barrier(12)
+
+    def submit():
+        barrier.wait()
+        try:
+            accepted.append(queue.submit("u1", b"img"))
+        except jobs.QueueFull:
+            rejected.append(1)
+
+    threads = [threading.Thread(target=submit) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(accepted) == 3
+    assert len(rejected) == 9
+    assert queue.depth() == 3
+
+
+def test_claim_is_fifo_and_exclusive(queue):
+    first, second = queue.submit("u1", b"a"), queue.submit("u1", b"b")
+    assert queue._claim() == first
+    assert queue._claim() == second
+    assert queue._claim() is None
+    assert queue.get(first, "u1")["state"] == "running"
+    assert queue.get(first, "someone-else") is None
+
+
+def test_stale_running_jobs_are_requeued(queue, db_path):
+    job_id = queue.submit("u1", b"a")
+    assert queue._claim() == job_id
+    _set(db_path, job_id, 'running', jobs.OCR_JOB_STALE_SEC + 60)
+    queue._requeue_stale()
+    assert queue.get(job_id, "u1")["state"] == "queued"
+    assert queue._claim() == job_id
+
+
+def test_finished_jobs_are_purged_after_ttl(queue, db_path):
+    old_done, old_failed, recent = (queue.submit("u1", b"x") for _ in range(3))
+    _set(db_path, old_done, 'done', jobs.OCR_JOB_TTL_SEC + 60)
+    _set(db_path, old_failed, 'failed', jobs.OCR_JOB_TTL_SEC + 60)
+    _set(db_path, recent, 'done', 10)
+    queued = queue.submit("u1", b"y")
+    assert queue._purge_finished() == 2
+    assert queue.get(old_done, "u1") is None
+    assert queue.get(old_failed, "u1") is None
+    assert queue.get(recent, "u1")["state"] == "done"
+    assert queue.get(queued, "u1")["state"] == "queued"
@@ -0,0 +1,42 @@
+import types
+
+import loadtest
+
+
+def _resp(status, headers=None):
+    return types.SimpleNamespace(status_code=status, headers=headers or {})
+
+
+def test_is_locked_uses_error_code_header():
+    assert loadtest._is_locked(_resp(503, {"X-Error-Code": "db_locked"}))
+    assert not loadtest._is_locked(_resp(503))
+    assert not loadtest._is_locked(_resp(500, {"X-Error-Code": "db_locked"}))
+
+
+def test_summarize_counts_errors_and_locks():
+    results = [
+        ("GET /api/stats", 200, 0.010, False),
+        ("GET /api/stats", 503, 0.020, True),
+        ("POST /ocr (enqueue)", 429, 0.005, False),
+        ("OCR job end-to-end", "failed", 1.0, False),
+        ("OCR job end-to-end", 200, 0.8, False),
+    ]
+    report = loadtest.summarize(results, 1.0)
+    assert report["requests"] == 5
+    assert report["routes"]["GET /api/stats"]["locked"] == 1
+    assert report["routes"]["OCR job end-to-end"]["errors"] == 1
+    assert report["lock_rate"] == 0.2
+    assert report["throttled_429"] == 1
+
+
+def test_compare_flags_p95_regression():
+    base = loadtest.summarize([("GET /api/stats", 200, 0.010, False)] * 20, 1.0)
+    slow = loadtest.summarize([("GET /api/stats", 200, 0.050, False)] * 20, 1.0)
+    assert loadtest.compare(base, base, 0.2) == []
+    assert any("p95" in r for r in loadtest.compare(slow, base, 0.2))
+
+
+def test_seed_inserts_rows(db_path):
+    import db
+    loadtest.seed(db_path, users=10, rows=500, batch=200)
+    assert db.connect(db_path).execute('SELECT COUNT(*) FROM transactions').fetchone()[0] == 500
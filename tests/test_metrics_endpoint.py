@@ -0,0 +1,34 @@
+def test_metrics_localhost_only_without_token(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", None)
+    client = app_module.app.test_client()
+    assert client.get('/metrics', environ_base={"REMOTE_ADDR": "127.0.0.1"}).status_code == 200
+    assert client.get('/metrics', environ_base={"REMOTE_ADDR": "203.0.113.7"}).status_code == 403
+
+
+def test_metrics_token_required_when_configured(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "s3cret")
+    client = app_module.app.test_client()
+    remote = {"REMOTE_ADDR": "203.0.113.7"}
+    assert client.get('/metrics', environ_base=remote).status_code == 401
+    assert client.get('/metrics', environ_base=remote, headers={"Authorization": "Bearer nope"}).status_code == 401
+    resp = client.get('/metrics', environ_base=remote, headers={"Authorization": "Bearer s3cret"})
+    assert resp.status_code == 200
+    assert "http_request_duration_seconds" in resp.get_data(as_text=True)
+
+
+def test_metrics_reads_cache_stats_once_per_scrape(app_module, monkeypatch):
+    calls = []
+
+    class FakeCache:
+        def stats(self):
+            calls.append(1)
+            return {"hits": 3, "misses": 1, "hit_rate": 0.75}
+
+    monkeypatch.setattr(app_module, "get_cache", lambda: FakeCache())
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", None)
+    client = app_module.app.test_client()
+    body = client.get('/metrics', environ_base={"REMOTE_ADDR": "127.0.0.1"}).get_data(as_text=True)
+    assert "ocr_cache_hits 3" in body and "ocr_cache_hit_ratio 0.75" in body
+    assert len(calls) == 1
+    client.get('/metrics', environ_base={"REMOTE_ADDR": "127.0.0.1"})
+    assert len(calls) == 2
@@ -0,0 +1,79 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+import db
+import pipeline
+
+
+def _png(shade):
+    buf = io.BytesIO()
+    Image.new("L", (64, 64), shade).save(buf, "PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def fake_recognize(app_module, monkeypatch):
+    """OCR 없이 바로 결과를 돌려주는 배치 워커 (스레드 풀)"""
+    pool = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+
+    def recognize(data, user_id=None):
+        if data[-20:] != _png(0)[-20:]:
+            release.wait(5)  # 첫 장만 바로 끝나고 나머지는 대기
+        return {"receipt": {"가맹점": "스타벅스", "총금액": 4500, "날짜": "2024-03-01", "카테고리": "카페"},
+                "raw_text": "", "roi_brand": "스타벅스", "ocr_key": None, "image_hash": None, "timings": {}}
+
+    monkeypatch.setattr(pipeline, "recognize_receipt", recognize)
+    monkeypatch.setattr(app_module.job_queue, "executor", lambda: pool)
+    yield release
+    release.set()
+    pool.shutdown(wait=True)
+
+
+def _count(user_id="u1"):
+    return db.connect(db.DB_PATH).execute(
+        'SELECT COUNT(*) FROM transactions WHERE user_id=?', (user_id,)).fetchone()[0]
+
+
+def test_batch_saves_already_recognized_receipts_on_disconnect(client, fake_recognize):
+    before = _count()
+    files = [(io.BytesIO(_png(shade)), f"r{shade}.png") for shade in (0, 10, 20)]
+    resp = client.post('/ocr/batch', data={"images": files}, buffered=False,
+                       content_type="multipart/form-data")
+    first = next(resp.response)
+    assert b'"success"' in first
+    resp.close()  # 클라이언트 끊김 → 제너레이터 close
+    fake_recognize.set()
+    assert _count() == before + 1
+
+
+def test_batch_saves_everything_when_completed(client, fake_recognize):
+    fake_recognize.set()
+    before = _count()
+    files = [(io.BytesIO(_png(shade)), f"r{shade}.png") for shade in (0, 10, 20)]
+    resp = client.post('/ocr/batch', data={"images": files}, content_type="multipart/form-data")
+    lines = resp.get_data(as_text=True).strip().splitlines()
+    assert lines[-1] == '{"status": "done", "inserted": 3, "failed": 0}'
+    assert _count() == before + 3
+
+
+def test_batch_submits_only_a_window_of_images(app_module, client, fake_recognize, monkeypatch):
+    monkeypatch.setattr(app_module, "OCR_BATCH_WINDOW", 2)
+    submitted = []
+    pool = app_module.job_queue.executor()
+    submit = pool.submit
+    monkeypatch.setattr(pool, "submit", lambda fn, *args: submitted.append(args) or submit(fn, *args))
+    files = [(io.BytesIO(_png(shade)), f"r{shade}.png") for shade in (0, 10, 20, 30)]
+    resp = client.post('/ocr/batch', data={"images": files}, buffered=False,
+                       content_type="multipart/form-data")
+    next(resp.response)  # 첫 장 완료 — 나머지는 창(2장)이 빌 때까지 읽지도 않음
+    assert len(submitted) == 2
+    fake_recognize.set()
+    lines = b"".join(resp.response).decode().strip().splitlines()
+    assert lines[-1] == '{"status": "done", "inserted": 4, "failed": 0}'
+    assert len(submitted) == 4
+    resp.close()
@@ -0,0 +1,97 @@
+import sqlite3
+import threading
+
+import pytest
+
+import ocr_cache
+
+
+def _db_stats(path):
+    conn = sqlite3.connect(path)
+    try:
+        return dict(conn.execute('SELECT name, value FROM cache_stats').fetchall())
+    finally:
+        conn.close()
+
+
+def _sum_size(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('SELECT COALESCE(SUM(size), 0), COUNT(*) FROM ocr_cache').fetchone()
+    finally:
+        conn.close()
+
+
+def test_running_total_matches_table(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ocr_cache.OcrCache(path, max_bytes=10_000)
+    for i in range(50):
+        cache.put(f"k{i}", {"raw_text": "x" * (100 + i)})
+    cache.put("k3", {"raw_text": "short"})  # 같은 키 재저장 → 크기 변화만 반영
+    size, entries = _sum_size(path)
+    stats = cache.stats()
+    assert stats["bytes"] == size <= 10_000
+    assert stats["entries"] == entries
+    assert stats["evictions"] == 50 - entries
+
+
+def test_hits_do_not_write_until_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_cache, "STATS_FLUSH_EVERY", 1000)
+    monkeypatch.setattr(ocr_cache, "STATS_FLUSH_SEC", 3600)
+    path = str(tmp_path / "cache.db")
+    cache = ocr_cache.OcrCache(path)
+    cache.put("k", {"raw_text": "hello"})
+    for _ in range(10):
+        assert cache.get("k") == {"raw_text": "hello"}
+    assert cache.get("missing") is None
+    assert _db_stats(path)["hits"] == 0  # 아직 기록 안 함
+
+    stats = cache.stats()  # stats() 는 먼저 flush
+    assert (stats["hits"], stats["misses"]) == (10, 1)
+    assert _db_stats(path)["hits"] == 10
+
+
+def test_existing_cache_file_gets_initial_totals(tmp_path):
+    path = str(tmp_path / "cache.db")
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE ocr_cache (key TEXT PRIMARY KEY, payload TEXT, size INTEGER, '
+                 'created_at REAL, last_access REAL)')
+    conn.execute("INSERT INTO ocr_cache VALUES ('old', '{}', 123, 0, 0)")
+    conn.commit()
+    conn.close()
+    stats = ocr_cache.OcrCache(path).stats()
+    assert (stats["bytes"], stats["entries"]) == (123, 1)
+
+
+def test_connection_reused_per_thread(tmp_path):
+    cache = ocr_cache.OcrCache(str(tmp_path / "cache.db"))
+    conn = cache._connect()
+    cache.put("k", {"raw_text": "hello"})
+    assert cache.get("k") == {"raw_text": "hello"}
+    assert cache._connect() is conn
+    other = []
+    thread = threading.Thread(target=lambda: other.append(cache._connect()))
+    thread.start()
+    thread.join()
+    assert other[0] is not conn
+
+
+def test_failed_put_keeps_pending_stats(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_cache, "STATS_FLUSH_EVERY", 1000)
+    monkeypatch.setattr(ocr_cache, "STATS_FLUSH_SEC", 3600)
+    path = str(tmp_path / "cache.db")
+    cache = ocr_cache.OcrCache(path)
+    cache.put("k", {"raw_text": "hello"})
+    for _ in range(3):
+        cache.get("k")
+    cache.get("missing")
+
+    def fail(conn):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(cache, "_evict", fail)
+    with pytest.raises(sqlite3.OperationalError):
+        cache.put("k2", {"raw_text": "x"})
+    assert _db_stats(path)["hits"] == 0  # 롤백
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (3, 1, 1)
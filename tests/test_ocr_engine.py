@@ -0,0 +1,61 @@
+import threading
+
+import pytest
+
+import ocr_engine
+
+
+class FakeHandle:
+    def __init__(self):
+        self.ended = False
+
+    def End(self):
+        self.ended = True
+
+
+def test_handle_pool_reuses_and_caps_handles():
+    created = []
+    pool = ocr_engine._HandlePool(lambda: created.append(FakeHandle()) or created[-1], 2)
+    a, b = pool.acquire(), pool.acquire()
+    assert a is not b and len(created) == 2
+
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire()))
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()  # 상한에 닿으면 새로 만들지 않고 반납을 기다림
+    pool.release(a)
+    waiter.join(1)
+    assert got == [a] and len(created) == 2
+
+    pool.release(b)
+    pool.close()
+    assert b.ended
+
+
+def test_handle_pool_factory_failure_frees_slot():
+    calls = []
+
+    def factory():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("init failed")
+        return FakeHandle()
+
+    pool = ocr_engine._HandlePool(factory, 1)
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    assert isinstance(pool.acquire(), FakeHandle)
+
+
+def test_auto_falls_back_to_pytesseract(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "tesserocr", None)
+    assert ocr_engine._create_engine("auto").name == "pytesseract"
+    with pytest.raises(RuntimeError):
+        ocr_engine._create_engine("tesserocr")
+
+
+def test_pytesseract_config():
+    engine = ocr_engine.PytesseractEngine()
+    assert engine._config(6, None, None) == "--psm 6"
+    assert engine._config(7, "0123", 3) == '--oem 3 --psm 7 -c tessedit_char_whitelist="0123"'
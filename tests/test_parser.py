@@ -0,0 +1,83 @@
+import pytest
+
+import parser
+from layout import parse_tsv, group_lines, top_brand_text, bottom_amount
+
+
+@pytest.fixture(autouse=True)
+def no_learned_aliases(monkeypatch):
+    monkeypatch.setattr(parser.store_learning, "lookup", lambda name, user_id=None: None)
+
+
+# (OCR 라인, roi_brand) → (가맹점, 총금액, 날짜, 카테고리)
+GOLDEN = [
+    (["STARBUCKS 강남점", "2024-03-05 12:30", "아메리카노 4,500", "합계 4,500"], None,
+     ("스타벅스", 4500, "2024-03-05 12:30", "카페")),
+    (["가맹점: 이디야 역삼점", "2024.01.09", "총금액 12,000원"], None,
+     ("이디야", 12000, "2024-01-09", "카페")),
+    (["GS25 선릉점", "123-45-67890", "2023/12/31", "결제금액 3,200", "합계 3,300"], None,
+     ("GS25", 3200, "2023-12-31", "편의점")),
+    (["영수증", "2024-02-01", "합계 8,000"], "emart",
+     ("이마트24", 8000, "2024-02-01", "기타")),
+    # 가맹점 키워드/ROI 없으면 전체 라인을 이어 붙인 텍스트 (미등록 가게는 그대로)
+    (["알수없는가게", "합 계 15,000"], None,
+     ("알수없는가게합계15000", 15000, None, "기타")),
+]
+
+
+@pytest.mark.parametrize("lines,roi_brand,expected", GOLDEN)
+def test_golden_receipts(lines, roi_brand, expected):
+    parsed, _ = parser.parse_receipt_text(lines, roi_brand)
+    assert (parsed["가맹점"], parsed["총금액"], parsed["날짜"], parsed["카테고리"]) == expected
+
+
+def test_low_confidence_lines_are_skipped():
+    boxes = [
+        {"text": "xx## 99,999", "conf": 10, "box": (0, 0, 10, 10), "words": []},
+        {"text": "STARBUCKS", "conf": 90, "box": (0, 20, 10, 30), "words": []},
+        {"text": "합계 4,500", "conf": 90, "box": (0, 40, 10, 50), "words": []},
+    ]
+    parsed, lines = parser.parse_receipt_text([], None, boxes)
+    assert lines == [b["text"] for b in boxes]
+    assert parsed["가맹점"] == "스타벅스"
+    assert parsed["총금액"] == 4500
+
+
+def test_month_key():
+    assert parser.month_key("2024-03-05") == "2024-03"
+    assert parser.month_key("2024년 3월 5일") == "2024-03"
+    assert parser.month_key("2024-13-01") is None
+    assert parser.month_key(None) is None
+
+
+def _tsv_row(line, word, left, top, conf, text, block=1, par=1):
+    return "\t".join(map(str, [5, 1, block, par, line, word, left, top, 40, 20, conf, text]))
+
+
+TSV = "\n".join([
+    "level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext",
+    "4\t1\t1\t1\t1\t0\t10\t10\t200\t20\t-1\t",
+    _tsv_row(1, 2, 60, 10, 90, "강남점"),
+    _tsv_row(1, 1, 10, 10, 90, "STAR*BUCKS"),
+    _tsv_row(2, 1, 10, 200, 85, "합계"),
+    _tsv_row(2, 2, 60, 200, 85, "4,500"),
+    _tsv_row(3, 1, 10, 260, 20, "12,345."),
+    _tsv_row(3, 2, 60, 260, 20, " "),
+])
+
+
+def test_parse_tsv_and_group_lines():
+    words = parse_tsv(TSV)
+    assert len(words) == 5  # 헤더, 비단어 레벨, 빈 텍스트 제외
+    lines = group_lines(words)
+    assert [l["text"] for l in lines] == ["STAR*BUCKS 강남점", "합계 4,500", "12,345."]
+    assert lines[0]["box"] == (10, 10, 100, 30)
+    assert lines[1]["conf"] == 85
+
+
+def test_position_based_fields():
+    lines = group_lines(parse_tsv(TSV))
+    assert top_brand_text(lines, page_height=300) == "STARBUCKS강남점"
+    assert bottom_amount(lines, page_height=300) == 12345
+    assert top_brand_text(lines[1:], page_height=300) == ""
+    assert bottom_amount(lines[:1], page_height=300) is None
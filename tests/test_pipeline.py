@@ -0,0 +1,74 @@
+import pipeline
+from preprocess import StageReport
+
+LINES = [
+    {"text": "스벅 강남점", "conf": 90},
+    {"text": "2024-03-05", "conf": 90},
+    {"text": "합계 4,500", "conf": 90},
+]
+
+
+def _fake_parse(lines, roi_brand, line_boxes, user_id=None):
+    """u1 에게만 '스벅' → 스타벅스 별칭이 있는 파서"""
+    store = "스타벅스" if user_id == "u1" else "스벅"
+    return {"가맹점": store, "총금액": 4500, "날짜": "2024-03-05", "카테고리": None}, None
+
+
+def _fake_layout(image, report, stage="ocr"):
+    report.mark(stage)
+    return "\n".join(l["text"] for l in LINES), [dict(l) for l in LINES], None, None
+
+
+def _setup(monkeypatch):
+    calls = []
+    monkeypatch.setattr(pipeline, "OCR_MODE", "adaptive")
+    monkeypatch.setattr(pipeline, "get_cache", lambda: None)
+    monkeypatch.setattr(pipeline, "prepare", lambda b, report: (None, "gray", report))
+    monkeypatch.setattr(pipeline, "binarize", lambda gray, report, height, tag: calls.append(tag) or "img")
+    monkeypatch.setattr(pipeline, "_layout_pass", _fake_layout)
+    monkeypatch.setattr(pipeline, "parse_receipt_text", _fake_parse)
+    monkeypatch.setattr(pipeline, "is_known_store", lambda s: s == "스타벅스")
+    monkeypatch.setattr(pipeline, "extract_top_brand", lambda img: None)
+    monkeypatch.setattr(pipeline, "extract_bottom_amount", lambda img: None)
+    monkeypatch.setattr(pipeline, "extract_date_sparse", lambda img: None)
+    return calls
+
+
+def test_escalation_ignores_user_aliases(monkeypatch):
+    calls = _setup(monkeypatch)
+    tiers = {}
+    for user_id in ("u1", "u2"):
+        report = StageReport()
+        parsed, ocr = pipeline.recognize(b"img", report, user_id)
+        tiers[user_id] = (ocr["tier"], ocr["escalated"])
+        assert report.tier == ocr["tier"]
+    # 캐시 키에 user_id 가 없으므로 단계 판단도 사용자와 무관해야 함
+    assert tiers["u1"] == tiers["u2"] == ("targeted", ["가맹점"])
+    assert calls == ["_fast", "_full"] * 2
+
+
+def test_user_aliases_still_apply_to_final_parse(monkeypatch):
+    _setup(monkeypatch)
+    assert pipeline.recognize(b"img", StageReport(), "u1")[0]["가맹점"] == "스타벅스"
+    assert pipeline.recognize(b"img", StageReport(), "u2")[0]["가맹점"] == "스벅"
+
+
+def test_cached_ocr_is_shared_between_users(monkeypatch):
+    calls = _setup(monkeypatch)
+    store = {}
+
+    class FakeCache:
+        def get(self, key):
+            return store.get(key)
+
+        def put(self, key, value):
+            store[key] = value
+
+    monkeypatch.setattr(pipeline, "get_cache", lambda: FakeCache())
+    monkeypatch.setattr(pipeline, "ocr_signature", lambda: "test")
+    _, first = pipeline.recognize(b"img", StageReport(), "u1")
+    report = StageReport()
+    parsed, second = pipeline.recognize(b"img", report, "u2")
+    assert report.tier == "cache"
+    assert second is first and len(calls) == 2
+    assert parsed["가맹점"] == "스벅"
@@ -0,0 +1,113 @@
+import numpy as np
+import cv2
+import pytest
+
+import preprocess
+
+
+def _text_page(lines=12):
+    """흰 종이에 글자 줄처럼 보이는 검은 막대들"""
+    page = np.full((900, 600), 255, np.uint8)
+    rng = np.random.default_rng(0)
+    for i in range(lines):
+        y = 80 + i * 60
+        x = 60
+        while x < 520:
+            w = int(rng.integers(20, 70))
+            cv2.rectangle(page, (x, y), (min(x + w, 540), y + 14), 0, -1)
+            x += w + 12
+    return page
+
+
+@pytest.mark.parametrize("tilt", [-8, -4, -2, 2, 4, 8])
+def test_estimate_skew_both_directions(tilt):
+    tilted = preprocess.rotate(_text_page(), tilt)
+    assert preprocess.estimate_skew(tilted) == pytest.approx(tilt, abs=0.5)
+
+
+@pytest.mark.parametrize("tilt", [-6, 6])
+def test_correct_geometry_levels_tilted_text(tilt):
+    tilted = preprocess.rotate(_text_page(), tilt)
+    _, gray = preprocess.correct_geometry(tilted, tilted, preprocess.StageReport())
+    assert abs(preprocess.estimate_skew(gray)) < 0.5
+
+
+def test_estimate_skew_ignores_large_angles():
+    assert preprocess.estimate_skew(preprocess.rotate(_text_page(), 30)) == 0.0
+
+
+def test_warp_quad_axis_aligned_is_view():
+    img = _text_page()
+    quad = np.array([[10, 20], [110, 20], [110, 220], [10, 220]], dtype=np.float32)
+    out = preprocess.warp_quad(img, quad)
+    assert np.shares_memory(out, img)
+    assert out.shape[0] == pytest.approx(200, abs=1)
+    assert out.shape[1] == pytest.approx(100, abs=1)
+
+
+def test_warp_quad_perspective_output_size():
+    img = _text_page()
+    quad = np.array([[50, 40], [550, 60], [540, 860], [40, 840]], dtype=np.float32)
+    out = preprocess.warp_quad(img, quad)
+    assert out.shape[1] == pytest.approx(500, abs=2)
+    assert out.shape[0] == pytest.approx(800, abs=2)
+
+
+def test_quality_gate_rejects_blank_image():
+    blank = np.full((800, 600), 200, np.uint8)
+    with pytest.raises(preprocess.ImageRejected) as info:
+        preprocess.check_quality(blank)
+    assert info.value.to_dict()["error"] == "Image rejected"
+
+
+def _glyph_page(glyph_height, width=600, height=900):
+    """글자 높이가 glyph_height 인 낱글자 블록들"""
+    page = np.full((height, width), 255, np.uint8)
+    for y in range(60, height - 60, glyph_height * 2):
+        for x in range(40, width - 40, 20):
+            cv2.rectangle(page, (x, y), (x + 11, y + glyph_height - 1), 0, -1)
+    return page
+
+
+def _jpeg(array):
+    return cv2.imencode(".jpg", array)[1].tobytes()
+
+
+def test_reduction_for():
+    assert preprocess.reduction_for(None) == 1
+    assert preprocess.reduction_for((2000, 1500), max_pixels=8_000_000) == 1
+    assert preprocess.reduction_for((4000, 3000), max_pixels=8_000_000) == 2
+    assert preprocess.reduction_for((40000, 30000), max_pixels=1000) == 8  # 최대 1/8
+
+
+def test_decode_image_reduces_large_images():
+    data = _jpeg(np.full((600, 800, 3), 200, np.uint8))
+    assert preprocess.image_size(data) == (800, 600)
+    assert preprocess.decode_image(data).shape == (600, 800)
+    assert preprocess.decode_image(data, color=True, max_pixels=200_000).shape == (300, 400, 3)
+    with pytest.raises(ValueError):
+        preprocess.decode_image(b"not an image")
+
+
+@pytest.mark.parametrize("glyph_height", [12, 24, 48])
+def test_estimate_text_height(glyph_height):
+    assert preprocess.estimate_text_height(_glyph_page(glyph_height)) == pytest.approx(glyph_height, abs=2)
+    # 분석용 축소본에서 재도 원본 기준 높이
+    big = cv2.resize(_glyph_page(glyph_height), None, fx=2, fy=2, interpolation=cv2.INTER_NEAREST)
+    assert preprocess.estimate_text_height(big) == pytest.approx(glyph_height * 2, rel=0.15)
+
+
+def test_choose_scale_targets_text_height():
+    shape = (1000, 800)
+    assert preprocess.choose_scale(16, shape) == pytest.approx(2.0)
+    assert preprocess.choose_scale(64, shape) == pytest.approx(0.5)
+    assert preprocess.choose_scale(200, shape) == preprocess.MIN_SCALE
+    assert preprocess.choose_scale(None, shape) == preprocess.MAX_SCALE
+    assert preprocess.choose_scale(8, shape, max_pixels=3_200_000) == pytest.approx(2.0)
+    assert preprocess.choose_scale(8, shape, max_pixels=800_000) == pytest.approx(1.0)
+
+
+def test_binarize_scales_to_target_height():
+    out = preprocess.binarize(_glyph_page(16))
+    assert out.shape == (1800, 1200)
+    assert set(np.unique(out)) <= {0, 255}
@@ -0,0 +1,57 @@
+import pytest
+
+import receipt_tokens
+from receipt_tokens import AMOUNT, BIZNO, DATE, PHONE, TIME, TOTAL_KW, extract_fields, tokenize
+
+
+def _kinds(lines):
+    return [(t.kind, t.value, t.line) for t in tokenize(lines)]
+
+
+def test_tokenize_kinds_and_positions():
+    lines = ["사업자 123-45-67890 TEL 02-123-4567", "2024.03.05 12:30:01", "합 계 12,500"]
+    assert _kinds(lines) == [
+        (BIZNO, "123-45-67890", 0), (PHONE, "02-123-4567", 0),
+        (DATE, "2024-03-05 12:30:01", 1),
+        (TOTAL_KW, "합계", 2), (AMOUNT, 12500, 2),
+    ]
+    amount = tokenize(lines)[-1]
+    assert lines[amount.line][amount.start:amount.end] == "12,500"
+
+
+def test_numbers_inside_other_tokens_are_not_amounts():
+    assert _kinds(["12345678901234 1234 123"]) == [(AMOUNT, 12345678901234, 0), (AMOUNT, 1234, 0)]
+    assert _kinds(["09:30"]) == [(TIME, "09:30", 0)]
+
+
+@pytest.mark.parametrize("lines,total", [
+    (["합계 4,500", "받은금액 10,000", "거스름돈 5,500"], 4500),
+    (["합계 3,300", "결제금액 3,200"], 3200),            # 강한 키워드 우선
+    (["합계", "7,000", "카드 9,999"], 7000),              # 다음 줄 첫 금액
+    (["아메리카노 4,500", "라떼 5,000"], 5000),           # 키워드 없으면 최댓값
+    (["결제금액 3,000,000", "2,500"], 2500),              # MAX_AMOUNT 이상 제외
+    (["합계 없음"], None),
+])
+def test_total_selection(lines, total):
+    assert extract_fields(lines)["total"] == total
+
+
+def test_confident_lines_first():
+    lines = ["합계 99,999", "합계 4,500"]
+    assert extract_fields(lines, [False, True])["total"] == 4500
+    assert extract_fields(lines, [False, False])["total"] == 4500  # 아래쪽 같은 키워드
+
+
+def test_store_raw_after_last_keyword_on_first_line():
+    assert extract_fields(["매장명 가맹점 이디야 역삼점", "가맹점 다른곳"])["store_raw"] == "이디야 역삼점"
+    assert extract_fields(["영수증"])["store_raw"] is None
+
+
+def test_matches_legacy_extractor_on_synthetic_texts():
+    for text, total, date in receipt_tokens.synthetic_texts(200, seed=3):
+        lines = text.splitlines()
+        fields = extract_fields(lines)
+        legacy_total, legacy_date, legacy_store = receipt_tokens._legacy_extract(lines)
+        assert fields["date"] == legacy_date == date
+        assert fields["store_raw"] == legacy_store
+        assert fields["total"] == total  # 구 구현은 최댓값이라 카드/공급가액 숫자를 잡기도 함
@@ -0,0 +1,79 @@
+import json
+
+import db
+import reparse
+
+
+def _insert(db_path, store, ocr_store, category="기타", user_id="u1"):
+    row = (user_id, store, 4500, "2024-03-05", category, ocr_store, "2024-03", None, None)
+    return db.insert_transaction(row, db_path)
+
+
+def _row(db_path, transaction_id):
+    return db.connect(db_path).execute(
+        'SELECT store, category FROM transactions WHERE id=?', (transaction_id,)).fetchone()
+
+
+def _run(db_path, tmp_path, *extra):
+    args = ["--db", db_path, "--workers", "1", "--chunk", "1",
+            "--checkpoint", str(tmp_path / "reparse.checkpoint.json"), *extra]
+    assert reparse.main(args) == 0
+
+
+def test_reparse_updates_stores_and_keeps_corrections(db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "DB_PATH", db_path)
+    stale = _insert(db_path, "STARBUCKS 강남", "STARBUCKS 강남")
+    corrected = _insert(db_path, "STARBUCKS 역삼", "STARBUCKS 역삼")
+    db.update_transaction_field("u1", corrected, "store", "내 단골 카페", db_path)
+    unknown = _insert(db_path, "동네가게", "동네가게")
+
+    _run(db_path, tmp_path, "--dry-run")
+    assert _row(db_path, stale) == ("STARBUCKS 강남", "기타")  # dry-run 은 DB 그대로
+    assert not (tmp_path / "reparse.checkpoint.json").exists()
+
+    _run(db_path, tmp_path)
+    assert _row(db_path, stale) == ("스타벅스", "카페")
+    assert _row(db_path, corrected) == ("내 단골 카페", "기타")
+    assert _row(db_path, unknown) == ("동네가게", "기타")
+    checkpoint = json.loads((tmp_path / "reparse.checkpoint.json").read_text(encoding="utf-8"))
+    assert checkpoint["last_id"] == unknown and checkpoint["changed"] == 1
+
+    # 다시 실행하면 체크포인트 이후만 (새 행 없음)
+    _insert(db_path, "ediya", "ediya")
+    _run(db_path, tmp_path)
+    checkpoint = json.loads((tmp_path / "reparse.checkpoint.json").read_text(encoding="utf-8"))
+    assert checkpoint["scanned"] == 4 and checkpoint["changed"] == 2
+
+
+def _write(db_path, transaction_id, diff, store):
+    conn = db.connect(db_path)
+    with conn:
+        reparse.write_changes(conn, [(transaction_id, diff, store)])
+
+
+def test_write_changes_skips_rows_changed_since_read(db_path):
+    transaction_id = _insert(db_path, "STARBUCKS", "STARBUCKS")
+    conn = db.connect(db_path)
+    with conn:
+        conn.execute('UPDATE transactions SET store=? WHERE id=?', ("다른 값", transaction_id))
+    _write(db_path, transaction_id, {"store": ("STARBUCKS", "스타벅스"), "category": ("기타", "카페")}, "STARBUCKS")
+    # 가맹점을 건너뛰었으니 그 가맹점으로 계산한 카테고리도 그대로
+    assert _row(db_path, transaction_id) == ("다른 값", "기타")
+
+
+def test_write_changes_category_follows_store(db_path):
+    updated = _insert(db_path, "STARBUCKS", "STARBUCKS")
+    _write(db_path, updated, {"store": ("STARBUCKS", "스타벅스"), "category": ("기타", "카페")}, "STARBUCKS")
+    assert _row(db_path, updated) == ("스타벅스", "카페")
+
+    # 가맹점은 안 바뀌고 카테고리만: 그 사이 사용자가 가맹점을 고쳤으면 건너뜀
+    category_only = _insert(db_path, "이디야", "이디야")
+    db.update_transaction_field("u1", category_only, "store", "CU", db_path)
+    _write(db_path, category_only, {"category": ("기타", "카페")}, "이디야")
+    assert _row(db_path, category_only) == ("CU", "기타")
+
+    # 가맹점을 사용자가 고쳤지만 값은 같은 경우: 가맹점 갱신이 막히므로 카테고리도
+    corrected = _insert(db_path, "STARBUCKS", "STARBUCKS")
+    db.update_transaction_field("u1", corrected, "store", "STARBUCKS", db_path)
+    _write(db_path, corrected, {"store": ("STARBUCKS", "스타벅스"), "category": ("기타", "카페")}, "STARBUCKS")
+    assert _row(db_path, corrected) == ("STARBUCKS", "기타")
@@ -0,0 +1,52 @@
+import sqlite3
+from contextlib import closing
+
+import db
+
+BASELINE_SCHEMA = '''
+    CREATE TABLE transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT, store TEXT, amount INTEGER, date TEXT, category TEXT, ocr_store TEXT,
+        deleted_at TEXT
+    );
+    CREATE TABLE user_budget (user_id TEXT PRIMARY KEY, budget INTEGER);
+'''
+
+
+def test_migration_backfills_year_month(tmp_path):
+    path = str(tmp_path / "old.db")
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.executescript(BASELINE_SCHEMA)
+        conn.executemany('INSERT INTO transactions (user_id, store, amount, date, category) VALUES (?, ?, ?, ?, ?)', [
+            ("u1", "스타벅스", 4500, "2024-03-05 12:30", "카페"),
+            ("u1", "CU", 1200, "2024.3.9", "편의점"),
+            ("u1", "이디야", 3200, "2024년 11월 1일", "카페"),
+            ("u1", "미확인", 900, "영수증", "기타"),
+        ])
+    db.init_db(path)
+    conn = db.connect(path)
+    assert [r[0] for r in conn.execute('SELECT ym FROM transactions ORDER BY id')] == [
+        "2024-03", "2024-03", "2024-11", None]
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == db.SCHEMA_VERSION
+    plan = " ".join(r[-1] for r in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT ym, category, SUM(amount) FROM transactions "
+        "WHERE user_id=? AND deleted_at IS NULL GROUP BY ym, category", ("u1",)))
+    assert "COVERING INDEX idx_transactions_user_ym" in plan
+
+
+def test_stats_endpoint_filters_by_month(login, app_module):
+    stats_client = login("stats-user")
+    for row in [("스타벅스", 4500, "2024-03-05", "카페"), ("CU", 1200, "2024-03-09", "편의점"),
+                ("이디야", 3200, "2024-04-01", "카페")]:
+        store, amount, date, category = row
+        db.insert_transaction(("stats-user", store, amount, date, category, store, date[:7], None, None),
+                              app_module.DB_PATH)
+    db.set_budget("stats-user", 10000, app_module.DB_PATH)
+
+    body = stats_client.get('/api/stats?month=2024-03').get_json()
+    assert body["total_spent"] == 5700 and body["transaction_count"] == 2
+    assert body["category_stats"] == {"카페": 4500, "편의점": 1200}
+    assert body["monthly_stats"] == {"2024-03": 5700, "2024-04": 3200}
+    assert body["remaining_budget"] == 4300
+
+    assert stats_client.get('/api/stats').get_json()["total_spent"] == 8900
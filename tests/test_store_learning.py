@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+import db
+import store_learning
+
+
+def test_user_alias_beats_global(db_path):
+    assert store_learning.learn("u1", "스벅", "스타벅스", db_path)
+    assert store_learning.lookup("스벅", "u1", db_path) == "스타벅스"
+    assert store_learning.lookup("스벅", "u2", db_path) == "스타벅스"  # 공용 별칭 (STORE_LEARNING_SHARE=1)
+
+    store_learning.learn("u2", "스벅", "스벅커피", db_path)
+    assert store_learning.lookup("스벅", "u2", db_path) == "스벅커피"
+    assert store_learning.lookup("스벅", "u1", db_path) == "스타벅스"
+    assert store_learning.lookup("스벅", None, db_path) == "스벅커피"  # 공용은 마지막 교정
+
+
+def test_private_aliases_when_sharing_disabled(db_path, monkeypatch):
+    monkeypatch.setattr(store_learning, "STORE_LEARNING_SHARE", False)
+    store_learning.learn("u1", "동네빵집", "파리바게뜨", db_path)
+    assert store_learning.lookup("동네빵집", "u1", db_path) == "파리바게뜨"
+    assert store_learning.lookup("동네빵집", "u2", db_path) is None
+
+
+@pytest.mark.parametrize("ocr_text,store", [("", "CU"), ("CU", ""), ("CU", "CU"), ("x" * 100, "CU")])
+def test_ignored_corrections(db_path, ocr_text, store):
+    assert not store_learning.learn("u1", ocr_text, store, db_path)
+
+
+def test_other_process_changes_arrive_incrementally(db_path):
+    reader = store_learning.LearningCache(db_path, refresh_sec=0)
+    assert reader.lookup("gs", "u1") is None
+    store_learning.learn("u1", "gs", "GS25", db_path)
+    store_learning.learn("u1", "gs", "GS25 편의점", db_path)  # 같은 키 갱신 → 새 seq
+    assert reader.lookup("gs", "u1") == "GS25 편의점"
+    seq = reader.seq
+    reader.refresh(force=True)
+    assert reader.seq == seq and len(reader) == 2  # (u1, gs), ('', gs)
+
+
+def test_import_json_keeps_existing(db_path, tmp_path):
+    store_learning.learn(store_learning.GLOBAL, "이디야", "이디야커피", db_path)
+    path = tmp_path / "store_learning.json"
+    path.write_text(json.dumps({"이디야": "이디야", "emart": "이마트24", "": "x"}, ensure_ascii=False), encoding="utf-8")
+    assert store_learning.main(["import-json", str(path), "--db", db_path]) == 0
+    conn = db.connect(db_path)
+    assert dict(conn.execute("SELECT ocr_text, store FROM store_aliases WHERE user_id=''")) == {
+        "이디야": "이디야커피", "emart": "이마트24"}
+    assert store_learning.import_json(conn, str(tmp_path / "missing.json")) == 0
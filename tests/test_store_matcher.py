@@ -0,0 +1,98 @@
+import random
+
+import pytest
+
+import parser as receipt_parser
+import store_matcher
+from store_matcher import AhoCorasick, FuzzyIndex, StoreMatcher, fuzzy_key, substring_distance
+
+
+def _linear_search(patterns, text):
+    """Aho–Corasick 이전 방식: 앞쪽 패턴부터 차례로 부분 문자열 검사"""
+    for pattern, value in patterns:
+        if pattern and pattern in text:
+            return value
+    return None
+
+
+def _edit_substring_dp(pattern, text):
+    """text 의 부분 문자열과 pattern 의 최소 편집 거리 (O(mn) 표 계산)"""
+    prev = list(range(len(pattern) + 1))
+    best = prev[-1]
+    for ch in text:
+        cur = [0]
+        for i, pc in enumerate(pattern, 1):
+            cur.append(min(prev[i] + 1, cur[i - 1] + 1, prev[i - 1] + (pc != ch)))
+        prev = cur
+        best = min(best, prev[-1])
+    return best
+
+
+def _random_text(rng, alphabet, lo, hi):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(lo, hi)))
+
+
+def test_aho_corasick_matches_linear_scan():
+    rng = random.Random(7)
+    for _ in range(200):
+        patterns = [(_random_text(rng, "abc가나", 1, 4), i) for i in range(rng.randint(1, 12))]
+        automaton = AhoCorasick([(p, i, v) for i, (p, v) in enumerate(patterns)])
+        for _ in range(20):
+            text = _random_text(rng, "abc가나", 0, 12)
+            hit = automaton.search(text)
+            assert (hit[1] if hit else None) == _linear_search(patterns, text), (patterns, text)
+
+
+def test_hot_added_rules_keep_priority(monkeypatch):
+    monkeypatch.setattr(store_matcher, "STORE_PENDING_MAX", 3)
+    rng = random.Random(3)
+    patterns = [(_random_text(rng, "abcd", 1, 3), i) for i in range(10)]
+    rules = store_matcher._SubstringRules(patterns[:4])
+    for pattern, value in patterns[4:]:  # 대기열 검색 + 재구축 모두 거침
+        rules.add(pattern, value)
+    for _ in range(300):
+        text = _random_text(rng, "abcd", 0, 10)
+        assert rules.search(text) == _linear_search(patterns, text)
+
+
+def test_substring_distance_matches_dp():
+    rng = random.Random(11)
+    for _ in range(500):
+        pattern = _random_text(rng, "abcde", 1, 10)
+        text = _random_text(rng, "abcde", 0, 15)
+        expected = _edit_substring_dp(pattern, text)
+        assert substring_distance(pattern, text, len(pattern)) == expected
+        assert substring_distance(pattern, text, expected - 1) is None or expected == 0
+
+
+def test_fuzzy_index_matches_exhaustive_scan():
+    brands = receipt_parser.brand_candidates
+    index = FuzzyIndex(brands)
+    queries = store_matcher.make_queries(random.Random(5), brands, 300)
+    for query, _ in queries:
+        key = fuzzy_key(query.replace(" ", "").lower())
+        best = None
+        for name in brands:
+            bkey = fuzzy_key(name)
+            sim = 1 - _edit_substring_dp(bkey, key) / len(bkey)
+            if sim >= store_matcher.STORE_FUZZY_MIN_SIM and (best is None or (sim, len(bkey)) > best[0]):
+                best = ((sim, len(bkey)), name)
+        assert index.match(query.replace(" ", "").lower()) == (best[1] if best else None), query
+
+
+@pytest.mark.parametrize("name", ["STARBUCKS 강남", "starducks", "이디야 역삼점", "GS25 선릉",
+                                  "cu 편의점", "emart24", "파리바게뜨 본점", "스벅"])
+def test_matches_legacy_normalizer_on_known_names(name):
+    legacy = store_matcher._legacy_matcher(receipt_parser.brand_map, receipt_parser.store_keywords,
+                                           receipt_parser.brand_candidates)
+    assert receipt_parser.store_matcher.match(name) == legacy(name)
+
+
+def test_brand_names_beat_keyword_rules():
+    matcher = StoreMatcher(receipt_parser.brand_map.items(), receipt_parser.store_keywords,
+                           receipt_parser.brand_candidates)
+    # 구 구현은 '마트' 키워드 규칙이 먼저 걸려 둘 다 이마트24
+    assert matcher.match("롯데마트 잠실점") == "롯데마트"
+    assert matcher.match("농협하나로마트") == "농협"
+    matcher.add_brand("새가게")
+    assert matcher.match("새가게 2호점") == "새가게"
@@ -0,0 +1,116 @@
+import io
+import tempfile
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import uploads
+
+
+def _png(w=64, h=48):
+    buf = io.BytesIO()
+    Image.fromarray(np.full((h, w), 200, np.uint8)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _storage(data, name="r.png", on_disk=False):
+    stream = io.BytesIO(data)
+    if on_disk:
+        stream = tempfile.TemporaryFile(mode="rb+")
+        stream.write(data)
+    return FileStorage(stream=stream, filename=name)
+
+
+def test_check_limits(monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 100)
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_PIXELS", 1000)
+    cases = [(0, "PNG", (1, 1), 400), (101, "PNG", (1, 1), 413), (10, "GIF", (1, 1), 415),
+             (10, "PNG", (40, 30), 413)]
+    for nbytes, fmt, size, status in cases:
+        with pytest.raises(uploads.UploadRejected) as e:
+            uploads.check(nbytes, fmt, size)
+        assert e.value.status == status
+    uploads.check(10, "JPEG", (20, 20))
+
+
+def test_sniff_reads_header_only_and_rewinds():
+    fp = io.BytesIO(_png(640, 480))
+    fp.seek(5)
+    assert uploads.sniff(fp) == ("PNG", (640, 480))
+    assert fp.tell() == 5
+    with pytest.raises(uploads.UploadRejected) as e:
+        uploads.sniff(io.BytesIO(b"%PDF-1.4 not an image"))
+    assert e.value.status == 415
+
+
+def test_open_upload_small_in_memory():
+    data = _png()
+    with uploads.open_upload(_storage(data)) as (buf, info):
+        assert bytes(buf) == data
+    assert info == {"bytes": len(data), "format": "PNG", "size": [64, 48], "spooled": False}
+
+
+def test_open_upload_spooled_uses_mmap():
+    data = _png(400, 300)
+    with uploads.open_upload(_storage(data, on_disk=True)) as (buf, info):
+        assert info["spooled"] and not isinstance(buf, bytes)
+        assert buf[:len(data)] == data
+
+
+def test_collect_images_with_zip(monkeypatch):
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_PIXELS", 100 * 100)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("a.png", _png())
+        zf.writestr("big.png", _png(200, 200))
+        zf.writestr("notes.txt", "skip")
+        zf.writestr("broken.png", b"xx")
+    archive.seek(0)
+    files = [FileStorage(stream=archive, filename="batch.zip"), _storage(_png(), "b.png")]
+    items, rejected = uploads.collect_images(files, (".png",), max_items=5)
+    assert [name for name, _, _ in items] == ["a.png", "big.png", "broken.png", "b.png"] and not rejected
+    statuses = {}
+    for name, size, read in items:  # 본문과 이미지 헤더는 read() 할 때 검사
+        try:
+            assert len(read()) == size
+        except uploads.UploadRejected as e:
+            statuses[name] = e.status
+    assert statuses == {"big.png": 413, "broken.png": 415}
+
+    with pytest.raises(uploads.UploadRejected) as e:
+        uploads.collect_images([_storage(_png(), "1.png"), _storage(_png(), "2.png")], (".png",), max_items=1)
+    assert e.value.status == 413
+
+
+def test_collect_images_caps_decompressed_total():
+    data = _png()
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(4):
+            zf.writestr(f"{i}.png", data)
+    archive.seek(0)
+    with pytest.raises(uploads.UploadRejected) as e:
+        uploads.collect_images([FileStorage(stream=archive, filename="batch.zip")], (".png",),
+                               max_items=10, max_total_bytes=3 * len(data))
+    assert e.value.status == 413
+
+
+def test_detach_files_survives_request_close():
+    original = _storage(_png())
+    [detached] = uploads.detach_files([original])
+    original.close()  # Flask 가 뷰 반환 후 request.close() 에서 하는 일
+    with uploads.open_upload(detached) as (buf, _):
+        assert bytes(buf) == _png()
+    detached.close()
+
+
+def test_ocr_endpoint_rejects_before_decoding(client, monkeypatch):
+    resp = client.post('/ocr', data={"image": (io.BytesIO(b"plain text"), "r.png")},
+                       content_type="multipart/form-data")
+    assert resp.status_code == 415
+    monkeypatch.setattr(uploads, "MAX_UPLOAD_BYTES", 10)
+    resp = client.post('/ocr', data={"image": (io.BytesIO(_png()), "r.png")}, content_type="multipart/form-data")
+    assert resp.status_code == 413
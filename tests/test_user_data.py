@@ -0,0 +1,52 @@
+import db
+
+
+def _seed(app_module, user_id, n):
+    return [db.insert_transaction((user_id, f"가게{i}", 1000 + i, f"2024-0{1 + i % 3}-01", "카페" if i % 2 else "마트",
+                                   f"가게{i}", f"2024-0{1 + i % 3}", None, None), app_module.DB_PATH)
+            for i in range(n)]
+
+
+def test_keyset_pages_cover_all_rows(login, app_module):
+    client = login("page-user")
+    ids = _seed(app_module, "page-user", 7)
+    seen, after = [], None
+    while True:
+        resp = client.get('/api/user-data?limit=3' + (f'&after_id={after}' if after else ''))
+        page = [r["id"] for r in resp.get_json()]
+        seen += page
+        after = resp.headers.get("X-Next-After-Id")
+        if not after:
+            break
+        assert after == str(page[-1])
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_filters_and_field_projection(login, app_module):
+    client = login("filter-user")
+    _seed(app_module, "filter-user", 6)
+    rows = client.get('/api/user-data?from=2024-02&to=2024-03&category=카페&fields=store,amount').get_json()
+    assert rows and all(set(r) == {"id", "store", "amount"} for r in rows)
+    assert {r["store"] for r in rows} == {"가게1", "가게5"}
+
+
+def test_etag_revalidation(login, app_module):
+    client = login("etag-user")
+    ids = _seed(app_module, "etag-user", 2)
+    first = client.get('/api/user-data')
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    assert client.get('/api/user-data', headers={"If-None-Match": etag}).status_code == 304
+    # 쿼리가 다르면 다른 ETag
+    assert client.get('/api/user-data?limit=1').headers["ETag"] != etag
+
+    db.update_transaction_field("etag-user", ids[0], "store", "고친 가게", app_module.DB_PATH)
+    resp = client.get('/api/user-data', headers={"If-None-Match": etag})
+    assert resp.status_code == 200 and resp.headers["ETag"] != etag
+
+
+def test_etag_differs_between_users(login):
+    a = login("etag-a").get('/api/user-data').headers["ETag"]
+    b = login("etag-b").get('/api/user-data').headers["ETag"]
+    assert a != b
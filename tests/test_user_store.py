@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+import user_store
+from user_store import CachedUserStore, MemoryUserStore, SqliteUserStore
+
+
+class CountingBackend(MemoryUserStore):
+    def __init__(self):
+        super().__init__()
+        self.reads = 0
+
+    def get(self, user_id):
+        self.reads += 1
+        return super().get(user_id)
+
+
+def test_sqlite_backend_persists_and_updates(db_path):
+    store = SqliteUserStore(db_path)
+    assert store.get("g1") is None
+    store.save("g1", "홍길동", "a@example.com")
+    store.save("g1", "홍길동", "b@example.com")
+    assert SqliteUserStore(db_path).get("g1") == {"id": "g1", "name": "홍길동", "email": "b@example.com"}
+
+
+def test_lru_hits_and_eviction():
+    backend = CountingBackend()
+    for i in range(3):
+        backend.save(f"u{i}", f"n{i}", None)
+    cache = CachedUserStore(backend, size=2, ttl=60)
+    cache.get("u0")
+    cache.get("u1")
+    cache.get("u0")          # 적중 → u0 가 최근
+    cache.get("u2")          # u1 축출
+    assert backend.reads == 3
+    cache.get("u0")
+    cache.get("u1")
+    assert backend.reads == 4
+    assert cache.stats() == {"entries": 2, "hits": 2, "misses": 4}
+
+
+def test_missing_users_are_not_cached():
+    backend = CountingBackend()
+    cache = CachedUserStore(backend, size=4, ttl=60)
+    assert cache.get("ghost") is None
+    backend.save("ghost", "now here", None)  # 다른 워커에서 로그인
+    assert cache.get("ghost")["name"] == "now here"
+
+
+def test_ttl_expiry_picks_up_other_workers_changes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(user_store, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    backend = CountingBackend()
+    cache = CachedUserStore(backend, size=4, ttl=10)
+    cache.save("u1", "old", None)
+    backend.save("u1", "new", None)
+    assert cache.get("u1")["name"] == "old"
+    now[0] += 11
+    assert cache.get("u1")["name"] == "new"
+
+
+def test_login_survives_a_fresh_store(client, app_module, monkeypatch):
+    # 다른 워커/재시작: 프로세스 캐시 없이도 세션의 user id 로 DB 에서 다시 읽음
+    monkeypatch.setattr(user_store, "_store", None)
+    assert client.get('/user-info').get_json()["logged_in"] is True
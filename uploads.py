@@ -0,0 +1,211 @@
+"""업로드 이미지 받기: 크기/형식/해상도를 헤더만 보고 먼저 거절하고, 본문은 임시 파일에 스풀
+
+큰 업로드는 요청 본문 → 임시 파일 → mmap 으로 읽어 파이썬 bytes 사본을 만들지 않는다.
+"""
+import io
+import os
+import mmap
+import zlib
+import zipfile
+import tempfile
+from contextlib import contextmanager
+
+from flask import Request
+from werkzeug.datastructures import FileStorage
+from PIL import Image
+
+# ==========================
+# 설정
+# ==========================
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(15 * 1024 * 1024)))      # 이미지 1장
+MAX_UPLOAD_PIXELS = int(os.getenv("MAX_UPLOAD_PIXELS", str(50_000_000)))          # 헤더상 가로×세로
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(100 * 1024 * 1024)))   # 요청 본문 전체 (배치 포함)
+# 배치 한 번의 이미지 크기 합계 (zip 은 압축 해제 크기 기준 — 작은 zip 이 메모리에서 부풀지 않게)
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(MAX_REQUEST_BYTES)))
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(256 * 1024)))        # 넘으면 임시 파일로
+ALLOWED_FORMATS = {"JPEG", "PNG", "WEBP", "BMP", "TIFF"}  # OpenCV 가 디코드하는 형식
+
+
+class UploadRejected(ValueError):
+    """디코드 전에 거절된 업로드 (status: 400/413/415)"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class SpooledRequest(Request):
+    """multipart 파일 파트를 UPLOAD_SPOOL_BYTES 이하면 메모리(BytesIO)에, 넘거나 길이를 모르면 임시 파일에 쓰는 Request"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        length = content_length or total_content_length
+        if length is not None and length <= UPLOAD_SPOOL_BYTES:
+            return io.BytesIO()
+        return tempfile.TemporaryFile(mode="rb+")
+
+
+# ==========================
+# 헤더 검사
+# ==========================
+def sniff(fp):
+    """파일 객체의 헤더만 읽어 (format, (w, h)) — 위치는 원래대로 되돌림"""
+    pos = fp.tell()
+    try:
+        with Image.open(fp) as im:
+            return im.format, im.size
+    except Image.DecompressionBombError:
+        raise UploadRejected("Image dimensions too large", 413)
+    except Exception:
+        raise UploadRejected("Unsupported or corrupt image", 415)
+    finally:
+        fp.seek(pos)
+
+
+def check(nbytes, fmt, size):
+    if nbytes == 0:
+        raise UploadRejected("Empty upload", 400)
+    if nbytes > MAX_UPLOAD_BYTES:
+        raise UploadRejected(f"Image too large (max {MAX_UPLOAD_BYTES} bytes)", 413)
+    if fmt not in ALLOWED_FORMATS:
+        raise UploadRejected(f"Unsupported image format {fmt}", 415)
+    w, h = size
+    if w * h > MAX_UPLOAD_PIXELS:
+        raise UploadRejected(f"Image dimensions too large ({w}x{h}, max {MAX_UPLOAD_PIXELS} pixels)", 413)
+
+
+def check_bytes(data):
+    """메모리에 있는 이미지 (zip 멤버 등) 검사 → {"bytes", "format", "size"}"""
+    if len(data) > MAX_UPLOAD_BYTES:
+        check(len(data), None, (0, 0))
+    fmt, size = sniff(io.BytesIO(data))
+    check(len(data), fmt, size)
+    return {"bytes": len(data), "format": fmt, "size": list(size)}
+
+
+# ==========================
+# 읽기
+# ==========================
+def _stream_size(stream):
+    pos = stream.tell()
+    stream.seek(0, io.SEEK_END)
+    size = stream.tell()
+    stream.seek(pos)
+    return size
+
+
+def _on_disk(stream):
+    """임시 파일에 스풀된 스트림이면 fileno, 메모리에 있으면 None"""
+    if isinstance(stream, io.BytesIO):
+        return None
+    try:
+        return stream.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+@contextmanager
+def open_upload(file_storage):
+    """FileStorage → (이미지 버퍼, 업로드 정보 dict)
+
+    크기/형식/해상도는 헤더만 보고 먼저 검사한다. 임시 파일에 스풀된 본문은 읽기 전용
+    mmap 으로 돌려주므로 with 블록 안에서만 써야 한다 (bytes 처럼 해시/디코드/BLOB 바인딩 가능).
+    """
+    stream = file_storage.stream
+    stream.seek(0)
+    nbytes = _stream_size(stream)
+    if nbytes > MAX_UPLOAD_BYTES or nbytes == 0:
+        check(nbytes, None, (0, 0))
+    fmt, size = sniff(stream)
+    check(nbytes, fmt, size)
+    info = {"bytes": nbytes, "format": fmt, "size": list(size)}
+
+    fileno = _on_disk(stream)
+    if fileno is None:
+        info["spooled"] = False
+        yield stream.read(), info
+        return
+    info["spooled"] = True
+    buf = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+    try:
+        yield buf, info
+    finally:
+        try:
+            buf.close()
+        except BufferError:
+            pass  # 디코드 결과 등이 아직 버퍼를 참조 → GC 가 정리
+
+
+def detach_files(file_storages):
+    """요청에서 FileStorage 를 떼어냄 → 새 FileStorage 목록 (다 쓰면 각각 close)
+
+    Flask 는 뷰가 반환되면 request.close() 로 업로드 파일을 닫으므로, 스트리밍 응답 중에
+    본문을 조금씩 읽으려면 스트림을 요청 밖으로 옮겨야 한다.
+    """
+    detached = []
+    for f in file_storages:
+        detached.append(FileStorage(stream=f.stream, filename=f.filename, name=f.name, headers=f.headers))
+        f.stream = io.BytesIO()
+    return detached
+
+
+def collect_images(file_storages, exts, max_items, max_total_bytes=None):
+    """multipart 파일들(zip 포함) → ([(이름, 크기, read)], [(이름, UploadRejected)])
+
+    개수와 크기 합계는 헤더(zip 중앙 디렉터리의 압축 해제 크기, 스풀된 파일 크기)만 보고 먼저
+    검사해 넘으면 413 으로 중단한다. 본문 읽기와 이미지 헤더 검사는 read() 를 부를 때 한 장씩
+    하므로 (read() → bytes, 거절 시 UploadRejected) 호출자가 처리 중인 만큼만 메모리에 올린다.
+    zip 의 압축 해제 크기는 zipfile 이 읽을 때 헤더 값으로 제한·CRC 검사한다.
+    """
+    max_total_bytes = MAX_BATCH_BYTES if max_total_bytes is None else max_total_bytes
+    items, rejected = [], []
+    total = 0
+
+    def add(name, size, read):
+        nonlocal total
+        if len(items) >= max_items:
+            raise UploadRejected(f"Too many images (max {max_items})", 413)
+        total += size
+        if total > max_total_bytes:
+            raise UploadRejected(f"Batch too large (max {max_total_bytes} bytes of images)", 413)
+        items.append((name, size, read))
+
+    for f in file_storages:
+        name = f.filename or 'image'
+        if name.lower().endswith('.zip') or f.mimetype in ('application/zip', 'application/x-zip-compressed'):
+            zf = zipfile.ZipFile(f.stream)
+            for info in zf.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(exts):
+                    continue
+                if info.file_size > MAX_UPLOAD_BYTES:
+                    try:
+                        check(info.file_size, None, (0, 0))
+                    except UploadRejected as e:
+                        rejected.append((info.filename, e))
+                        continue
+                add(info.filename, info.file_size, lambda zf=zf, info=info: _read_member(zf, info))
+        else:
+            stream = f.stream
+            stream.seek(0)
+            nbytes = _stream_size(stream)
+            if nbytes > MAX_UPLOAD_BYTES or nbytes == 0:
+                try:
+                    check(nbytes, None, (0, 0))
+                except UploadRejected as e:
+                    rejected.append((name, e))
+                    continue
+            add(name, nbytes, lambda f=f: _read_upload(f))
+    return items, rejected
+
+
+def _read_member(zf, info):
+    try:
+        data = zf.read(info)
+    except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+        raise UploadRejected(f"Corrupt zip member: {e}", 400)
+    check_bytes(data)
+    return data
+
+
+def _read_upload(file_storage):
+    with open_upload(file_storage) as (buf, _):
+        return bytes(buf)  # 프로세스 풀로 넘기려면 bytes 필요
@@ -0,0 +1,136 @@
+"""로그인 사용자 저장소 (users 테이블) + 프로세스 내 LRU
+
+load_user 는 매 요청마다 불리므로 최근 사용자는 메모리에서 바로 돌려주고,
+처음 보는 id 만 백엔드를 읽는다. 백엔드가 공유 저장소(SQLite 등)이면 gunicorn 워커/
+레플리카가 여러 개여도, 재시작 후에도 로그인이 유지된다 (세션 쿠키는 SECRET_KEY 로 서명).
+
+    USER_STORE_BACKEND=sqlite   # 기본, DB_PATH 의 users 테이블
+    USER_STORE_BACKEND=memory   # 프로세스 메모리 (워커 1개 로컬 개발용, 이전 동작)
+"""
+import os
+import time
+import threading
+from collections import OrderedDict
+
+import db  # db 도 이 모듈을 import (마이그레이션) → 모듈 수준에서 db 속성을 쓰지 말 것
+
+# ==========================
+# 설정
+# ==========================
+USER_STORE_BACKEND = os.getenv("USER_STORE_BACKEND", "sqlite").lower()
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+# 다른 워커에서 다시 로그인해 이름/이메일이 바뀌어도 이 시간 안에 반영
+USER_CACHE_TTL_SEC = float(os.getenv("USER_CACHE_TTL_SEC", "300"))
+
+CREATE_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY,
+        name TEXT,
+        email TEXT,
+        created_at TEXT DEFAULT (datetime('now')),
+        last_login_at TEXT
+    ) WITHOUT ROWID
+'''
+
+UPSERT_SQL = '''
+    INSERT INTO users (id, name, email, last_login_at) VALUES (?, ?, ?, datetime('now'))
+    ON CONFLICT(id) DO UPDATE
+    SET name = excluded.name, email = excluded.email, last_login_at = excluded.last_login_at
+'''
+
+
+def install(conn):
+    conn.execute(CREATE_TABLE_SQL)
+
+
+# ==========================
+# 백엔드: get(id) → {"id", "name", "email"} | None, save(id, name, email)
+# ==========================
+class SqliteUserStore:
+    def __init__(self, db_path=None):
+        self.db_path = db_path
+
+    def get(self, user_id):
+        row = db.connect(self.db_path or db.DB_PATH).execute(
+            'SELECT id, name, email FROM users WHERE id=?', (user_id,)).fetchone()
+        return {"id": row[0], "name": row[1], "email": row[2]} if row else None
+
+    def save(self, user_id, name, email):
+        conn = db.connect(self.db_path or db.DB_PATH)
+        with conn:
+            conn.execute(UPSERT_SQL, (user_id, name, email))
+
+
+class MemoryUserStore:
+    def __init__(self):
+        self._users = {}
+
+    def get(self, user_id):
+        return self._users.get(user_id)
+
+    def save(self, user_id, name, email):
+        self._users[user_id] = {"id": user_id, "name": name, "email": email}
+
+
+BACKENDS = {"sqlite": SqliteUserStore, "memory": MemoryUserStore}
+
+
+# ==========================
+# LRU (+ TTL) 캐시
+# ==========================
+class CachedUserStore:
+    """백엔드 앞단의 LRU: 적중 시 dict 조회 + move_to_end 만 (없는 id 는 캐시하지 않음)"""
+
+    def __init__(self, backend, size=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SEC):
+        self.backend = backend
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # id → (만료 시각, user dict)
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        user = self.backend.get(user_id)
+        if user is not None:
+            self._put(user_id, user, now)
+        return user
+
+    def save(self, user_id, name, email):
+        self.backend.save(user_id, name, email)
+        self._put(user_id, {"id": user_id, "name": name, "email": email}, time.monotonic())
+
+    def _put(self, user_id, user, now):
+        with self._lock:
+            self._entries[user_id] = (now + self.ttl, user)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """프로세스당 1개 (USER_STORE_BACKEND + LRU)"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if USER_STORE_BACKEND not in BACKENDS:
+                    raise RuntimeError(f"Unknown USER_STORE_BACKEND {USER_STORE_BACKEND!r}")
+                _store = CachedUserStore(BACKENDS[USER_STORE_BACKEND]())
+    return _store
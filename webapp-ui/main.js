@@ -140,9 +140,11 @@ function saveBudget() {
 
 // ===== OCR 업로드(+ 미리보기/카테고리 유지) =====
 function uploadReceipt() {
-    const file = document.getElementById('receiptUpload').files[0];
+    const files = document.getElementById('receiptUpload').files;
+    const file = files[0];
     const resultDiv = document.getElementById('uploadResult');
     if (!file) return alert("파일을 선택하세요.");
+    if (files.length > 1 || file.name.toLowerCase().endsWith('.zip')) return uploadReceiptBatch(files);
 
     resultDiv.innerHTML = `<p class="text-blue-500">이미지 업로드 및 분석 중...</p>`;
     const formData = new FormData();
@@ -152,8 +154,13 @@ function uploadReceipt() {
     const categories = ["마트", "카페", "외식", "간식", "의류", "교통", "병원", "쇼핑", "교육", "공과금", "기타"];
 
     fetch(`${API_BASE_URL}/ocr`, { method: 'POST', credentials: 'include', body: formData })
-        .then(res => res.json())
+        .then(res => {
+            if (res.status === 429) throw new Error("OCR 대기열이 가득 찼습니다. 잠시 후 다시 시도하세요.");
+            return res.json();
+        })
+        .then(data => data.job_id ? waitForOcrJob(data.job_id) : data)
         .then(data => {
+            if (data.state === 'failed') throw new Error(data.error || "OCR 처리 실패");
             ocrData = data.receipt || {};
 
             resultDiv.innerHTML = `
@@ -211,7 +218,7 @@ function uploadReceipt() {
                     ? document.getElementById('edit-category').value
                     : document.getElementById('edit-category-custom').value;
 
-                fetch(`${API_BASE_URL}/api/user-data`, { credentials: 'include' })
+                fetch(`${API_BASE_URL}/api/user-data?limit=1&fields=id,ocr_store`, { credentials: 'include' })
                     .then(res => res.json())
                     .then(rows => {
                         if (!rows.length) return alert("거래 내역 없음");
@@ -238,6 +245,74 @@ function uploadReceipt() {
         });
 }
 
+// ===== 여러 장 일괄 업로드 (NDJSON 스트리밍) =====
+async function uploadReceiptBatch(files) {
+    const resultDiv = document.getElementById('uploadResult');
+    const formData = new FormData();
+    Array.from(files).forEach(f => formData.append(f.name.toLowerCase().endsWith('.zip') ? 'archive' : 'images', f));
+
+    resultDiv.innerHTML = `<p class="text-blue-500">${files.length}개 파일 업로드 및 분석 중...</p><ul id="batchResults" class="mt-2 text-sm"></ul>`;
+    const list = document.getElementById('batchResults');
+
+    try {
+        const res = await fetch(`${API_BASE_URL}/ocr/batch`, { method: 'POST', credentials: 'include', body: formData });
+        if (!res.ok) {
+            const err = await res.json().catch(() => ({}));
+            throw new Error(err.error || "일괄 업로드 실패");
+        }
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split("\n");
+            buffer = lines.pop();
+            lines.filter(Boolean).forEach(line => {
+                const item = JSON.parse(line);
+                const li = document.createElement('li');
+                if (item.status === 'done') {
+                    li.className = 'font-bold text-green-600 mt-2';
+                    li.textContent = `✅ 저장 ${item.inserted}건, 실패 ${item.failed}건`;
+                } else if (item.status === 'success') {
+                    const r = item.receipt || {};
+                    li.textContent = `${item.file}: ${r.가맹점 || '미확인'} / ₩${(r.총금액 || 0).toLocaleString()} / ${r.날짜 || '-'}`;
+                } else {
+                    li.className = 'text-red-500';
+                    li.textContent = `${item.file}: 실패 (${item.error || ''})`;
+                }
+                list.appendChild(li);
+            });
+        }
+        updateDashboard();
+        loadTransactions();
+    } catch (err) {
+        console.error(err);
+        alert(err.message || "업로드 중 오류가 발생했습니다.");
+    }
+}
+
+// ===== OCR 작업 대기 (long-poll) =====
+// 짧은 폴링 + 백오프 (서버 요청 스레드를 붙잡는 long-poll 대신)
+const OCR_POLL_MIN_MS = 500;
+const OCR_POLL_MAX_MS = 3000;
+const OCR_POLL_TIMEOUT_MS = 180000;
+
+async function waitForOcrJob(jobId) {
+    const started = Date.now();
+    let delay = OCR_POLL_MIN_MS;
+    while (true) {
+        const res = await fetch(`${API_BASE_URL}/ocr/jobs/${jobId}`, { credentials: 'include' });
+        if (!res.ok) throw new Error("OCR 작업 조회 실패");
+        const job = await res.json();
+        if (job.state === 'done' || job.state === 'failed') return job;
+        if (Date.now() - started > OCR_POLL_TIMEOUT_MS) throw new Error("OCR 처리 시간 초과");
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(delay * 1.5, OCR_POLL_MAX_MS);
+    }
+}
+
 // ===== 단계별 교정 UI =====
 function startCorrection() {
     currentStep = 0;
@@ -262,7 +337,7 @@ document.getElementById('save-correction-btn').onclick = () => {
     if (!inputValue) return alert("값을 입력하세요.");
     const field = stepFields[currentStep];
 
-    fetch(`${API_BASE_URL}/api/user-data`, { credentials: 'include' })
+    fetch(`${API_BASE_URL}/api/user-data?limit=1&fields=id,ocr_store`, { credentials: 'include' })
         .then(res => res.json())
         .then(data => {
             if (!data.length) return alert("거래 내역이 없습니다.");